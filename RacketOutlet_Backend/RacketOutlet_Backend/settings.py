@@ -46,12 +46,14 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'rest_framework',
     'rest_framework_simplejwt',
     'django_filters',
     'corsheaders',
 
+    'common',
     'users',
     'products',
     'notifications',
@@ -116,6 +118,42 @@ DATABASES = {
 }
 
 
+# Cache
+# One cache alias per domain so each gets its own key prefix and can be
+# flushed or sized independently (see common.cache). Redis when REDIS_URL
+# is set. Without it the namespaces aren't cached at all: web workers,
+# run_jobs and the hold sweeper each write (and invalidate) them, so a
+# per-process cache would keep serving what another process changed.
+REDIS_URL = os.environ.get("REDIS_URL")
+CACHE_NAMESPACES = ("catalog", "homepage", "cart", "orders", "notifications")
+
+
+def cache_backend(prefix):
+    if REDIS_URL:
+        return {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": f"racketoutlet:{prefix}",
+            "OPTIONS": {
+                "CLIENT_CLASS": "django_redis.client.DefaultClient",
+                "SOCKET_CONNECT_TIMEOUT": 2,
+                "SOCKET_TIMEOUT": 2,
+            },
+        }
+    if prefix in CACHE_NAMESPACES:
+        return {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+    return {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": prefix,
+    }
+
+
+CACHES = {
+    "default": cache_backend("default"),
+    **{namespace: cache_backend(namespace) for namespace in CACHE_NAMESPACES},
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -161,6 +199,35 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Where uploads live: "supabase", "s3" (any S3-compatible bucket, see AWS_*)
+# or "local" (MEDIA_ROOT, content-addressed). Defaults to local when no
+# Supabase project is configured, so development and tests run offline.
+MEDIA_STORAGE = os.environ.get("MEDIA_STORAGE") or ("supabase" if os.environ.get("SUPABASE_URL") else "local")
+MEDIA_STORAGE_BACKENDS = {
+    "supabase": "common.supabase_storage_backend.SupabaseStorage",
+    "s3": "common.s3_storage_backend.S3MediaStorage",
+    "local": "common.storage.HashedFileSystemStorage",
+}
+# Image derivatives are written to names derived from the source image's
+# hash (see common.images), so that storage keeps names as given
+DERIVATIVE_STORAGES = {
+    "supabase": {"BACKEND": MEDIA_STORAGE_BACKENDS["supabase"], "OPTIONS": {"unique_names": False}},
+    "s3": {"BACKEND": MEDIA_STORAGE_BACKENDS["s3"], "OPTIONS": {"file_overwrite": True}},
+    "local": {"BACKEND": "django.core.files.storage.FileSystemStorage", "OPTIONS": {"allow_overwrite": True}},
+}
+STORAGES = {
+    "default": {"BACKEND": MEDIA_STORAGE_BACKENDS[MEDIA_STORAGE]},
+    "derivatives": DERIVATIVE_STORAGES[MEDIA_STORAGE],
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+AWS_STORAGE_BUCKET_NAME = os.environ.get("AWS_STORAGE_BUCKET_NAME")
+AWS_S3_ENDPOINT_URL = os.environ.get("AWS_S3_ENDPOINT_URL")  # R2, MinIO, ...
+AWS_S3_REGION_NAME = os.environ.get("AWS_S3_REGION_NAME")
+AWS_S3_CUSTOM_DOMAIN = os.environ.get("AWS_S3_CUSTOM_DOMAIN")  # CDN in front of the bucket
+AWS_QUERYSTRING_AUTH = False  # media is public, URLs shouldn't expire
+AWS_S3_FILE_OVERWRITE = False
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -209,3 +276,47 @@ EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
 DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL")
 
+
+# Inventory holds for unpaid orders (see orders.reservations)
+INVENTORY_HOLD_TTL = timedelta(minutes=int(os.environ.get("INVENTORY_HOLD_TTL_MINUTES", 30)))
+INVENTORY_HOLD_SWEEP_BATCH_SIZE = 500
+
+
+# Outbound Razorpay API (see common.razorpay_client); point RAZORPAY_API_URL
+# at the fake_razorpay command's server to run checkout load tests offline
+RAZORPAY_API_URL = os.environ.get("RAZORPAY_API_URL", "https://api.razorpay.com/v1")
+RAZORPAY_TIMEOUT = 10  # seconds per read/write
+RAZORPAY_CONNECT_TIMEOUT = 3
+RAZORPAY_POOL_SIZE = int(os.environ.get("RAZORPAY_POOL_SIZE", 20))
+RAZORPAY_RETRIES = 3
+RAZORPAY_RETRY_BACKOFF = 0.2  # seconds, doubled after every failed attempt
+RAZORPAY_BREAKER_THRESHOLD = 5  # consecutive failures that open the circuit
+RAZORPAY_BREAKER_RESET_TIMEOUT = 30  # seconds before a trial call is let through
+
+
+# Razorpay webhooks (see orders.webhooks)
+RAZORPAY_WEBHOOK_SECRET = os.environ.get("RAZORPAY_WEBHOOK_SECRET", "")
+WEBHOOK_BATCH_SIZE = 100
+WEBHOOK_MAX_ATTEMPTS = 5
+
+
+# Media storage uploads/deletes (see common.supabase_storage_backend)
+STORAGE_UPLOAD_CHUNK_SIZE = 1024 * 1024
+STORAGE_UPLOAD_WORKERS = int(os.environ.get("STORAGE_UPLOAD_WORKERS", 4))
+STORAGE_TIMEOUT = 60  # seconds per read/write of a chunk
+STORAGE_RETRIES = 4
+STORAGE_RETRY_BACKOFF = 0.5  # seconds, doubled after every failed attempt
+STORAGE_DELETE_BATCH_SIZE = 100
+
+
+# Responsive image derivatives (see common.images)
+IMAGE_DERIVATIVE_WIDTHS = (320, 640, 960, 1280, 1920)
+IMAGE_DERIVATIVE_FORMATS = {"avif": 50, "webp": 75, "jpeg": 80}  # format: quality
+
+
+# Background jobs (see common.jobs and the run_jobs command)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 4))
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF = 30  # seconds, doubled after every failed attempt
+JOB_LOCK_TIMEOUT = timedelta(minutes=10)  # running jobs older than this are assumed lost
+JOB_POLL_INTERVAL = 1  # seconds between polls of an empty queue
@@ -15,6 +15,7 @@ urlpatterns = [
     path('api/', include('products.urls')),
     path('api/', include('orders.urls')),
     path('api/', include('homepage.urls')),
+    path('api/notifications/', include('notifications.urls')),
 
         # Health check endpoint
     path('api/health/', health_check),
@@ -0,0 +1,23 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Job
+
+
+# ---------------------------
+# Job Admin
+# ---------------------------
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('task', 'status', 'attempts', 'max_attempts', 'run_at', 'created_at')
+    list_filter = ('status', 'task')
+    ordering = ('-created_at',)
+    readonly_fields = ('task', 'payload', 'attempts', 'locked_at', 'last_error', 'created_at')
+    actions = ['retry_jobs']
+
+    @admin.action(description='Retry selected jobs now')
+    def retry_jobs(self, request, queryset):
+        retried = queryset.exclude(status=Job.RUNNING).update(
+            status=Job.QUEUED, attempts=0, run_at=timezone.now(), locked_at=None
+        )
+        self.message_user(request, f"{retried} job(s) queued again")
@@ -0,0 +1,155 @@
+import time
+from contextlib import contextmanager
+
+from django.core.cache import caches
+
+_MISSING = object()
+
+
+def _fresh_generation():
+    # Time-based so a counter that was evicted never restarts at a value
+    # that older, still-cached keys were built with
+    return int(time.time() * 1000)
+
+
+class CacheNamespace:
+    """
+    A domain cache (catalog, homepage, cart, orders, notifications) backed by its own
+    CACHES alias.
+
+    Keys embed a generation counter, so a whole namespace, or one scope
+    inside it (e.g. a single user's orders), is invalidated by bumping a
+    counter instead of deleting keys one by one. Old entries simply stop
+    being addressed and expire on their own.
+
+    get_or_build() is single-flight: on a cold key only the caller that wins
+    a short-lived lock runs the builder, everyone else waits for its result.
+    """
+
+    def __init__(self, name, timeout=300, lock_timeout=10, poll_interval=0.05):
+        self.name = name
+        self.timeout = timeout
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+
+    @property
+    def cache(self):
+        return caches[self.name]
+
+    # -------------------------------
+    # Generations
+    # -------------------------------
+    def _generation_key(self, scope=None):
+        return f"gen:{scope}" if scope else "gen"
+
+    def _generations(self, scope=None):
+        keys = [self._generation_key()]
+        if scope:
+            keys.append(self._generation_key(scope))
+        found = self.cache.get_many(keys)
+        for key in keys:
+            if key not in found:
+                self.cache.add(key, _fresh_generation(), timeout=None)
+                found[key] = self.cache.get(key)
+        return [found[key] for key in keys]
+
+    def invalidate(self, scope=None):
+        """Drop every key in the namespace, or only those built under `scope`."""
+        key = self._generation_key(scope)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            # Counter missing (never used or evicted)
+            self.cache.set(key, _fresh_generation(), timeout=None)
+
+    def make_key(self, *parts, scope=None, generations=None):
+        generations = ".".join(str(gen) for gen in (generations or self._generations(scope)))
+        prefix = f"{scope}:" if scope else ""
+        return f"{prefix}g{generations}:" + ":".join(str(part) for part in parts)
+
+    # -------------------------------
+    # Read / write
+    # -------------------------------
+    def get(self, *parts, scope=None, default=None):
+        return self.cache.get(self.make_key(*parts, scope=scope), default)
+
+    def set(self, *parts, value, scope=None, timeout=None):
+        self.cache.set(self.make_key(*parts, scope=scope), value, timeout or self.timeout)
+
+    def delete(self, *parts, scope=None):
+        self.cache.delete(self.make_key(*parts, scope=scope))
+
+    def incr(self, *parts, delta=1, scope=None):
+        """Atomically add `delta` to a cached counter. Returns the new value, or None if it isn't cached."""
+        try:
+            return self.cache.incr(self.make_key(*parts, scope=scope), delta)
+        except ValueError:
+            return None
+
+    def get_many(self, parts_list, scope=None):
+        """{parts: value} for the keys that are cached, in one round trip."""
+        generations = self._generations(scope)
+        keys = {self.make_key(*parts, scope=scope, generations=generations): parts for parts in parts_list}
+        return {keys[key]: value for key, value in self.cache.get_many(list(keys)).items()}
+
+    def set_many(self, values, scope=None, timeout=None):
+        """Store {parts: value} in one round trip."""
+        generations = self._generations(scope)
+        self.cache.set_many(
+            {self.make_key(*parts, scope=scope, generations=generations): value for parts, value in values.items()},
+            timeout or self.timeout,
+        )
+
+    @contextmanager
+    def lock(self, *parts):
+        """
+        Best-effort mutual exclusion across workers for read-modify-write of
+        one key. Waits up to lock_timeout, then proceeds anyway, leaving the
+        lock to whoever still holds it.
+        """
+        lock_key = "lock:" + ":".join(str(part) for part in parts)
+        deadline = time.monotonic() + self.lock_timeout
+        acquired = self.cache.add(lock_key, 1, timeout=self.lock_timeout)
+        while not acquired and time.monotonic() <= deadline:
+            time.sleep(self.poll_interval)
+            acquired = self.cache.add(lock_key, 1, timeout=self.lock_timeout)
+        try:
+            yield
+        finally:
+            if acquired:
+                self.cache.delete(lock_key)
+
+    def get_or_build(self, parts, builder, scope=None, timeout=None):
+        """Return the cached value for `parts`, building it at most once across workers on a miss."""
+        key = self.make_key(*parts, scope=scope)
+        value = self.cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        lock_key = f"lock:{key}"
+        if self.cache.add(lock_key, 1, timeout=self.lock_timeout):
+            try:
+                value = builder()
+                self.cache.set(key, value, timeout or self.timeout)
+                return value
+            finally:
+                self.cache.delete(lock_key)
+
+        # Someone else is rebuilding: wait for their result rather than piling on
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            value = self.cache.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+            if self.cache.get(lock_key) is None:
+                break
+        # Builder gave up or crashed; compute without caching
+        return builder()
+
+
+catalog_cache = CacheNamespace("catalog", timeout=60 * 15)
+homepage_cache = CacheNamespace("homepage", timeout=None)
+cart_cache = CacheNamespace("cart", timeout=60 * 30)
+orders_cache = CacheNamespace("orders", timeout=60 * 60)
+notifications_cache = CacheNamespace("notifications", timeout=60 * 10)
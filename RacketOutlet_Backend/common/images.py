@@ -0,0 +1,174 @@
+import hashlib
+import io
+import math
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+from common.jobs import job
+from common.storage import upload_executor
+
+PIL_FORMATS = {"avif": "AVIF", "webp": "WEBP", "jpeg": "JPEG"}
+
+
+# -------------------------------
+# Blur-hash placeholders
+# -------------------------------
+BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+def _base83(value, length):
+    return "".join(BASE83[value // 83 ** (length - i) % 83] for i in range(1, length + 1))
+
+
+def _to_linear(value):
+    value /= 255
+    return value / 12.92 if value <= 0.04045 else ((value + 0.055) / 1.055) ** 2.4
+
+
+def _to_srgb(value):
+    value = min(max(value, 0), 1)
+    return round(value * 12.92 * 255) if value <= 0.0031308 else round((1.055 * value ** (1 / 2.4) - 0.055) * 255)
+
+
+def blurhash(image, x_components=4, y_components=3):
+    """BlurHash (https://blurha.sh) of an image, computed on a 32px thumbnail."""
+    small = image.convert("RGB")
+    small.thumbnail((32, 32))
+    width, height = small.size
+    pixels = [tuple(map(_to_linear, pixel)) for pixel in small.getdata()]
+
+    factors = []
+    for j in range(y_components):
+        for i in range(x_components):
+            norm = 1 if i == j == 0 else 2
+            total = [0.0, 0.0, 0.0]
+            for y in range(height):
+                cos_y = math.cos(math.pi * j * y / height)
+                for x in range(width):
+                    basis = norm * math.cos(math.pi * i * x / width) * cos_y
+                    for channel, value in enumerate(pixels[y * width + x]):
+                        total[channel] += basis * value
+            factors.append([value / (width * height) for value in total])
+
+    dc, ac = factors[0], factors[1:]
+    result = _base83(x_components - 1 + (y_components - 1) * 9, 1)
+    if ac:
+        quantized = max(0, min(82, math.floor(max(abs(v) for f in ac for v in f) * 166 - 0.5)))
+        maximum = (quantized + 1) / 166
+    else:
+        quantized, maximum = 0, 1
+    result += _base83(quantized, 1)
+    result += _base83((_to_srgb(dc[0]) << 16) + (_to_srgb(dc[1]) << 8) + _to_srgb(dc[2]), 4)
+    for factor in ac:
+        r, g, b = (
+            max(0, min(18, math.floor(math.copysign(abs(v / maximum) ** 0.5, v) * 9 + 9.5))) for v in factor
+        )
+        result += _base83(r * 19 * 19 + g * 19 + b, 2)
+    return result
+
+
+# -------------------------------
+# Derivatives
+# -------------------------------
+def derivative_widths(width):
+    """Configured widths narrower than the image, plus the image itself up to the largest one."""
+    widths = settings.IMAGE_DERIVATIVE_WIDTHS
+    return sorted({w for w in widths if w < width} | {min(width, max(widths))})
+
+
+def _encode(image, fmt, quality):
+    if fmt == "jpeg" or image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, PIL_FORMATS[fmt], quality=quality)
+    return buffer.getvalue()
+
+
+def build_variants(file):
+    """
+    Render a stored image at every derivative width in every configured
+    format, upload the renditions concurrently to the "derivatives" storage
+    and return what serializers need: a srcset per format, a blur-hash
+    placeholder and the intrinsic size.
+
+    Renditions are named after the source's SHA-256
+    (derivatives/ab/abcd.../640.webp), so identical uploads share them and
+    rebuilding rewrites the same files.
+    """
+    with file.open("rb") as source_file:
+        source = source_file.read()
+    digest = hashlib.sha256(source).hexdigest()
+    storage = storages["derivatives"]
+
+    with Image.open(io.BytesIO(source)) as image:
+        image = ImageOps.exif_transpose(image)
+        width, height = image.size
+        placeholder = blurhash(image)
+        uploads = {}
+        for target in derivative_widths(width):
+            resized = image.resize((target, max(1, round(height * target / width))), Image.LANCZOS)
+            for fmt, quality in settings.IMAGE_DERIVATIVE_FORMATS.items():
+                name = f"derivatives/{digest[:2]}/{digest}/{target}.{fmt}"
+                content = ContentFile(_encode(resized, fmt, quality), name=name)
+                uploads[(fmt, target)] = upload_executor().submit(storage.save, name, content)
+
+    srcset = {}
+    for (fmt, target), upload in uploads.items():
+        srcset.setdefault(fmt, []).append(f"{storage.url(upload.result())} {target}w")
+    return {
+        "source": file.name,
+        "digest": digest,
+        "width": width,
+        "height": height,
+        "placeholder": placeholder,
+        "srcset": {fmt: ", ".join(entries) for fmt, entries in srcset.items()},
+    }
+
+
+def refresh_image_variants(instance):
+    """Rebuild the stale derivatives of an ImageVariantsMixin instance and save just those fields."""
+    changed = []
+    for file_field, variants_field in instance.stale_variant_fields():
+        file = getattr(instance, file_field)
+        setattr(instance, variants_field, build_variants(file) if file else {})
+        changed.append(variants_field)
+    if changed:
+        instance.save(update_fields=changed)
+    return changed
+
+
+@job
+def build_image_variants(model, pk):
+    """Background job: refresh the derivatives of one row, if it still exists."""
+    instance = apps.get_model(model)._default_manager.filter(pk=pk).first()
+    if instance is not None:
+        refresh_image_variants(instance)
+
+
+def schedule_image_variants(instance):
+    """Queue a rebuild of the instance's stale derivatives once the transaction commits."""
+    if any(instance.stale_variant_fields()):
+        build_image_variants.enqueue(model=instance._meta.label, pk=instance.pk)
+
+
+# -------------------------------
+# Serializer fields
+# -------------------------------
+class ImageVariantField(serializers.ReadOnlyField):
+    """
+    One key ("srcset", "placeholder", ...) of an image's stored derivatives,
+    e.g. ImageVariantField("srcset", source="main_image_variants"). None
+    until the derivatives have been built.
+    """
+
+    def __init__(self, key, **kwargs):
+        self.key = key
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return (value or {}).get(self.key)
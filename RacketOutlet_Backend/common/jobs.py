@@ -0,0 +1,134 @@
+import logging
+import random
+import traceback
+from datetime import timedelta
+from functools import partial
+from importlib import import_module
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from common.models import Job
+
+logger = logging.getLogger(__name__)
+
+# Task name -> function, filled in by @job
+TASKS = {}
+
+
+# -------------------------------
+# Defining and enqueueing jobs
+# -------------------------------
+def job(func=None, *, max_attempts=None):
+    """
+    Register a module-level function as a background task. Arguments must be JSON
+    serializable and small, since they're kept on the Job row until it
+    succeeds (or forever, once dead): pass ids, not model instances or
+    rendered content, and let the task load what it needs:
+
+        @job
+        def deliver_notification(notification_id): ...
+
+        deliver_notification.enqueue(notification_id=notification.pk)
+
+    A task that raises is retried with exponential backoff, up to
+    max_attempts (JOB_MAX_ATTEMPTS by default), then dead-lettered.
+    """
+    if func is None:
+        return partial(job, max_attempts=max_attempts)
+    name = f"{func.__module__}.{func.__qualname__}"
+    TASKS[name] = func
+    func.enqueue = partial(enqueue, name, max_attempts=max_attempts)
+    return func
+
+
+def enqueue(task, *, max_attempts=None, delay=None, **payload):
+    """
+    Queue a task once the current transaction commits, so a rolled back
+    request never sends its emails and workers never see rows the job
+    depends on before they're committed.
+    """
+    def create():
+        Job.objects.create(
+            task=task,
+            payload=payload,
+            max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+            run_at=timezone.now() + (delay or timedelta()),
+        )
+    transaction.on_commit(create)
+
+
+def get_task(name):
+    if name not in TASKS:
+        # Tasks register themselves when their module is imported
+        import_module(name.rpartition(".")[0])
+    return TASKS[name]
+
+
+# -------------------------------
+# Running jobs
+# -------------------------------
+def claim_jobs(limit):
+    """
+    Mark up to `limit` due jobs as running and return them. Jobs left
+    running by a worker that died are claimed again after JOB_LOCK_TIMEOUT.
+    Claiming counts as an attempt, so a job that keeps killing its worker
+    still ends up dead-lettered.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=Job.QUEUED, run_at__lte=now)
+                | Q(status=Job.RUNNING, locked_at__lt=now - settings.JOB_LOCK_TIMEOUT)
+            )
+            .order_by("run_at")[:limit]
+        )
+        Job.objects.filter(pk__in=[j.pk for j in jobs]).update(
+            status=Job.RUNNING, locked_at=now, attempts=F("attempts") + 1
+        )
+    for j in jobs:
+        j.status, j.locked_at, j.attempts = Job.RUNNING, now, j.attempts + 1
+    return jobs
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1) * random.uniform(0.5, 1.5))
+
+
+def run_job(j):
+    """Run one claimed job; delete it on success, reschedule or dead-letter it on failure."""
+    try:
+        get_task(j.task)(**j.payload)
+    except Exception:
+        error = traceback.format_exc()
+        dead = j.attempts >= j.max_attempts
+        logger.warning("Job %s %s failed (attempt %d/%d)", j.pk, j.task, j.attempts, j.max_attempts)
+        Job.objects.filter(pk=j.pk).update(
+            status=Job.DEAD if dead else Job.QUEUED,
+            run_at=timezone.now() + (timedelta() if dead else retry_delay(j.attempts)),
+            locked_at=None,
+            last_error=error,
+        )
+        return False
+    Job.objects.filter(pk=j.pk).delete()
+    return True
+
+
+def run_job_in_thread(j):
+    """run_job for worker threads, which have to release their own database connections."""
+    try:
+        return run_job(j)
+    finally:
+        close_old_connections()
+
+
+def run_due_jobs(limit=100):
+    """Claim and run due jobs inline, e.g. from tests or a shell. Returns the number run."""
+    jobs = claim_jobs(limit)
+    for j in jobs:
+        run_job(j)
+    return len(jobs)
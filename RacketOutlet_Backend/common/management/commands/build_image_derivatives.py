@@ -0,0 +1,31 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from common.images import refresh_image_variants
+from common.models import ImageVariantsMixin
+
+
+class Command(BaseCommand):
+    help = "Build missing or stale responsive image derivatives (e.g. after changing the widths or formats)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("models", nargs="*", help="Limit to these models, e.g. products.Product")
+        parser.add_argument("--force", action="store_true", help="Rebuild derivatives that are up to date too")
+
+    def handle(self, *args, **options):
+        models = (
+            [apps.get_model(label) for label in options["models"]]
+            or [model for model in apps.get_models() if issubclass(model, ImageVariantsMixin)]
+        )
+        for model in models:
+            built = 0
+            for instance in model._default_manager.order_by("pk").iterator():
+                if options["force"]:
+                    for variants_field in model.image_variant_fields.values():
+                        setattr(instance, variants_field, {})
+                try:
+                    if refresh_image_variants(instance):
+                        built += 1
+                except Exception as exc:
+                    self.stderr.write(f"❌ {model._meta.label} {instance.pk}: {exc}")
+            self.stdout.write(self.style.SUCCESS(f"✅ {model._meta.label}: built derivatives for {built} rows"))
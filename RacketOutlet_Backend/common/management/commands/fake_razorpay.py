@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from common.razorpay_fake import FakeRazorpayServer
+
+
+class Command(BaseCommand):
+    help = "Run a fake Razorpay Orders API for offline checkout load tests"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--latency", type=float, default=0, help="Seconds added to every call")
+
+    def handle(self, *args, **options):
+        server = FakeRazorpayServer(options["host"], options["port"], latency=options["latency"])
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Fake Razorpay listening; run the app with RAZORPAY_API_URL={server.api_url}"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
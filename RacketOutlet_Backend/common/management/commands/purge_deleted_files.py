@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from common.supabase_storage_backend import purge_deleted_files
+
+
+class Command(BaseCommand):
+    help = "Delete storage files queued for deletion, retrying earlier failures that are due"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.STORAGE_DELETE_BATCH_SIZE)
+        parser.add_argument(
+            "--interval", type=int, default=0,
+            help="Keep running and purge every N seconds (default: purge once and exit)",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            total = 0
+            while True:
+                removed = purge_deleted_files(batch_size=options["batch_size"])
+                if not removed:
+                    break
+                total += removed
+            if total:
+                self.stdout.write(self.style.SUCCESS(f"✅ Deleted {total} files from storage"))
+
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
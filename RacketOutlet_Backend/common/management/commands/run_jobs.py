@@ -0,0 +1,43 @@
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from common.jobs import claim_jobs, run_job_in_thread
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (emails, image derivatives, ...) on a bounded pool of threads"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=settings.JOB_WORKERS)
+        parser.add_argument("--once", action="store_true", help="Run the jobs that are due now, then exit")
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        # Finish the jobs in hand on SIGTERM/SIGINT instead of abandoning them mid-run
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, self.stop)
+
+        concurrency = options["concurrency"]
+        running, total = set(), 0
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="jobs") as executor:
+            self.stdout.write(self.style.SUCCESS(f"✅ Job worker started with {concurrency} threads"))
+            while True:
+                # Only claim as many jobs as there are idle threads, so nothing waits in memory
+                if not self.stopping and len(running) < concurrency:
+                    for job in claim_jobs(concurrency - len(running)):
+                        running.add(executor.submit(run_job_in_thread, job))
+                        total += 1
+                if running:
+                    _, running = wait(running, timeout=settings.JOB_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                elif self.stopping or options["once"]:
+                    break
+                else:
+                    time.sleep(settings.JOB_POLL_INTERVAL)
+        self.stdout.write(self.style.SUCCESS(f"✅ Ran {total} jobs"))
+
+    def stop(self, signum, frame):
+        self.stopping = True
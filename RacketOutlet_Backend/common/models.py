@@ -0,0 +1,120 @@
+from django.db import models
+from django.utils import timezone
+
+from common.storage import upload_executor
+
+
+class PublicUrlMixin:
+    """
+    Keeps stored public URL columns in step with their file fields in the
+    same INSERT/UPDATE as the file itself.
+
+    A pending upload is pushed to storage before the row is written (the
+    same thing FileField.pre_save would do during the write), so the final
+    file name, and with it the public URL, is known up front and save()
+    is a single statement.
+
+        public_url_fields = {"image": "image_url"}
+    """
+    public_url_fields = {}
+
+    def pending_files(self):
+        """File fields holding an upload that hasn't been pushed to storage yet."""
+        for file_field in self.public_url_fields:
+            file = getattr(self, file_field)
+            if file and file.name and not file._committed:
+                yield file
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        for file_field, url_field in self.public_url_fields.items():
+            if update_fields is not None and file_field not in update_fields:
+                continue
+            file = getattr(self, file_field)
+            if not file or not file.name:
+                continue
+            if not file._committed:
+                file.save(file.name, file.file, save=False)
+            url = file.storage.url(file.name)
+            if url != getattr(self, url_field):
+                setattr(self, url_field, url)
+                if update_fields is not None:
+                    kwargs["update_fields"] = update_fields = {*update_fields, url_field}
+        super().save(*args, **kwargs)
+
+
+class ImageVariantsMixin:
+    """
+    Keeps responsive derivatives (see common.images) of image fields in a
+    JSON column next to them. They're rebuilt off the request path after
+    any save that changes the image.
+
+        image_variant_fields = {"image": "image_variants"}
+    """
+    image_variant_fields = {}
+
+    def stale_variant_fields(self):
+        """(file field, variants field) pairs whose derivatives don't match the current file."""
+        for file_field, variants_field in self.image_variant_fields.items():
+            name = getattr(self, file_field).name or None
+            if (getattr(self, variants_field) or {}).get("source") != name:
+                yield file_field, variants_field
+
+
+def upload_pending_files(instances):
+    """
+    Push the pending uploads of several PublicUrlMixin instances (e.g. an
+    admin inline formset) to storage concurrently, on the storage upload
+    pool, so their save() calls don't upload one after another.
+    """
+    files = [file for instance in instances for file in instance.pending_files()]
+    if len(files) < 2:
+        return
+    for future in [upload_executor().submit(file.save, file.name, file.file, save=False) for file in files]:
+        future.result()
+
+
+class PendingFileDeletion(models.Model):
+    """Storage file queued for deletion (see SupabaseStorage.delete)."""
+    name = models.CharField(max_length=500)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class Job(models.Model):
+    """
+    Background job queued by common.jobs. Rows are deleted once the job
+    succeeds; jobs that keep failing stay behind as dead letters.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DEAD = 'dead'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DEAD, 'Dead'),
+    ]
+    task = models.CharField(max_length=200)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField()
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Workers only poll queued jobs that are due, and running ones whose worker may have died
+            models.Index(fields=["run_at"], condition=models.Q(status='queued'), name="common_job_due_idx"),
+            models.Index(fields=["locked_at"], condition=models.Q(status='running'), name="common_job_running_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.task} ({self.status}, attempt {self.attempts}/{self.max_attempts})"
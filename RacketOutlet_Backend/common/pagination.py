@@ -1,6 +1,245 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import datetime
+import hashlib
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+APPROXIMATE_COUNT_TIMEOUT = 60 * 5
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """
+    DjangoJSONEncoder without its millisecond rounding: a cursor on a
+    timestamp must keep microseconds, or rows in the same millisecond are skipped.
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 16
     page_size_query_param = 'page_size'
     max_page_size = 100
+
+
+# -------------------------------
+# Approximate counts
+# -------------------------------
+def approximate_count(queryset):
+    """
+    Cheap row count for "about N results": the planner's estimate from
+    pg_class.reltuples for an unfiltered table, otherwise an exact count
+    cached for a few minutes per distinct query.
+    """
+    if connection.vendor == "postgresql" and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        if row and row[0] >= 0:  # -1 until the table is first analyzed
+            return row[0]
+
+    sql, params = queryset.order_by().values("pk").query.sql_with_params()
+    key = "count:" + hashlib.sha1(f"{sql}{params}".encode()).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = queryset.order_by().count()
+        cache.set(key, count, APPROXIMATE_COUNT_TIMEOUT)
+    return count
+
+
+# -------------------------------
+# Keyset pagination
+# -------------------------------
+def keyset_ordering(queryset):
+    """
+    The queryset's ordering with the primary key appended as a tiebreaker,
+    so every row has a unique position.
+    """
+    ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+    if not any(field.lstrip("-") in ("pk", "id") for field in ordering):
+        descending = ordering[0].startswith("-") if ordering else True
+        ordering.append("-pk" if descending else "pk")
+    return ordering
+
+
+def nullable_fields(model, ordering):
+    """Ordering fields that are nullable model columns (annotations count as non-null)."""
+    names = {field.name: field for field in model._meta.concrete_fields}
+    return {name for name in (field.lstrip("-") for field in ordering) if name in names and names[name].null}
+
+
+def _after(name, value, forward, nullable):
+    """
+    (strictly after, at or after) conditions for one ordering column, with
+    Postgres' default NULL placement: NULLs sort as the largest value.
+    """
+    if value is None:
+        # Only NULLs tie with NULL; walking upwards nothing follows them,
+        # walking downwards every non-NULL row does
+        if forward:
+            return None, Q(**{f"{name}__isnull": True})
+        return Q(**{f"{name}__isnull": False}), Q()
+    after = Q(**{f"{name}__{'gt' if forward else 'lt'}": value})
+    at_or_after = Q(**{f"{name}__{'gte' if forward else 'lte'}": value})
+    if nullable and forward:
+        after |= Q(**{f"{name}__isnull": True})
+        at_or_after |= Q(**{f"{name}__isnull": True})
+    return after, at_or_after
+
+
+def keyset_filter(ordering, values, reverse=False, nullable=()):
+    """
+    Rows strictly after `values` in `ordering` (or before them when `reverse`):
+    (a > x) OR (a = x AND b > y) OR ..., led by a redundant a >= x so the
+    database can range-scan an index on the first column.
+    """
+    clauses, equal = [], Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip("-")
+        forward = field.startswith("-") == reverse
+        after, _ = _after(name, value, forward, name in nullable)
+        if after is not None:
+            clauses.append(equal & after)
+        equal &= Q(**{f"{name}__isnull": True}) if value is None else Q(**{name: value})
+    if not clauses:
+        return Q(pk__in=[])
+
+    first = ordering[0].lstrip("-")
+    _, bound = _after(first, values[0], ordering[0].startswith("-") == reverse, first in nullable)
+    return bound & reduce(or_, clauses)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on the queryset's own ordering, e.g.
+    (effective_price, id) or (-created_at, -id). Each page is one indexed
+    range query with no OFFSET and no COUNT(*).
+
+    Cursors are opaque base64 tokens carrying the boundary row's sort
+    values. ?count=approx adds an approximate total (see approximate_count).
+    """
+    page_size = StandardResultsSetPagination.page_size
+    page_size_query_param = StandardResultsSetPagination.page_size_query_param
+    max_page_size = StandardResultsSetPagination.max_page_size
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def encode_cursor(self, values, reverse):
+        raw = json.dumps({"v": values, "r": int(reverse)}, cls=CursorEncoder)
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+            values, reverse = data["v"], bool(data["r"])
+        except (ValueError, TypeError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def position(self, obj):
+        return [getattr(obj, field.lstrip("-")) for field in self.ordering]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = keyset_ordering(queryset)
+        page_size = self.get_page_size(request)
+        values, reverse = self.decode_cursor(request)
+
+        self.count = None
+        if request.query_params.get(self.count_query_param) == "approx":
+            self.count = approximate_count(queryset)
+
+        queryset = queryset.order_by(*self.ordering)
+        if values is not None:
+            nullable = nullable_fields(queryset.model, self.ordering)
+            queryset = queryset.filter(keyset_filter(self.ordering, values, reverse, nullable))
+        if reverse:
+            queryset = queryset.reverse()
+
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        # Walking backwards we came from a later page, so there's always a next one
+        self.has_next = True if reverse else has_more
+        self.has_previous = has_more if reverse else values is not None
+        self.first = self.position(rows[0]) if rows else values
+        self.last = self.position(rows[-1]) if rows else values
+        return rows
+
+    def get_link(self, values, reverse):
+        url = self.request.build_absolute_uri()
+        if values is None:
+            return remove_query_param(url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(values, reverse))
+
+    def get_next_link(self):
+        if not self.has_next or self.last is None:
+            return None
+        return self.get_link(self.last, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or self.first is None:
+            return None
+        return self.get_link(self.first, reverse=True)
+
+    def get_paginated_response(self, data):
+        body = {'next': self.get_next_link(), 'previous': self.get_previous_link()}
+        if self.count is not None:
+            body['count'] = self.count
+        body['results'] = data
+        return Response(body)
+
+
+class PageOrKeysetPagination(StandardResultsSetPagination):
+    """
+    Page numbers by default (what the frontend uses today); keyset cursors
+    when the request carries ?cursor= or starts with ?pagination=cursor.
+    Views opt in by setting pagination_class.
+    """
+    keyset_class = KeysetPagination
+
+    def wants_keyset(self, request):
+        return (
+            self.keyset_class.cursor_query_param in request.query_params
+            or request.query_params.get('pagination') == 'cursor'
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.keyset_class() if self.wants_keyset(request) else None
+        if self.keyset:
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
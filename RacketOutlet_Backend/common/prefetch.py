@@ -0,0 +1,78 @@
+from django.db.models import Prefetch, prefetch_related_objects
+
+# Serializer class -> (relations, nested, refine)
+#   relations: relation paths the serializer reads directly ("subcategory", "images")
+#   nested:    {relation: serializer_class} for nested serializers, whose own plan
+#              is applied underneath that relation ("product" -> ProductSerializer)
+#   refine:    optional callable(queryset) -> queryset for annotations the
+#              serializer reads, applied wherever the serializer's rows are loaded
+PREFETCH_PLANS = {}
+
+
+def register_prefetch_plan(serializer_class, *relations, refine=None, **nested):
+    """
+    Declare which relations a serializer touches so every view embedding it
+    can load them up front instead of lazily per row.
+    """
+    PREFETCH_PLANS[serializer_class] = (relations, nested, refine)
+
+
+def _is_multi_valued(model, path):
+    """True if any hop of a relation path fans out (reverse FK / M2M)."""
+    for name in path.split("__"):
+        field = model._meta.get_field(name)
+        if field.one_to_many or field.many_to_many:
+            return True
+        model = field.related_model
+    return False
+
+
+def _resolve(serializer_class, model, prefix=""):
+    """Walk a serializer's plan and return (select_related paths, prefetch lookups)."""
+    relations, nested, _ = PREFETCH_PLANS.get(serializer_class, ((), {}, None))
+    select, prefetch = [], []
+
+    for path in relations:
+        if _is_multi_valued(model, path):
+            prefetch.append(prefix + path)
+        else:
+            select.append(prefix + path)
+
+    for name, child_serializer in nested.items():
+        field = model._meta.get_field(name)
+        child_model = field.related_model
+        if field.one_to_many or field.many_to_many:
+            child_qs = apply_prefetch_plan(child_model._default_manager.all(), child_serializer)
+            prefetch.append(Prefetch(prefix + name, queryset=child_qs))
+        else:
+            select.append(prefix + name)
+            child_select, child_prefetch = _resolve(child_serializer, child_model, f"{prefix}{name}__")
+            select.extend(child_select)
+            prefetch.extend(child_prefetch)
+
+    return select, prefetch
+
+
+def apply_prefetch_plan(queryset, serializer_class):
+    """Apply the registered plan of `serializer_class` to a queryset of its model."""
+    select, prefetch = _resolve(serializer_class, queryset.model)
+    refine = PREFETCH_PLANS.get(serializer_class, ((), {}, None))[2]
+    if refine:
+        queryset = refine(queryset)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+def prefetch_instances(instances, serializer_class):
+    """
+    Same as apply_prefetch_plan for objects that are already loaded
+    (e.g. one freshly created order about to be serialized).
+    """
+    instances = [obj for obj in instances if obj is not None]
+    if not instances:
+        return
+    select, prefetch = _resolve(serializer_class, type(instances[0]))
+    prefetch_related_objects(instances, *select, *prefetch)
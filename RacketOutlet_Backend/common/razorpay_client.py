@@ -1,12 +1,163 @@
-import razorpay
+import hashlib
+import hmac
+import logging
 import os
+import random
+import threading
+import time
+from functools import lru_cache
+
+import httpx
+from django.conf import settings
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Load from settings.py
 RAZORPAY_KEY_ID = os.environ.get('RAZORPAY_KEY_ID')
 RAZORPAY_KEY_SECRET = os.environ.get('RAZORPAY_KEY_SECRET')
 
-razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class GatewayError(Exception):
+    pass
+
+
+class GatewayUnavailable(GatewayError):
+    """Razorpay is failing or slow; raised without calling it while the circuit is open."""
+
+
+class SignatureVerificationError(GatewayError):
+    pass
+
+
+# -------------------------------
+# Circuit breaker
+# -------------------------------
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failed calls and then rejects calls
+    for `reset_timeout` seconds, so a gateway outage costs checkout a fast
+    503 instead of a worker blocked for the full timeout. After that one
+    trial call is let through; its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, threshold, reset_timeout):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def is_open(self):
+        with self.lock:
+            return self.opened_at is not None and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.opened_at = time.monotonic()  # half-open: one trial call per reset_timeout
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures, self.opened_at = 0, None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                if self.opened_at is None:
+                    logger.warning("Razorpay circuit opened after %d failures", self.failures)
+                self.opened_at = time.monotonic()
+
+
+@lru_cache(maxsize=None)
+def breaker():
+    return CircuitBreaker(settings.RAZORPAY_BREAKER_THRESHOLD, settings.RAZORPAY_BREAKER_RESET_TIMEOUT)
+
+
+# -------------------------------
+# Orders API client
+# -------------------------------
+@lru_cache(maxsize=None)
+def _client(base_url, key_id, key_secret):
+    """One pooled, keep-alive HTTP client per account, created on first use."""
+    return httpx.Client(
+        base_url=f"{base_url.rstrip('/')}/",
+        auth=(key_id or "", key_secret or ""),
+        timeout=httpx.Timeout(settings.RAZORPAY_TIMEOUT, connect=settings.RAZORPAY_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=settings.RAZORPAY_POOL_SIZE, max_keepalive_connections=settings.RAZORPAY_POOL_SIZE,
+        ),
+    )
+
+
+def _request(method, path, **kwargs):
+    """One call through the circuit breaker. Returns the response, or raises GatewayError."""
+    if not breaker().allow():
+        raise GatewayUnavailable("Razorpay is unavailable, try again shortly")
+    try:
+        response = _client(settings.RAZORPAY_API_URL, RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET).request(
+            method, path, **kwargs
+        )
+    except httpx.TransportError as exc:
+        breaker().record_failure()
+        raise GatewayUnavailable(f"Razorpay {method} {path} failed: {type(exc).__name__}: {exc}") from exc
+    if response.status_code in RETRY_STATUSES:
+        breaker().record_failure()
+        raise GatewayUnavailable(f"Razorpay {method} {path} failed: {response.status_code}")
+    breaker().record_success()
+    if response.status_code >= 400:
+        raise GatewayError(f"Razorpay {method} {path} rejected: {response.status_code} {response.text[:200]}")
+    return response.json()
+
+
+def find_order(receipt):
+    """The Razorpay order created with this receipt, if any."""
+    orders = _request("GET", "orders", params={"receipt": receipt})
+    return next(iter(orders.get("items", [])), None)
+
+
+def create_order(amount, receipt, currency="INR", notes=None):
+    """
+    Create a Razorpay order for `amount` paise. The receipt (our order
+    number) is the idempotency key: when a create fails in a way that may
+    have reached Razorpay (timeout, 5xx), the order is looked up by receipt
+    before trying again, so retries never create a second gateway order.
+    """
+    payload = {"amount": amount, "currency": currency, "receipt": receipt, "payment_capture": 1, "notes": notes or {}}
+    attempts = settings.RAZORPAY_RETRIES
+    for attempt in range(1, attempts + 1):
+        try:
+            if attempt > 1:
+                existing = find_order(receipt)
+                if existing is not None:
+                    return existing
+            return _request("POST", "orders", json=payload)
+        except GatewayUnavailable:
+            if attempt == attempts or breaker().is_open():
+                raise
+        time.sleep(settings.RAZORPAY_RETRY_BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+
+# -------------------------------
+# Checkout signatures
+# -------------------------------
+def payment_signature(razorpay_order_id, razorpay_payment_id, key_secret=None):
+    """Signature Razorpay Checkout returns for a payment: hex HMAC-SHA256 of "order_id|payment_id"."""
+    message = f"{razorpay_order_id}|{razorpay_payment_id}".encode()
+    return hmac.new((key_secret or RAZORPAY_KEY_SECRET or "").encode(), message, hashlib.sha256).hexdigest()
+
 
+def verify_payment_signature(razorpay_order_id, razorpay_payment_id, signature):
+    """Check a Checkout signature locally (no API call), in constant time."""
+    expected = payment_signature(razorpay_order_id, razorpay_payment_id)
+    if not signature or not hmac.compare_digest(expected, signature):
+        raise SignatureVerificationError("Razorpay signature mismatch")
@@ -0,0 +1,108 @@
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class FakeRazorpayHandler(BaseHTTPRequestHandler):
+    """The slice of the Razorpay Orders API checkout uses: create an order, find orders by receipt."""
+
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def fail(self):
+        """Apply the next injected failure, if any; True when the request was answered with it."""
+        server = self.server
+        with server.lock:
+            status = server.failures.pop(0) if server.failures else None
+        if status is not None:
+            self.reply(status, {"error": {"code": "SERVER_ERROR", "description": "fake failure"}})
+        return status is not None
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(server.latency)
+        if urlsplit(self.path).path.rstrip("/") != "/v1/orders":
+            return self.reply(404, {"error": {"code": "BAD_REQUEST_ERROR", "description": "not found"}})
+        if self.fail():
+            return
+        order = {
+            "id": f"order_{uuid.uuid4().hex[:14]}",
+            "entity": "order",
+            "amount": body["amount"],
+            "amount_paid": 0,
+            "currency": body.get("currency", "INR"),
+            "receipt": body.get("receipt"),
+            "notes": body.get("notes") or {},
+            "status": "created",
+            "created_at": int(time.time()),
+        }
+        with server.lock:
+            server.orders[order["id"]] = order
+            lost = server.lost_responses > 0
+            server.lost_responses -= lost
+        if lost:
+            # Created, but the client never hears about it (e.g. a timeout)
+            return self.reply(504, {"error": {"code": "GATEWAY_ERROR", "description": "fake lost response"}})
+        self.reply(200, order)
+
+    def do_GET(self):
+        server = self.server
+        url = urlsplit(self.path)
+        time.sleep(server.latency)
+        if url.path.rstrip("/") != "/v1/orders":
+            return self.reply(404, {"error": {"code": "BAD_REQUEST_ERROR", "description": "not found"}})
+        if self.fail():
+            return
+        receipt = parse_qs(url.query).get("receipt", [None])[0]
+        with server.lock:
+            items = [o for o in server.orders.values() if receipt is None or o["receipt"] == receipt]
+        self.reply(200, {"entity": "collection", "count": len(items), "items": items})
+
+
+class FakeRazorpayServer(ThreadingHTTPServer):
+    """
+    In-process stand-in for api.razorpay.com, for tests and offline checkout
+    load tests: set RAZORPAY_API_URL to its `api_url`. `latency` (seconds)
+    is added to every call; `failures` is a list of HTTP statuses returned
+    by the next calls; `lost_responses` orders are created but answered
+    with a 504.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0):
+        super().__init__((host, port), FakeRazorpayHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.orders, self.failures, self.lost_responses = {}, [], 0
+
+    @property
+    def api_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        """Serve from a daemon thread; returns the server."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,23 @@
+from botocore.config import Config
+from django.conf import settings
+from storages.backends.s3 import S3Storage
+
+
+class S3MediaStorage(S3Storage):
+    """
+    S3-compatible bucket (AWS, R2, MinIO, ...) configured by the AWS_*
+    settings. django-storages creates the boto3 client on first use; its
+    connection pool is sized for the storage upload pool, and boto3 retries
+    throttling and 5xx errors with backoff. Large files go up as multipart
+    uploads without being read into memory.
+    """
+
+    def get_default_settings(self):
+        defaults = super().get_default_settings()
+        defaults["client_config"] = defaults["client_config"] or Config(
+            max_pool_connections=settings.STORAGE_UPLOAD_WORKERS * 2,
+            connect_timeout=10,
+            read_timeout=settings.STORAGE_TIMEOUT,
+            retries={"max_attempts": settings.STORAGE_RETRIES, "mode": "standard"},
+        )
+        return defaults
@@ -0,0 +1,14 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .images import schedule_image_variants
+from .models import ImageVariantsMixin
+
+
+# -------------------------------
+# Image derivatives
+# -------------------------------
+@receiver(post_save)
+def build_image_variants(sender, instance, raw=False, **kwargs):
+    if not raw and isinstance(instance, ImageVariantsMixin):
+        schedule_image_variants(instance)
@@ -0,0 +1,52 @@
+import hashlib
+import os
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, storages
+
+
+def media_storage():
+    """
+    Storage for uploaded media, as configured in STORAGES["default"]
+    (see MEDIA_STORAGE in settings). File fields pass this callable rather
+    than a backend class, so the backend is picked at runtime and no client
+    is created at import time.
+    """
+    return storages["default"]
+
+
+@lru_cache(maxsize=None)
+def upload_executor():
+    """Bounded pool shared by concurrent uploads and background deletes."""
+    return ThreadPoolExecutor(max_workers=settings.STORAGE_UPLOAD_WORKERS, thread_name_prefix="storage")
+
+
+# -------------------------------
+# Local filesystem
+# -------------------------------
+class HashedFileSystemStorage(FileSystemStorage):
+    """
+    Local stand-in for the bucket, under MEDIA_ROOT. Files are stored at
+    upload_to/<sha256 of the content><ext>, so names are deterministic and
+    uploading the same content twice writes it once. Rows that uploaded
+    identical files share it, and deleting one of them removes it for all.
+    """
+
+    def __init__(self, **kwargs):
+        # Two writers of one name are writing the same bytes
+        kwargs.setdefault("allow_overwrite", True)
+        super().__init__(**kwargs)
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        folder, basename = posixpath.split(name)
+        hashed = digest.hexdigest()
+        name = posixpath.join(folder, hashed[:2], hashed[2:] + os.path.splitext(basename)[1].lower())
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
@@ -1,50 +1,225 @@
+from django.conf import settings
+from django.core.files.base import ContentFile
 from django.core.files.storage import Storage
-from supabase import create_client
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from datetime import timedelta
+from functools import lru_cache
+from urllib.parse import quote, urlencode
+import logging
+import mimetypes
+import random
+import time
 import uuid
 import os
 
+import httpx
+
+from common.storage import upload_executor
+
+logger = logging.getLogger(__name__)
+
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 BUCKET_NAME = os.getenv("SUPABASE_BUCKET_NAME", "media")
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Optional CDN in front of the storage API (e.g. "https://cdn.example.com/"),
+# mapped to SUPABASE_URL/storage/v1/
+MEDIA_CDN_URL = os.getenv("MEDIA_CDN_URL")
+PUBLIC_URL_CACHE_SIZE = 4096
+
+
+# -------------------------------
+# Public URLs
+# -------------------------------
+def _storage_base():
+    base = MEDIA_CDN_URL or f"{(SUPABASE_URL or '').rstrip('/')}/storage/v1/"
+    return base if base.endswith("/") else f"{base}/"
+
+
+@lru_cache(maxsize=PUBLIC_URL_CACHE_SIZE)
+def public_url(name, width=None, quality=None):
+    """
+    Public URL of a file in the bucket, built locally: it's a pure function
+    of the base URL, bucket and path, so no SDK call is needed. Passing a
+    width and/or quality goes through Supabase's image transformation
+    endpoint instead of the raw object.
+    """
+    if not name:
+        return ""
+    transform = {key: value for key, value in (("width", width), ("quality", quality)) if value}
+    endpoint = "render/image" if transform else "object"
+    url = f"{_storage_base()}{endpoint}/public/{BUCKET_NAME}/{quote(name)}"
+    return f"{url}?{urlencode(transform)}" if transform else url
+
+
+# -------------------------------
+# Storage API client
+# -------------------------------
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class StorageError(Exception):
+    pass
+
+
+@lru_cache(maxsize=None)
+def _client(base_url, key):
+    """One pooled HTTP client per project, created on first use."""
+    return httpx.Client(
+        base_url=f"{base_url.rstrip('/')}/storage/v1/",
+        headers={"Authorization": f"Bearer {key}", "apikey": key},
+        timeout=httpx.Timeout(settings.STORAGE_TIMEOUT, connect=10),
+    )
+
+
+def _request(method, path, **kwargs):
+    """
+    Storage API call, retried with exponential backoff and jitter on
+    connection errors, timeouts and 429/5xx. `content` may be a callable
+    returning a fresh request body for every attempt (for streamed uploads).
+    """
+    content = kwargs.pop("content", None)
+    attempts = settings.STORAGE_RETRIES
+    for attempt in range(1, attempts + 1):
+        try:
+            response = _client(SUPABASE_URL, SUPABASE_KEY).request(
+                method, path, content=content() if callable(content) else content, **kwargs
+            )
+        except httpx.TransportError as exc:
+            error = f"{type(exc).__name__}: {exc}"
+        else:
+            if response.status_code < 400:
+                return response
+            error = f"{response.status_code} {response.text[:200]}"
+            if response.status_code not in RETRY_STATUSES:
+                break
+        if attempt < attempts:
+            time.sleep(settings.STORAGE_RETRY_BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+    raise StorageError(f"Supabase {method} {path} failed: {error}")
+
+
+def stream_upload(path, content, upsert=False):
+    """
+    Stream `content` (a Django File) to the bucket in STORAGE_UPLOAD_CHUNK_SIZE
+    chunks, so large videos are never held in memory as a whole.
+    """
+    headers = {
+        "Content-Type": getattr(content, "content_type", None)
+        or mimetypes.guess_type(path)[0] or "application/octet-stream",
+        "x-upsert": "true" if upsert else "false",
+    }
+    size = getattr(content, "size", None)
+    if size is not None:
+        headers["Content-Length"] = str(size)
+    # File.chunks() rewinds the file, so a retry resends it from the start
+    _request(
+        "POST", f"object/{BUCKET_NAME}/{quote(path)}", headers=headers,
+        content=lambda: content.chunks(settings.STORAGE_UPLOAD_CHUNK_SIZE),
+    )
+
+
+def remove_files(names):
+    """Delete files from the bucket, in one request per call."""
+    _request("DELETE", f"object/{BUCKET_NAME}", json={"prefixes": list(names)})
+
+
+# -------------------------------
+# Deferred deletes
+# -------------------------------
+def purge_deleted_files(batch_size=None):
+    """
+    Remove one batch of files queued by SupabaseStorage.delete(). Rows stay
+    locked while the request runs so concurrent purges skip them; on failure
+    they're rescheduled with backoff. Returns the number of files removed.
+    """
+    from common.models import PendingFileDeletion
+
+    batch_size = batch_size or settings.STORAGE_DELETE_BATCH_SIZE
+    now = timezone.now()
+    with transaction.atomic():
+        pending = list(
+            PendingFileDeletion.objects.select_for_update(skip_locked=True)
+            .filter(next_attempt_at__lte=now)
+            .order_by("next_attempt_at")[:batch_size]
+        )
+        if not pending:
+            return 0
+        try:
+            remove_files({row.name for row in pending})
+        except StorageError as exc:
+            logger.warning("Deferred delete of %d files failed: %s", len(pending), exc)
+            for row in pending:
+                row.attempts += 1
+                row.last_error = str(exc)
+                row.next_attempt_at = now + timedelta(minutes=2 ** min(row.attempts, 10))
+            PendingFileDeletion.objects.bulk_update(pending, ["attempts", "last_error", "next_attempt_at"])
+            return 0
+        PendingFileDeletion.objects.filter(pk__in=[row.pk for row in pending]).delete()
+    return len(pending)
+
+
+def _purge_in_background():
+    try:
+        while purge_deleted_files():
+            pass
+    finally:
+        close_old_connections()
+
 
 class SupabaseStorage(Storage):
-    """Custom Django Storage backend for Supabase."""
+    """
+    Custom Django Storage backend for Supabase.
+
+    Uploads get a random prefix so they never collide; with
+    unique_names=False names are kept as given and overwrite.
+    """
+
+    def __init__(self, unique_names=True):
+        self.unique_names = unique_names
+
+    def _open(self, name, mode="rb"):
+        response = _request("GET", f"object/{BUCKET_NAME}/{quote(name)}")
+        return ContentFile(response.content, name=name)
 
     def _save(self, name, content):
         """
         Uploads a file to Supabase and returns the path to store in DB.
         """
+        if not self.unique_names:
+            stream_upload(name, content, upsert=True)
+            return name
+
         folder = os.path.dirname(name)  # "videos", "banners", etc.
         basename = os.path.basename(name)
         unique_name = f"{uuid.uuid4().hex}_{basename}"
         path_in_bucket = f"{folder}/{unique_name}" if folder else unique_name
 
-        # Upload content
-        response = supabase.storage.from_(BUCKET_NAME).upload(path_in_bucket, content.read())
-        if hasattr(response, "error") and response.error:
-            raise Exception(f"Supabase upload error: {response.error}")
+        stream_upload(path_in_bucket, content)
 
         # Return path to store in DB
         return path_in_bucket
 
     def delete(self, name):
+        """
+        Queue the file for deletion once the current transaction commits (a
+        rolled back delete leaves the file alone) and purge it in the
+        background; `purge_deleted_files` retries whatever fails.
+        """
         if not name:
             return
-        try:
-            # name = "videos/uuid_filename.mp4"
-            supabase.storage.from_(BUCKET_NAME).remove([name])
-            print(f"Deleted from Supabase: {name}")
-        except Exception as e:
-            print(f"Error deleting {name} from Supabase: {e}")
+        from common.models import PendingFileDeletion
 
+        PendingFileDeletion.objects.create(name=name)
+        transaction.on_commit(lambda: upload_executor().submit(_purge_in_background))
 
     def url(self, name):
         """Return the public URL of a file."""
-        if not name:
-            return ""
-        return supabase.storage.from_(BUCKET_NAME).get_public_url(name)
+        return public_url(name)
+
+    def image_url(self, name, width=None, quality=None):
+        """Public URL of a resized/recompressed rendition of an image."""
+        return public_url(name, width, quality)
 
     def exists(self, name):
         """Always allow overwriting files with same name."""
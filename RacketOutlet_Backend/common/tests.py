@@ -0,0 +1,486 @@
+import hashlib
+import io
+import json
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.core import mail
+from django.core.cache import caches
+from django.core.cache.backends import locmem
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from common import razorpay_client, supabase_storage_backend
+from common.cache import CacheNamespace
+from common.images import blurhash, refresh_image_variants
+from common.jobs import job, run_due_jobs
+from common.models import Job, PendingFileDeletion, upload_pending_files
+from common.razorpay_fake import FakeRazorpayServer
+from common.storage import HashedFileSystemStorage
+from common.supabase_storage_backend import (
+    BUCKET_NAME, StorageError, SupabaseStorage, purge_deleted_files, upload_executor,
+)
+from common.utils import send_email
+from products.models import Category, Product, ProductImage, SubCategory
+from products.serializers import ProductImageSerializer
+
+
+# -------------------------------
+# Fake Supabase storage API
+# -------------------------------
+class FakeStorageHandler(BaseHTTPRequestHandler):
+    prefix = f"/storage/v1/object/{BUCKET_NAME}"
+
+    def log_message(self, *args):
+        pass
+
+    def read_body(self):
+        if "Content-Length" in self.headers:
+            return self.rfile.read(int(self.headers["Content-Length"]))
+        body = b""
+        while size := int(self.rfile.readline().strip(), 16):
+            body += self.rfile.read(size)
+            self.rfile.readline()
+        self.rfile.readline()
+        return body
+
+    def reply(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def handle_request(self, apply):
+        server = self.server
+        body = self.read_body()
+        server.requests.append((self.command, self.path))
+        if server.failures:
+            status = server.failures.pop(0)
+            return self.reply(status, {"error": "fake failure"})
+        self.reply(200, apply(body))
+
+    def do_POST(self):
+        name = unquote(self.path.removeprefix(self.prefix + "/"))
+        self.handle_request(lambda body: self.server.objects.__setitem__(name, body) or {"Key": name})
+
+    def do_DELETE(self):
+        def remove(body):
+            for name in json.loads(body)["prefixes"]:
+                self.server.objects.pop(name, None)
+            return []
+        self.handle_request(remove)
+
+
+@override_settings(STORAGE_RETRY_BACKOFF=0, STORAGE_UPLOAD_CHUNK_SIZE=4)
+class SupabaseStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeStorageHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.addClassCleanup(cls.server.server_close)
+        cls.addClassCleanup(cls.server.shutdown)
+
+    def setUp(self):
+        self.server.objects, self.server.requests, self.server.failures = {}, [], []
+        for name, value in (("SUPABASE_URL", f"http://127.0.0.1:{self.server.server_port}"), ("SUPABASE_KEY", "service-key")):
+            patcher = mock.patch.object(supabase_storage_backend, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_streamed_upload_retries_transient_errors(self):
+        self.server.failures = [503, 429]
+        name = SupabaseStorage().save("home_videos/clip.mp4", ContentFile(b"0123456789"))
+
+        self.assertTrue(name.startswith("home_videos/") and name.endswith("_clip.mp4"))
+        self.assertEqual(self.server.objects, {name: b"0123456789"})
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_client_errors_are_not_retried(self):
+        self.server.failures = [400]
+        with self.assertRaises(StorageError):
+            SupabaseStorage().save("a.jpg", ContentFile(b"x"))
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_deletes_are_deferred_and_retried(self):
+        self.server.objects = {"a.jpg": b"x"}
+        with self.captureOnCommitCallbacks() as callbacks:
+            SupabaseStorage().delete("a.jpg")
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.server.requests, [])
+
+        self.server.failures = [500] * 4
+        with self.assertLogs("common.supabase_storage_backend", "WARNING"):
+            self.assertEqual(purge_deleted_files(), 0)
+        pending = PendingFileDeletion.objects.get()
+        self.assertEqual(pending.attempts, 1)
+        self.assertGreater(pending.next_attempt_at, timezone.now())
+        self.assertEqual(purge_deleted_files(), 0)  # not due yet
+
+        PendingFileDeletion.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(purge_deleted_files(), 1)
+        self.assertEqual(self.server.objects, {})
+        self.assertFalse(PendingFileDeletion.objects.exists())
+
+    def test_pending_files_upload_concurrently(self):
+        images = [ProductImage(image=ContentFile(b"img", name=f"{n}.jpg")) for n in range(3)]
+        executor = upload_executor()
+        with mock.patch.object(ProductImage._meta.get_field("image"), "storage", SupabaseStorage()), \
+                mock.patch.object(executor, "submit", wraps=executor.submit) as submit:
+            upload_pending_files(images)
+
+        self.assertEqual(submit.call_count, 3)
+        self.assertEqual(set(self.server.objects), {image.image.name for image in images})
+        self.assertTrue(all(image.image._committed for image in images))
+
+
+class HashedFileSystemStorageTests(TestCase):
+    def test_files_are_content_addressed(self):
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        storage = HashedFileSystemStorage(location=location.name, base_url="/media/")
+
+        first = storage.save("product_images/Racket.JPG", ContentFile(b"same"))
+        again = storage.save("product_images/other.jpg", ContentFile(b"same"))
+        other = storage.save("product_images/other.jpg", ContentFile(b"different"))
+
+        digest = hashlib.sha256(b"same").hexdigest()
+        self.assertEqual(first, f"product_images/{digest[:2]}/{digest[2:]}.jpg")
+        self.assertEqual(again, first)
+        self.assertNotEqual(other, first)
+        self.assertEqual(storage.url(first), f"/media/{first}")
+        with storage.open(first) as stored:
+            self.assertEqual(stored.read(), b"same")
+
+
+# -------------------------------
+# Image derivatives
+# -------------------------------
+def run_enqueue_callbacks(callbacks):
+    """Run only the job queue's on_commit callbacks (not e.g. the homepage snapshot rebuild)."""
+    for callback in callbacks:
+        if callback.__qualname__ == "enqueue.<locals>.create":
+            callback()
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        self.location = location.name
+        derivatives = {
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+            "OPTIONS": {"location": location.name, "base_url": "/media/", "allow_overwrite": True},
+        }
+        override = override_settings(
+            STORAGES={**settings.STORAGES, "derivatives": derivatives}, IMAGE_DERIVATIVE_WIDTHS=(16, 64),
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        patcher = mock.patch.object(
+            ProductImage._meta.get_field("image"), "storage", HashedFileSystemStorage(location=location.name),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        category = Category.objects.create(name="Tennis")
+        subcategory = SubCategory.objects.create(name="Rackets", parent_category=category)
+        self.product = Product.objects.create(name="R", description="-", subcategory=subcategory, price=10, sku="R-1")
+
+    def test_blurhash(self):
+        self.assertEqual(blurhash(Image.new("RGB", (8, 8))), "L00000fQfQfQfQfQfQfQfQfQfQfQ")
+
+    def test_derivatives_are_built_off_the_save_and_serialized(self):
+        png = io.BytesIO()
+        Image.new("RGB", (40, 30), (200, 30, 30)).save(png, "PNG")
+        image = ProductImage(product=self.product, image=ContentFile(png.getvalue(), name="r.png"))
+        with self.captureOnCommitCallbacks() as callbacks:
+            image.save()
+        run_enqueue_callbacks(callbacks)
+        self.assertEqual(Job.objects.get().payload, {"model": "products.ProductImage", "pk": image.pk})
+        self.assertEqual(image.image_variants, {})
+
+        refresh_image_variants(image)
+        image.refresh_from_db()
+        variants = image.image_variants
+        digest = variants["digest"]
+        self.assertEqual((variants["source"], variants["width"], variants["height"]), (image.image.name, 40, 30))
+        self.assertEqual(set(variants["srcset"]), {"avif", "webp", "jpeg"})
+        prefix = f"/media/derivatives/{digest[:2]}/{digest}"
+        self.assertEqual(variants["srcset"]["webp"], f"{prefix}/16.webp 16w, {prefix}/40.webp 40w")
+        with Image.open(f"{self.location}/derivatives/{digest[:2]}/{digest}/16.avif") as rendition:
+            self.assertEqual(rendition.size, (16, 12))
+
+        data = ProductImageSerializer(image).data
+        self.assertEqual(data["image_srcset"], variants["srcset"])
+        self.assertEqual(data["image_placeholder"], variants["placeholder"])
+
+        # Saving without touching the image doesn't rebuild anything
+        Job.objects.all().delete()
+        with self.captureOnCommitCallbacks() as callbacks:
+            image.save()
+        run_enqueue_callbacks(callbacks)
+        self.assertFalse(Job.objects.exists())
+
+
+# -------------------------------
+# Cache namespaces
+# -------------------------------
+def local_caches(*namespaces):
+    """
+    Give namespaces that aren't cached in this environment (no REDIS_URL) a
+    per-process cache, for tests of the caching itself.
+    """
+    return override_settings(CACHES={
+        **settings.CACHES,
+        **{
+            name: {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": name}
+            for name in namespaces
+            if settings.CACHES[name]["BACKEND"].endswith("DummyCache")
+        },
+    })
+
+
+class ProcessCacheNamespace(CacheNamespace):
+    """A namespace as a separate worker process sees it: its own connection, and its own memory."""
+
+    def __init__(self, name):
+        super().__init__(name)
+        with mock.patch.dict(locmem._caches, clear=True), mock.patch.dict(locmem._expire_info, clear=True), \
+                mock.patch.dict(locmem._locks, clear=True):
+            self._cache = caches.create_connection(name)
+
+    @property
+    def cache(self):
+        return self._cache
+
+
+class CrossProcessCacheTests(SimpleTestCase):
+    def test_writes_from_one_process_reach_the_others(self):
+        for name in settings.CACHE_NAMESPACES:
+            with self.subTest(name):
+                web, worker = ProcessCacheNamespace(name), ProcessCacheNamespace(name)
+                web.cache.clear()
+                web.set("orders", value="before", scope="user:1")
+                web.set("unread", 1, value=3)
+
+                worker.invalidate(scope="user:1")
+                worker.incr("unread", 1)
+                self.assertIsNone(web.get("orders", scope="user:1"))
+                self.assertNotEqual(web.get("unread", 1), 3)
+
+
+@local_caches("catalog")
+class CacheNamespaceTests(SimpleTestCase):
+    def setUp(self):
+        self.ns = CacheNamespace("catalog", timeout=60, lock_timeout=2, poll_interval=0.01)
+        self.ns.cache.clear()
+
+    def test_invalidate_makes_old_keys_unreachable(self):
+        self.ns.set("product", 1, value="old")
+        self.ns.set("orders", value="mine", scope="user:1")
+        self.ns.set("orders", value="theirs", scope="user:2")
+
+        self.ns.invalidate(scope="user:1")
+        self.assertIsNone(self.ns.get("orders", scope="user:1"))
+        self.assertEqual(self.ns.get("orders", scope="user:2"), "theirs")
+        self.assertEqual(self.ns.get("product", 1), "old")
+
+        self.ns.invalidate()
+        self.assertIsNone(self.ns.get("product", 1))
+        self.assertIsNone(self.ns.get("orders", scope="user:2"))
+        self.ns.set("product", 1, value="new")
+        self.assertEqual(self.ns.get("product", 1), "new")
+
+    def test_invalidate_survives_an_evicted_generation(self):
+        self.ns.set("product", 1, value="old")
+        self.ns.cache.delete("gen")
+        time.sleep(0.002)  # generations restart from the clock, in milliseconds
+        self.ns.invalidate()
+        self.assertIsNone(self.ns.get("product", 1))
+
+    def test_incr_only_moves_cached_counters(self):
+        self.assertIsNone(self.ns.incr("unread", 1))
+        self.ns.set("unread", 1, value=3)
+        self.assertEqual(self.ns.incr("unread", 1, delta=-2), 1)
+
+    def test_get_or_build_runs_one_builder_for_concurrent_misses(self):
+        builds, barrier = [], threading.Barrier(5)
+
+        def builder():
+            builds.append(1)
+            time.sleep(0.2)
+            return "page"
+
+        def read(results):
+            barrier.wait()
+            results.append(self.ns.get_or_build(("page", 1), builder))
+
+        results = []
+        threads = [threading.Thread(target=read, args=(results,)) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(results, ["page"] * 5)
+
+    def test_lock_serializes_read_modify_write(self):
+        events = []
+
+        def hold():
+            with self.ns.lock("cart", 1):
+                events.append("first in")
+                time.sleep(0.1)
+                events.append("first out")
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        while not events:
+            time.sleep(0.01)
+        with self.ns.lock("cart", 1):
+            events.append("second in")
+        thread.join()
+        self.assertEqual(events, ["first in", "first out", "second in"])
+
+    def test_timed_out_lock_is_left_to_its_holder(self):
+        ns = CacheNamespace("catalog", lock_timeout=0.05, poll_interval=0.01)
+        ns.cache.add("lock:cart:1", 1, timeout=60)  # held by another worker
+        with ns.lock("cart", 1):
+            pass
+        self.assertEqual(ns.cache.get("lock:cart:1"), 1)
+
+
+# -------------------------------
+# Job queue
+# -------------------------------
+calls = []
+
+
+@job(max_attempts=2)
+def record_call(fail=False):
+    calls.append(fail)
+    if fail:
+        raise ValueError("boom")
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueued_on_commit_and_deleted_when_done(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            record_call.enqueue()
+            self.assertFalse(Job.objects.exists())
+        self.assertEqual(Job.objects.get().task, "common.tests.record_call")
+
+        self.assertEqual(run_due_jobs(), 1)
+        self.assertEqual(calls, [False])
+        self.assertFalse(Job.objects.exists())
+
+    def test_failures_back_off_then_dead_letter(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            record_call.enqueue(fail=True)
+
+        with self.assertLogs("common.jobs", "WARNING"):
+            run_due_jobs()
+        failed = Job.objects.get()
+        self.assertEqual((failed.status, failed.attempts), (Job.QUEUED, 1))
+        self.assertGreater(failed.run_at, timezone.now())
+        self.assertIn("ValueError: boom", failed.last_error)
+        self.assertEqual(run_due_jobs(), 0)  # backing off
+
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs("common.jobs", "WARNING"):
+            run_due_jobs()
+        failed.refresh_from_db()
+        self.assertEqual((failed.status, failed.attempts), (Job.DEAD, 2))
+        self.assertEqual(run_due_jobs(), 0)
+
+    def test_jobs_of_dead_workers_are_claimed_again(self):
+        Job.objects.create(
+            task="common.tests.record_call", max_attempts=3, attempts=1,
+            status=Job.RUNNING, locked_at=timezone.now() - settings.JOB_LOCK_TIMEOUT - timedelta(seconds=1),
+        )
+        Job.objects.create(task="common.tests.record_call", max_attempts=3, status=Job.RUNNING, locked_at=timezone.now())
+        self.assertEqual(run_due_jobs(), 1)
+        self.assertEqual(calls, [False])
+
+    def test_send_email_runs_on_the_queue(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            send_email("player@example.com", "Order Confirmation", "<p>Thanks!</p>")
+        self.assertEqual(mail.outbox, [])
+
+        run_due_jobs()
+        self.assertEqual(mail.outbox[0].to, ["player@example.com"])
+        self.assertEqual(mail.outbox[0].alternatives[0][0], "<p>Thanks!</p>")
+
+
+# -------------------------------
+# Razorpay gateway
+# -------------------------------
+class RazorpayGatewayTestCase(TestCase):
+    """Points common.razorpay_client at an in-process FakeRazorpayServer."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.gateway = FakeRazorpayServer().start()
+        cls.addClassCleanup(cls.gateway.stop)
+
+    def setUp(self):
+        self.gateway.reset()
+        override = override_settings(RAZORPAY_API_URL=self.gateway.api_url, RAZORPAY_RETRY_BACKOFF=0)
+        override.enable()
+        self.addCleanup(override.disable)
+        for name, value in (("RAZORPAY_KEY_ID", "rzp_test"), ("RAZORPAY_KEY_SECRET", "secret")):
+            patcher = mock.patch.object(razorpay_client, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        razorpay_client.breaker.cache_clear()
+        self.addCleanup(razorpay_client.breaker.cache_clear)
+
+
+class RazorpayClientTests(RazorpayGatewayTestCase):
+    def test_retries_never_create_a_second_order(self):
+        self.gateway.failures = [503]
+        created = razorpay_client.create_order(10000, receipt="ORD-1")
+        self.assertEqual((created["amount"], created["receipt"]), (10000, "ORD-1"))
+
+        self.gateway.lost_responses = 1
+        lost = razorpay_client.create_order(5000, receipt="ORD-2")
+        self.assertEqual(lost["receipt"], "ORD-2")
+        self.assertEqual(sorted(o["receipt"] for o in self.gateway.orders.values()), ["ORD-1", "ORD-2"])
+
+    @override_settings(RAZORPAY_BREAKER_THRESHOLD=2)
+    def test_circuit_breaker_fails_fast(self):
+        self.gateway.failures = [503] * 10
+        with self.assertLogs("common.razorpay_client", "WARNING"), self.assertRaises(razorpay_client.GatewayUnavailable):
+            razorpay_client.create_order(10000, receipt="ORD-1")
+        self.assertEqual(len(self.gateway.failures), 8)
+
+        with self.assertRaises(razorpay_client.GatewayUnavailable):
+            razorpay_client.create_order(10000, receipt="ORD-1")
+        self.assertEqual(len(self.gateway.failures), 8)  # rejected without calling the gateway
+
+        self.gateway.failures = []
+        razorpay_client.breaker().opened_at -= settings.RAZORPAY_BREAKER_RESET_TIMEOUT
+        self.assertEqual(razorpay_client.create_order(10000, receipt="ORD-1")["receipt"], "ORD-1")
+        self.assertFalse(razorpay_client.breaker().is_open())
+
+    def test_payment_signatures(self):
+        signature = razorpay_client.payment_signature("order_1", "pay_1")
+        razorpay_client.verify_payment_signature("order_1", "pay_1", signature)
+        with self.assertRaises(razorpay_client.SignatureVerificationError):
+            razorpay_client.verify_payment_signature("order_1", "pay_2", signature)
+
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('homepage', '0007_shopthelook_hotspot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='banner',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='shopthelook',
+            name='player_image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
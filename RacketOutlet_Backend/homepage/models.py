@@ -1,17 +1,16 @@
 from django.db import models
 from products.models import Product
-from common.supabase_storage_backend import SupabaseStorage
-
-def get_supabase_storage():
-    return SupabaseStorage()
+from common.storage import media_storage
+from common.models import ImageVariantsMixin, PublicUrlMixin
 
 # -------------------------
 # Banner Model
 # -------------------------
-class Banner(models.Model):
+class Banner(ImageVariantsMixin, models.Model):
     title = models.CharField(max_length=255)
     subtitle = models.CharField(max_length=255, blank=True, null=True)
-    image = models.ImageField(storage=SupabaseStorage, upload_to="banners/")
+    image = models.ImageField(storage=media_storage, upload_to="banners/")
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     subcategory = models.ForeignKey(
         "products.SubCategory",
@@ -30,6 +29,8 @@ class Banner(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)  # For ordering
 
+    image_variant_fields = {"image": "image_variants"}
+
     def delete(self, *args, **kwargs):
         """Ensure file is deleted from Supabase before DB record is removed."""
         if self.image and self.image.name:
@@ -60,9 +61,9 @@ class HomeCategories(models.Model):
 # -------------------------
 # HomeVideo Model
 # -------------------------
-class HomeVideo(models.Model):
+class HomeVideo(PublicUrlMixin, models.Model):
     video = models.FileField(
-        storage=SupabaseStorage,
+        storage=media_storage,
         upload_to="videos/",
         null=True,
         blank=True
@@ -70,14 +71,7 @@ class HomeVideo(models.Model):
     video_url = models.URLField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
-    def save(self, *args, **kwargs):
-        """Save first, then update video_url."""
-        super().save(*args, **kwargs)
-        if self.video and self.video.name:
-            url = self.video.storage.url(self.video.name)
-            if url != self.video_url:
-                self.video_url = url
-                super().save(update_fields=["video_url"])
+    public_url_fields = {"video": "video_url"}
 
     def delete(self, *args, **kwargs):
         """Delete from Supabase first, then DB record."""
@@ -126,9 +120,12 @@ class FeaturedProduct(models.Model):
 # -------------------------
 # ShopTheLook Model
 # -------------------------
-class ShopTheLook(models.Model):
+class ShopTheLook(ImageVariantsMixin, models.Model):
     title = models.CharField(max_length=200, default="Shop the Look")
-    player_image = models.ImageField(storage=SupabaseStorage, upload_to="shop_look/")
+    player_image = models.ImageField(storage=media_storage, upload_to="shop_look/")
+    player_image_variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    image_variant_fields = {"player_image": "player_image_variants"}
 
     def delete(self, *args, **kwargs):
         """Delete player image from Supabase when record is deleted."""
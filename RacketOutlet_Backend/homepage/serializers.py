@@ -10,15 +10,20 @@ from .models import (
 )
 from products.models import Product, SubCategory
 from products.serializers import ProductSerializer
+from common.images import ImageVariantField
+from common.prefetch import register_prefetch_plan
 
 
 # -------------------------
 # Banner Serializer
 # -------------------------
 class BannerSerializer(serializers.ModelSerializer):
+    image_srcset = ImageVariantField("srcset", source="image_variants")
+    image_placeholder = ImageVariantField("placeholder", source="image_variants")
+
     class Meta:
         model = Banner
-        fields = ["id", "title", "subtitle", "image", "subcategory", "product"]
+        fields = ["id", "title", "subtitle", "image", "image_srcset", "image_placeholder", "subcategory", "product"]
 
 
 # -------------------------
@@ -92,7 +97,19 @@ class HotspotSerializer(serializers.ModelSerializer):
 # -------------------------
 class ShopTheLookSerializer(serializers.ModelSerializer):
     hotspots = HotspotSerializer(many=True, read_only=True)  # include all hotspots
+    player_image_srcset = ImageVariantField("srcset", source="player_image_variants")
+    player_image_placeholder = ImageVariantField("placeholder", source="player_image_variants")
 
     class Meta:
         model = ShopTheLook
-        fields = ["id", "title", "player_image", "hotspots"]
+        fields = ["id", "title", "player_image", "player_image_srcset", "player_image_placeholder", "hotspots"]
+
+
+# -------------------------
+# Prefetch plans
+# -------------------------
+register_prefetch_plan(HomeCategoriesSerializer, "subcategory")
+register_prefetch_plan(ExclusiveProductSerializer, product=ProductSerializer)
+register_prefetch_plan(FeaturedProductSerializer, product=ProductSerializer)
+register_prefetch_plan(HotspotSerializer, product=ProductSerializer)
+register_prefetch_plan(ShopTheLookSerializer, hotspots=HotspotSerializer)
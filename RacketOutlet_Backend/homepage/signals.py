@@ -1,6 +1,16 @@
-from django.db.models.signals import pre_save, post_delete
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from .models import Banner, HomeVideo, ShopTheLook
+from .models import (
+    Banner,
+    HomeCategories,
+    HomeVideo,
+    ExclusiveProduct,
+    FeaturedProduct,
+    ShopTheLook,
+    Hotspot,
+)
+from .snapshot import schedule_rebuild
+from products.models import Category, SubCategory, Product, ProductImage, Inventory
 
 
 # -------------------------
@@ -71,3 +81,32 @@ def auto_delete_old_player_image(sender, instance, **kwargs):
 def auto_delete_player_image_on_delete(sender, instance, **kwargs):
     if instance.player_image and instance.player_image.name:
         instance.player_image.storage.delete(instance.player_image.name)
+
+
+# -------------------------
+# Homepage snapshot rebuild
+# -------------------------
+SNAPSHOT_SOURCE_MODELS = (
+    Banner,
+    HomeCategories,
+    HomeVideo,
+    ExclusiveProduct,
+    FeaturedProduct,
+    ShopTheLook,
+    Hotspot,
+    Category,
+    SubCategory,
+    Product,
+    ProductImage,
+    Inventory,
+)
+
+
+def rebuild_homepage_snapshot(sender, instance, **kwargs):
+    """Any change to data shown on the homepage schedules a snapshot rebuild."""
+    schedule_rebuild()
+
+
+for model in SNAPSHOT_SOURCE_MODELS:
+    post_save.connect(rebuild_homepage_snapshot, sender=model, dispatch_uid=f"homepage_snapshot_save_{model.__name__}")
+    post_delete.connect(rebuild_homepage_snapshot, sender=model, dispatch_uid=f"homepage_snapshot_delete_{model.__name__}")
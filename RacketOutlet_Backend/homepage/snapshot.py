@@ -0,0 +1,142 @@
+import hashlib
+import json
+import logging
+import threading
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+
+from .models import (
+    Banner,
+    HomeCategories,
+    HomeVideo,
+    ExclusiveProduct,
+    FeaturedProduct,
+    ShopTheLook,
+)
+from .serializers import (
+    BannerSerializer,
+    HomeCategoriesSerializer,
+    HomeVideoSerializer,
+    ExclusiveProductSerializer,
+    FeaturedProductSerializer,
+    ShopTheLookSerializer,
+)
+from products.models import Category
+from products.serializers import CategoryWithSubSerializer
+from common.cache import homepage_cache
+from common.prefetch import apply_prefetch_plan
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION_KEY = "snapshot:version"
+
+_rebuild_lock = threading.Lock()
+_rebuild_pending = threading.Event()
+
+
+# -------------------------
+# Payload
+# -------------------------
+def build_payload():
+    """Run the homepage querysets and return the serialized response dict."""
+    banners = BannerSerializer(Banner.objects.all().order_by("-created_at"), many=True).data
+    categories = HomeCategoriesSerializer(
+        apply_prefetch_plan(HomeCategories.objects.order_by("-created_at"), HomeCategoriesSerializer), many=True
+    ).data
+    videos = HomeVideoSerializer(HomeVideo.objects.all().order_by("-created_at"), many=True).data
+    exclusive_products = ExclusiveProductSerializer(
+        apply_prefetch_plan(ExclusiveProduct.objects.order_by("-created_at"), ExclusiveProductSerializer), many=True
+    ).data
+    featured_products = FeaturedProductSerializer(
+        apply_prefetch_plan(FeaturedProduct.objects.order_by("-created_at"), FeaturedProductSerializer), many=True
+    ).data
+    shop_the_look = ShopTheLookSerializer(
+        apply_prefetch_plan(ShopTheLook.objects.order_by("-id"), ShopTheLookSerializer), many=True
+    ).data
+    featured_categories = CategoryWithSubSerializer(
+        apply_prefetch_plan(
+            Category.objects.filter(is_featured=True, is_active=True).order_by("id"), CategoryWithSubSerializer
+        ),
+        many=True
+    ).data
+
+    return {
+        "featured_categories": featured_categories,
+        "banners": banners,
+        "categories": categories,
+        "videos": videos,
+        "exclusive_products": exclusive_products,
+        "shop_the_look": shop_the_look,
+        "featured_products": featured_products,
+    }
+
+
+# -------------------------
+# Snapshot build / read
+# -------------------------
+def _next_version():
+    cache = homepage_cache.cache
+    cache.add(SNAPSHOT_VERSION_KEY, 0, timeout=None)
+    try:
+        return cache.incr(SNAPSHOT_VERSION_KEY)
+    except ValueError:
+        # Version key was evicted between add() and incr()
+        cache.set(SNAPSHOT_VERSION_KEY, 1, timeout=None)
+        return 1
+
+
+def render_snapshot():
+    """
+    Serialize the homepage once into JSON bytes with a version number
+    and a content ETag.
+    """
+    body = json.dumps(build_payload(), cls=DjangoJSONEncoder, separators=(",", ":")).encode("utf-8")
+    return {
+        "version": _next_version(),
+        "etag": hashlib.sha1(body).hexdigest(),
+        "body": body,
+    }
+
+
+def build_snapshot():
+    """Render the snapshot and replace the cached one."""
+    snapshot = render_snapshot()
+    homepage_cache.set("snapshot", value=snapshot)
+    return snapshot
+
+
+def get_snapshot():
+    """Return the cached snapshot; on a cold cache only one worker renders it."""
+    return homepage_cache.get_or_build(("snapshot",), render_snapshot)
+
+
+# -------------------------
+# Background rebuild
+# -------------------------
+def _rebuild_worker():
+    # Coalesce bursts (admin bulk edits, seed runs) into as few rebuilds as possible:
+    # while a rebuild is running, further requests just mark it pending.
+    while True:
+        while _rebuild_pending.is_set():
+            _rebuild_pending.clear()
+            try:
+                build_snapshot()
+            except Exception:
+                logger.exception("Homepage snapshot rebuild failed")
+        _rebuild_lock.release()
+        # A request may have arrived between the last check and the release
+        if not _rebuild_pending.is_set() or not _rebuild_lock.acquire(blocking=False):
+            connection.close()
+            return
+
+
+def _start_rebuild():
+    _rebuild_pending.set()
+    if _rebuild_lock.acquire(blocking=False):
+        threading.Thread(target=_rebuild_worker, daemon=True).start()
+
+
+def schedule_rebuild():
+    """Rebuild the snapshot in the background once the current transaction commits."""
+    transaction.on_commit(_start_rebuild)
@@ -1,3 +1,79 @@
+from unittest import mock
+
+from django.core.cache import caches
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from common.tests import local_caches
+from products.models import Category
+from . import snapshot
+
+
+def clear_caches():
+    for cache in caches.all():
+        cache.clear()
+
+
+# -------------------------
+# Homepage snapshot
+# -------------------------
+@local_caches("homepage")
+class HomePageSnapshotTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+
+    def test_etag_answers_304_until_the_snapshot_changes(self):
+        first = self.client.get("/api/homepage/")
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json()["featured_categories"], [])
+        etag = first["ETag"]
+
+        with self.assertNumQueries(0):
+            cached = self.client.get("/api/homepage/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached["ETag"], etag)
+
+        Category.objects.create(name="Padel", is_featured=True)
+        snapshot.build_snapshot()
+        changed = self.client.get("/api/homepage/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], etag)
+        self.assertGreater(int(changed["X-Snapshot-Version"]), int(first["X-Snapshot-Version"]))
+        self.assertEqual([c["name"] for c in changed.json()["featured_categories"]], ["Padel"])
+
+    def test_saves_schedule_a_rebuild_after_commit(self):
+        with mock.patch.object(snapshot, "_start_rebuild") as start:
+            with self.captureOnCommitCallbacks(execute=True):
+                category = Category.objects.create(name="Squash")
+                self.assertFalse(start.called)
+            self.assertEqual(start.call_count, 1)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                category.delete()
+            self.assertEqual(start.call_count, 2)
+
+    def test_rebuild_requests_coalesce_while_one_runs(self):
+        with mock.patch.object(snapshot, "build_snapshot") as build, \
+                mock.patch.object(snapshot.threading, "Thread") as thread, \
+                mock.patch.object(snapshot, "connection"):
+            # A rebuild is already running: further requests only mark one pending
+            snapshot._rebuild_lock.acquire()
+            for _ in range(3):
+                snapshot._start_rebuild()
+            self.assertFalse(thread.called)
+
+            snapshot._rebuild_worker()
+        self.assertEqual(build.call_count, 1)
+        self.assertFalse(snapshot._rebuild_pending.is_set())
+        self.assertFalse(snapshot._rebuild_lock.locked())
 
-# Create your tests here.
+    def test_failed_rebuild_is_logged(self):
+        snapshot._rebuild_lock.acquire()
+        snapshot._rebuild_pending.set()
+        with mock.patch.object(snapshot, "build_snapshot", side_effect=RuntimeError("boom")), \
+                mock.patch.object(snapshot, "connection"), \
+                self.assertLogs("homepage.snapshot", "ERROR") as logs:
+            snapshot._rebuild_worker()
+        self.assertIn("boom", logs.output[0])
+        self.assertFalse(snapshot._rebuild_lock.locked())
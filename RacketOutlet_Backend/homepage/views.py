@@ -18,43 +18,33 @@ from .serializers import (
 )
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from products.models import Category  # adjust if the model is different
-from products.serializers import CategoryWithSubSerializer
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+from .snapshot import get_snapshot
+from common.prefetch import apply_prefetch_plan
 
 
 class HomePageView(APIView):
     """    A single API endpoint that aggregates all homepage data.
+
+    Serves the pre-serialized snapshot from homepage.snapshot; the
+    snapshot is rebuilt in the background by homepage.signals.
     """
     permission_classes = [AllowAny]
 
     def get(self, request, *args, **kwargs):
-        banners = BannerSerializer(Banner.objects.all().order_by("-created_at"), many=True).data
-        categories = HomeCategoriesSerializer(HomeCategories.objects.all().order_by("-created_at"), many=True).data
-        videos = HomeVideoSerializer(HomeVideo.objects.all().order_by("-created_at"), many=True).data
-        exclusive_products = ExclusiveProductSerializer(
-            ExclusiveProduct.objects.select_related("product").order_by("-created_at"), many=True
-        ).data
-        featured_products = FeaturedProductSerializer(
-            FeaturedProduct.objects.select_related("product").order_by("-created_at"), many=True
-        ).data
-        shop_the_look = ShopTheLookSerializer(ShopTheLook.objects.all().order_by("-id"), many=True).data
-        # featured_categories = FeaturedCategorySerializer(
-        #     Category.objects.filter(is_featured=True, is_active=True).order_by("id"), many=True
-        # ).data
-        featured_categories = CategoryWithSubSerializer(
-    Category.objects.filter(is_featured=True, is_active=True).prefetch_related("subcategories").order_by("id"),
-    many=True
-).data
-
-        return Response({
-            "featured_categories": featured_categories,   # ✅ added
-            "banners": banners,
-            "categories": categories,
-            "videos": videos,
-            "exclusive_products": exclusive_products,
-            "shop_the_look": shop_the_look,
-            "featured_products": featured_products,
-        })
+        snapshot = get_snapshot()
+        etag = quote_etag(snapshot["etag"])
+
+        if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+        if if_none_match and (if_none_match.strip() == "*" or etag in parse_etags(if_none_match)):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(snapshot["body"], content_type="application/json")
+
+        response["ETag"] = etag
+        response["X-Snapshot-Version"] = str(snapshot["version"])
+        return response
 
 
 
@@ -78,7 +68,7 @@ class HomeCategoriesViewSet(viewsets.ReadOnlyModelViewSet):
     """
     API endpoint to view Home Categories.
     """
-    queryset = HomeCategories.objects.all().order_by("-created_at")
+    queryset = apply_prefetch_plan(HomeCategories.objects.order_by("-created_at"), HomeCategoriesSerializer)
     serializer_class = HomeCategoriesSerializer
     permission_classes = [AllowAny]
 
@@ -102,7 +92,7 @@ class ExclusiveProductViewSet(viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for Exclusive Products (Read-only).
     """
-    queryset = ExclusiveProduct.objects.select_related("product").order_by("-created_at")
+    queryset = apply_prefetch_plan(ExclusiveProduct.objects.order_by("-created_at"), ExclusiveProductSerializer)
     serializer_class = ExclusiveProductSerializer
     permission_classes = [AllowAny]
 
@@ -114,7 +104,7 @@ class FeaturedProductViewSet(viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for Featured Products (Read-only).
     """
-    queryset = FeaturedProduct.objects.select_related("product").order_by("-created_at")
+    queryset = apply_prefetch_plan(FeaturedProduct.objects.order_by("-created_at"), FeaturedProductSerializer)
     serializer_class = FeaturedProductSerializer
     permission_classes = [AllowAny]
 
@@ -127,6 +117,6 @@ class ShopTheLookViewSet(viewsets.ModelViewSet):
     API endpoint for Shop The Look.
     Allows full CRUD operations.
     """
-    queryset = ShopTheLook.objects.all()
+    queryset = apply_prefetch_plan(ShopTheLook.objects.all(), ShopTheLookSerializer)
     serializer_class = ShopTheLookSerializer
     permission_classes = [AllowAny]
@@ -0,0 +1,45 @@
+from django.db import transaction
+from django.utils import timezone
+
+from common.cache import notifications_cache
+from notifications.models import Notification
+
+
+# -------------------------------
+# Unread counter
+# -------------------------------
+def unread_count(user):
+    """
+    Number of unread notifications, from a per-user counter in the
+    notifications cache. A missing counter is rebuilt with one COUNT over
+    the partial unread index; it expires with the namespace timeout, so any
+    drift corrects itself.
+    """
+    count = notifications_cache.get_or_build(
+        ("unread", user.pk),
+        lambda: Notification.objects.filter(user=user, read_at__isnull=True).count(),
+    )
+    return max(count, 0)
+
+
+def adjust_unread_count(user_id, delta):
+    """Move a user's counter once the current transaction commits (no-op when it isn't cached)."""
+    transaction.on_commit(lambda: notifications_cache.incr("unread", user_id, delta=delta))
+
+
+# -------------------------------
+# Marking read
+# -------------------------------
+def mark_read(user, ids=None):
+    """
+    Mark the user's unread notifications (or just `ids`) read in one
+    UPDATE and return how many changed. Already read rows are skipped, so
+    the counter only moves by what actually changed.
+    """
+    unread = Notification.objects.filter(user=user, read_at__isnull=True)
+    if ids is not None:
+        unread = unread.filter(pk__in=ids)
+    updated = unread.update(read_at=timezone.now())
+    if updated:
+        adjust_unread_count(user.pk, -updated)
+    return updated
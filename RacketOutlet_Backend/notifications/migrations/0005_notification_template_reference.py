@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_notification_user_recent_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='template',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='reference',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='context_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
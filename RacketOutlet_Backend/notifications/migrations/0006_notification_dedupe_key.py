@@ -0,0 +1,55 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+def split_references(apps, schema_editor):
+    """
+    'order:42' references become dedupe keys; only the oldest notification per
+    key keeps one. Malformed references are left without a key.
+    """
+    Notification = apps.get_model('notifications', 'Notification')
+    seen = set()
+    for notification in Notification.objects.exclude(reference='').order_by('created_at', 'pk').iterator():
+        object_type, _, object_id = notification.reference.partition(':')
+        if not object_type or not object_id.isdecimal():
+            continue
+        key = (notification.kind, f'orders.{object_type}', int(object_id))
+        if key in seen:
+            continue
+        seen.add(key)
+        Notification.objects.filter(pk=notification.pk).update(object_type=key[1], object_id=key[2])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0005_notification_template_reference'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='notification',
+            old_name='template',
+            new_name='kind',
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='object_type',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='object_id',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(split_references, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='notification',
+            name='reference',
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(condition=models.Q(('object_id__isnull', False)), fields=('kind', 'object_type', 'object_id'), name='notif_dedupe_key_uniq'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0006_notification_dedupe_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='read_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='notif_user_recent_idx',
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='notif_user_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('read_at__isnull', True)), fields=['user'], name='notif_user_unread_idx'),
+        ),
+    ]
@@ -19,7 +19,8 @@ class Notification(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, 
         on_delete=models.CASCADE, 
-        related_name='notifications'
+        related_name='notifications',
+        db_index=False,  # leading column of notif_user_recent_idx
     )
     type = models.CharField(
         max_length=10, 
@@ -27,6 +28,13 @@ class Notification(models.Model):
     )
     subject = models.CharField(max_length=255)
     message = models.TextField()
+    # Dedupe key: at most one notification of a kind per object, e.g.
+    # ("order_confirmation", "orders.order", 42). Kind is also the
+    # EmailTemplate an email was rendered from, instead of keeping its body.
+    kind = models.CharField(max_length=100, blank=True)
+    object_type = models.CharField(max_length=100, blank=True)
+    object_id = models.PositiveBigIntegerField(blank=True, null=True)
+    context_hash = models.CharField(max_length=64, blank=True)
     status = models.CharField(
         max_length=10, 
         choices=Status.choices, 
@@ -34,11 +42,25 @@ class Notification(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     sent_at = models.DateTimeField(blank=True, null=True)
+    read_at = models.DateTimeField(blank=True, null=True)
 
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Notification'
         verbose_name_plural = 'Notifications'
+        indexes = [
+            # A user's inbox, newest first, paged by (created_at, id) cursors
+            models.Index(fields=['user', '-created_at', '-id'], name='notif_user_recent_idx'),
+            # Rebuilding a user's unread counter
+            models.Index(fields=['user'], condition=models.Q(read_at__isnull=True), name='notif_user_unread_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['kind', 'object_type', 'object_id'],
+                condition=models.Q(object_id__isnull=False),
+                name='notif_dedupe_key_uniq',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.get_type_display()} to {self.user.email} - {self.get_status_display()}"
@@ -49,6 +71,10 @@ class Notification(models.Model):
         self.sent_at = timezone.now()
         self.save(update_fields=['status', 'sent_at'])
 
+    @property
+    def is_read(self):
+        return self.read_at is not None
+
     def mark_as_failed(self):
         """Mark the notification as failed."""
         self.status = self.Status.FAILED
@@ -0,0 +1,179 @@
+import hashlib
+import json
+from collections import namedtuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.template import Context, Template
+
+from notifications.models import EmailTemplate
+
+# -------------------------------
+# Built-in templates
+# -------------------------------
+# Used until an EmailTemplate row with the same name is added in the admin
+DEFAULT_TEMPLATES = {
+    "order_confirmation": {
+        "subject": "Order Confirmation - #{{ order_number }}",
+        "html_content": """
+    <html>
+    <body style="font-family: Arial, sans-serif; max-width:700px; margin:auto; color:#333;">
+        <div style="border:1px solid #e0e0e0; padding:20px; background-color:#fafafa;">
+            <div style="text-align:center; margin-bottom:20px;">
+                <img src="https://i.postimg.cc/FH8zS8JF/logo.jpg" alt="RacketOutlet" style="width:150px;">
+            </div>
+
+            <h2>Hi {{ user_name }},</h2>
+            <p>Thank you for shopping with us! Your order <b>#{{ order_number }}</b> has been confirmed.</p>
+            <p>Mobile: {{ user_mobile }}<br>Address: {{ user_address|linebreaksbr }}</p>
+
+            <h3>Shipping Details</h3>
+            <p>
+                Name: {{ shipping_person_name }}<br>
+                Mobile: {{ shipping_person_number }}<br>
+                Address: {{ shipping_address|linebreaksbr }}
+            </p>
+
+            <h3>Billing Address</h3>
+            <p>{{ billing_address|linebreaksbr }}</p>
+
+            <h3>Order Items</h3>
+            <table style="width:100%; border-collapse: collapse; border:1px solid #ccc;">
+                <thead>
+                    <tr style="background-color:#1a73e8; color:white;">
+                        <th style="padding:12px; text-align:left;">Product</th>
+                        <th style="padding:12px; text-align:right;">Qty</th>
+                        <th style="padding:12px; text-align:right;">Price</th>
+                        <th style="padding:12px; text-align:right;">Subtotal</th>
+                    </tr>
+                </thead>
+                <tbody>
+                    {% for item in items %}
+                    <tr>
+                        <td style="padding:12px; border:1px solid #ccc;">
+                            {% if item.main_image_url %}
+                                <img src="{{ item.main_image_url }}" style="width:50px; height:auto; vertical-align:middle; margin-right:5px;">
+                            {% endif %}
+                            <b>{{ item.product }}</b>
+                        </td>
+                        <td style="text-align:right; padding:12px;">{{ item.quantity }}</td>
+                        <td style="text-align:right; padding:12px;">₹{{ item.price }}</td>
+                        <td style="text-align:right; padding:12px;">₹{{ item.subtotal }}</td>
+                    </tr>
+                    {% endfor %}
+                    <tr style="font-weight:bold; background-color:#f2f2f2;">
+                        <td colspan="3" style="text-align:right; padding:12px;">Total:</td>
+                        <td style="text-align:right; padding:12px;">₹{{ total_amount }}</td>
+                    </tr>
+                </tbody>
+            </table>
+
+            <h3>Payment Details</h3>
+            <p>Method: {{ payment_method }}<br>Status: {{ payment_status }}</p>
+
+            {% if notes %}
+            <h3>Additional Notes</h3>
+            <p>{{ notes|linebreaksbr }}</p>
+            {% endif %}
+
+            <p style="font-size:12px; color:#777; margin-top:20px;">Order created at: {{ created_at }}</p>
+        </div>
+    </body>
+    </html>
+    """,
+        "text_content": None,
+    },
+}
+
+
+# -------------------------------
+# Compiled template cache
+# -------------------------------
+CompiledTemplate = namedtuple("CompiledTemplate", "updated_at subject html text")
+
+# Template name -> CompiledTemplate, per process
+_compiled = {}
+
+
+def _plain(source):
+    """Subjects and text bodies aren't HTML, so nothing in them is escaped."""
+    return Template("{% autoescape off %}" + source + "{% endautoescape %}")
+
+
+def get_compiled_template(name):
+    """
+    The parsed template for `name`. Costs one indexed lookup of the row's
+    updated_at per call; the template is only fetched and parsed again after
+    it's edited. Names without an EmailTemplate row use DEFAULT_TEMPLATES.
+    """
+    updated_at = EmailTemplate.objects.filter(name=name).values_list("updated_at", flat=True).first()
+    compiled = _compiled.get(name)
+    if compiled is not None and compiled.updated_at == updated_at:
+        return compiled
+
+    if updated_at is None:
+        source = DEFAULT_TEMPLATES[name]
+    else:
+        source = EmailTemplate.objects.filter(name=name).values("subject", "html_content", "text_content").get()
+    compiled = CompiledTemplate(
+        updated_at=updated_at,
+        subject=_plain(source["subject"]),
+        html=Template(source["html_content"]),
+        text=_plain(source["text_content"]) if source["text_content"] else None,
+    )
+    _compiled[name] = compiled
+    return compiled
+
+
+def render_email(name, context):
+    """Render a template to (subject, html, text); text is None when the template has none."""
+    compiled = get_compiled_template(name)
+    context = Context(context)
+    subject = " ".join(compiled.subject.render(context).split())
+    html = compiled.html.render(context)
+    text = compiled.text.render(context) if compiled.text else None
+    return subject, html, text
+
+
+def context_hash(context):
+    """SHA-256 of a render context, stored on a Notification instead of the rendered body."""
+    data = json.dumps(context, cls=DjangoJSONEncoder, sort_keys=True)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+# -------------------------------
+# Order confirmation context
+# -------------------------------
+def order_confirmation_context(order):
+    """
+    Plain-data context of the order confirmation email. Items come from one
+    query that reads just the columns the email shows, at the price paid.
+    """
+    items = [
+        {
+            "product": row["product__name"],
+            "quantity": row["quantity"],
+            "price": row["price"],
+            "subtotal": row["price"] * row["quantity"],
+            "main_image_url": row["product__main_image_url"],
+        }
+        for row in order.items.order_by("pk").values(
+            "quantity", "price", "product__name", "product__main_image_url"
+        )
+    ]
+    user, payment = order.user, order.payment
+    return {
+        "order_number": order.order_number,
+        "user_name": user.username,
+        "user_mobile": user.phone_number or "",
+        "user_address": user.address or "",
+        "shipping_person_name": order.shipping_person_name,
+        "shipping_person_number": order.shipping_person_number,
+        "shipping_address": order.shipping_address,
+        "billing_address": order.billing_address,
+        "items": items,
+        "total_amount": order.total_amount,
+        "payment_method": payment.payment_method,
+        "payment_status": payment.status,
+        "notes": order.notes or "",
+        "created_at": order.created_at,
+    }
@@ -8,10 +8,31 @@ class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = (
-            'id', 'type', 'type_display', 'subject', 'message', 
-            'status', 'status_display', 'created_at', 'sent_at'
+            'id', 'type', 'type_display', 'kind', 'subject', 'message', 
+            'status', 'status_display', 'created_at', 'sent_at', 'read_at', 'is_read'
         )
-        read_only_fields = ('status', 'created_at', 'sent_at')
+        read_only_fields = ('status', 'created_at', 'sent_at', 'read_at')
+
+
+class NotificationListSerializer(NotificationSerializer):
+    """Inbox rows: everything but the message body."""
+
+    # Columns the list query loads (see NotificationListView)
+    columns = ('id', 'type', 'kind', 'subject', 'status', 'created_at', 'sent_at', 'read_at')
+
+    class Meta(NotificationSerializer.Meta):
+        fields = tuple(f for f in NotificationSerializer.Meta.fields if f != 'message')
+
+
+class MarkReadSerializer(serializers.Serializer):
+    """Either a list of ids or all=true."""
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=500)
+    all = serializers.BooleanField(required=False, default=False)
+
+    def validate(self, attrs):
+        if not attrs['all'] and not attrs.get('ids'):
+            raise serializers.ValidationError("Pass ids or all=true")
+        return attrs
 
 
 class EmailTemplateSerializer(serializers.ModelSerializer):
@@ -1,33 +1,32 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from orders.models import Payment
+from orders.payments import payment_status_changed
+from notifications.inbox import adjust_unread_count
 from notifications.models import Notification
 from notifications.services import send_order_email
 
-@receiver(post_save, sender=Payment)
-def send_order_email_on_payment(sender, instance, created, **kwargs):
+@receiver(payment_status_changed)
+def send_order_email_on_payment(sender, payment, previous, **kwargs):
     """
-    Sends order confirmation email after payment is completed.
-    Ensures email is sent only once per order.
+    Sends order confirmation email once a payment settles as completed or
+    COD. send_order_email only sends once per order (see claim_notification).
     """
     # Only send for completed or COD payments
-    if instance.status.lower() not in ('completed', 'cod'):
+    if payment.status.lower() not in ('completed', 'cod'):
         return
-
-    order = getattr(instance, 'order', None)
-    if not order:
+    # COD collected later (cod -> completed) was already confirmed
+    if previous in ('completed', 'cod'):
         return
-
-    # Use a dedicated notification type and reference to avoid duplicates
-    notification_exists = Notification.objects.filter(
-        user=order.user,
-        type='email',
-        subject__icontains=f"Order Confirmation - #{order.id}"
-    ).exists()
-
-    if notification_exists:
-        print(f"[DEBUG] Email already sent for order {order.id}")
+    # Paid, but the stock is gone: staff refund or fulfil it by hand
+    if payment.order.status == 'needs_review':
         return
 
     # Send the order email
-    send_order_email(order)
+    send_order_email(payment.order)
+
+
+@receiver(post_save, sender=Notification)
+def count_new_notification(sender, instance, created, **kwargs):
+    """Keep the owner's cached unread counter in step with new notifications."""
+    if created and instance.read_at is None:
+        adjust_unread_count(instance.user_id, 1)
@@ -1,3 +1,192 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import caches
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from common.jobs import run_due_jobs
+from common.models import Job
+from common.tests import local_caches
+from notifications import rendering
+from notifications.models import EmailTemplate, Notification
+from notifications.rendering import context_hash, order_confirmation_context, render_email
+from notifications.services import send_order_email
+from orders.models import Order, OrderItem, Payment
+from orders.payments import transition_payment
+from products.models import Category, Product, SubCategory
+
+User = get_user_model()
+
+
+# -------------------------------
+# Order confirmation emails
+# -------------------------------
+class OrderConfirmationEmailTests(TestCase):
+    def setUp(self):
+        rendering._compiled.clear()
+        self.user = User.objects.create_user(username="buyer", email="buyer@example.com", password="x")
+        category = Category.objects.create(name="Tennis")
+        self.subcategory = SubCategory.objects.create(name="Rackets", parent_category=category)
+        self.order = Order.objects.create(
+            user=self.user, order_number="ORD-1", total_amount=Decimal("300.00"),
+            shipping_address="Court 1", shipping_person_name="Buyer", shipping_person_number="99",
+            billing_address="Court 1", payment_method="cod",
+        )
+        self.add_items(2)
+
+    def add_items(self, count):
+        for _ in range(count):
+            product = Product.objects.create(
+                name=f"Racket {OrderItem.objects.count()}", description="-", subcategory=self.subcategory,
+                price=Decimal("150.00"), sku=f"R-{OrderItem.objects.count()}",
+            )
+            OrderItem.objects.create(order=self.order, product=product, quantity=1, price=Decimal("150.00"))
+
+    def test_payment_queues_email_and_keeps_key_not_body(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(order=self.order, amount=self.order.total_amount, status="cod")
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.subject, "Order Confirmation - #ORD-1")
+        self.assertEqual(
+            (notification.kind, notification.object_type, notification.object_id),
+            ("order_confirmation", "orders.order", self.order.pk),
+        )
+        self.assertEqual(notification.message, "2 item(s), total ₹300.00")
+        self.order.refresh_from_db()
+        self.assertEqual(notification.context_hash, context_hash(order_confirmation_context(self.order)))
+        self.assertEqual(notification.status, Notification.Status.PENDING)
+        self.assertEqual(Job.objects.get().payload, {"notification_id": notification.pk})
+
+        run_due_jobs()
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, Notification.Status.SENT)
+        self.assertIsNotNone(notification.sent_at)
+        html = mail.outbox[0].alternatives[0][0]
+        self.assertEqual(mail.outbox[0].subject, "Order Confirmation - #ORD-1")
+        self.assertIn("<b>Racket 1</b>", html)
+        self.assertIn("₹150.00", html)
+
+    def test_job_renders_the_order_as_it_is_when_sent(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(order=self.order, amount=self.order.total_amount, status="cod")
+        Order.objects.filter(pk=self.order.pk).update(notes="Leave at the gate")
+
+        with self.assertLogs("notifications.services", "INFO") as logs:
+            run_due_jobs()
+        self.assertIn("changed since it was claimed", logs.output[0])
+        self.assertIn("Leave at the gate", mail.outbox[0].alternatives[0][0])
+
+    def test_failed_send_is_marked_failed_and_retried(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(order=self.order, amount=self.order.total_amount, status="cod")
+
+        with mock.patch("django.core.mail.EmailMultiAlternatives.send", side_effect=ConnectionError):
+            run_due_jobs()
+        notification = Notification.objects.get()
+        self.assertEqual(notification.status, Notification.Status.FAILED)
+        self.assertIsNone(notification.sent_at)
+        self.assertEqual(Job.objects.get().status, Job.QUEUED)
+
+        Job.objects.update(run_at=timezone.now())
+        run_due_jobs()
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, Notification.Status.SENT)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_email_is_sent_once_per_order(self):
+        payment = Payment.objects.create(order=self.order, amount=self.order.total_amount, status="created")
+        with self.captureOnCommitCallbacks(execute=True):
+            send_order_email(self.order)  # not paid yet
+            transition_payment(payment, "completed")
+            with CaptureQueriesContext(connection) as ctx:
+                send_order_email(self.order)
+        self.assertFalse(any("LIKE" in q["sql"] for q in ctx.captured_queries))
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_items_come_from_one_query(self):
+        order = Order.objects.select_related("user").get(pk=self.order.pk)
+        Payment.objects.create(order=order, amount=order.total_amount, status="pending")
+        with self.assertNumQueries(1):
+            order_confirmation_context(order)
+        self.add_items(5)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(order_confirmation_context(order)["items"]), 7)
+
+    def test_templates_are_compiled_once_per_edit(self):
+        context = {"order_number": "ORD-1", "items": []}
+        with mock.patch.object(rendering, "Template", wraps=rendering.Template) as compile_template:
+            render_email("order_confirmation", context)
+            render_email("order_confirmation", context)
+            self.assertEqual(compile_template.call_count, 2)  # subject + html, once
+
+            template = EmailTemplate.objects.create(
+                name="order_confirmation", subject="Thanks for #{{ order_number }} & more", html_content="<p>{{ order_number }}</p>",
+            )
+            self.assertEqual(render_email("order_confirmation", context)[:2], ("Thanks for #ORD-1 & more", "<p>ORD-1</p>"))
+            render_email("order_confirmation", context)
+            self.assertEqual(compile_template.call_count, 4)
+
+            template.html_content = "<p>Order {{ order_number }}</p>"
+            template.save()
+            self.assertEqual(render_email("order_confirmation", context)[1], "<p>Order ORD-1</p>")
+            self.assertEqual(compile_template.call_count, 6)
+
+
+# -------------------------------
+# Inbox
+# -------------------------------
+@local_caches("notifications")
+class InboxTests(TestCase):
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.user = User.objects.create_user(username="player", email="player@example.com", password="x")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.notifications = [self.notify(n) for n in range(5)]
+
+    def notify(self, n):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Notification.objects.create(
+                user=self.user, type="email", subject=f"Order #{n}", message="<html>" + "x" * 5000, status="sent",
+            )
+
+    def test_cursor_pages_leave_out_the_body(self):
+        seen, url = [], "/api/notifications/?page_size=2"
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                page = self.client.get(url).data
+            self.assertNotIn("message", " ".join(q["sql"] for q in ctx.captured_queries))
+            self.assertTrue(all("message" not in row for row in page["results"]))
+            seen += [row["id"] for row in page["results"]]
+            url = page["next"]
+        self.assertEqual(seen, [n.pk for n in reversed(self.notifications)])
+        self.assertEqual(page["unread"], 5)
+
+    def test_unread_counter_follows_inserts_and_reads(self):
+        self.assertEqual(self.client.get("/api/notifications/unread-count/").data, {"unread": 5})
+        self.notify(5)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get("/api/notifications/unread-count/").data, {"unread": 6})
+
+        ids = [n.pk for n in self.notifications[:2]]
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as ctx:
+            response = self.client.post("/api/notifications/mark-read/", {"ids": ids}, format="json")
+        self.assertEqual(sum(q["sql"].startswith("UPDATE") for q in ctx.captured_queries), 1)
+        self.assertEqual(response.data["updated"], 2)
+        self.assertEqual(self.client.get("/api/notifications/unread-count/").data, {"unread": 4})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/notifications/mark-read/", {"all": True}, format="json")
+        self.assertEqual(response.data["updated"], 4)
+        self.assertEqual(self.client.get("/api/notifications/unread-count/").data, {"unread": 0})
+        self.assertEqual(self.client.post("/api/notifications/mark-read/", {}, format="json").status_code, 400)
 
-# Create your tests here.
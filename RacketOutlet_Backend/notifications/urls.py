@@ -3,6 +3,8 @@ from django.urls import path
 from .views import (
     NotificationListView,
     NotificationDetailView,
+    UnreadCountView,
+    MarkReadView,
     EmailTemplateListCreateView,
     EmailTemplateDetailView
 )
@@ -10,6 +12,8 @@ from .views import (
 urlpatterns = [
     path('', NotificationListView.as_view(), name='notification-list'),
     path('<int:pk>/', NotificationDetailView.as_view(), name='notification-detail'),
+    path('unread-count/', UnreadCountView.as_view(), name='notification-unread-count'),
+    path('mark-read/', MarkReadView.as_view(), name='notification-mark-read'),
     path('email-templates/', EmailTemplateListCreateView.as_view(), name='email-template-list-create'),
     path('email-templates/<int:pk>/', EmailTemplateDetailView.as_view(), name='email-template-detail'),
 ]
\ No newline at end of file
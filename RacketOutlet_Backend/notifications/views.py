@@ -1,14 +1,57 @@
 from rest_framework import generics, permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from common.pagination import KeysetPagination
+from .inbox import mark_read, unread_count
 from .models import Notification, EmailTemplate
-from .serializers import NotificationSerializer, EmailTemplateSerializer
+from .serializers import (
+    NotificationSerializer,
+    NotificationListSerializer,
+    MarkReadSerializer,
+    EmailTemplateSerializer,
+)
 
 # Notifications
 class NotificationListView(generics.ListAPIView):
-    serializer_class = NotificationSerializer
+    """
+    The user's inbox, newest first, in (created_at, id) cursor pages served
+    by notif_user_recent_idx. Rows leave out the message body.
+    """
+    serializer_class = NotificationListSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        return Notification.objects.filter(user=self.request.user)
+        return (
+            Notification.objects.filter(user=self.request.user)
+            .only(*NotificationListSerializer.columns)
+            .order_by('-created_at', '-id')
+        )
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        response.data['unread'] = unread_count(request.user)
+        return response
+
+
+class UnreadCountView(APIView):
+    """Unread badge for polling: served from the cached counter."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        return Response({'unread': unread_count(request.user)})
+
+
+class MarkReadView(APIView):
+    """Mark some (ids) or all notifications read, in one UPDATE."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = MarkReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = None if serializer.validated_data['all'] else serializer.validated_data['ids']
+        updated = mark_read(request.user, ids)
+        return Response({'updated': updated, 'unread': unread_count(request.user)})
 
 
 class NotificationDetailView(generics.RetrieveAPIView):
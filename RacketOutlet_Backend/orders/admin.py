@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Cart, CartItem, Order, OrderItem, Payment
+from .models import Cart, CartItem, Order, OrderItem, Payment, WebhookEvent
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
@@ -23,3 +23,11 @@ class PaymentAdmin(admin.ModelAdmin):
     list_filter = ('status', 'payment_method')
     search_fields = ('order__id',)
     list_select_related = ('order',)  # avoids N+1 queries
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('event_id', 'event', 'payment_id', 'attempts', 'received_at', 'processed_at')
+    list_filter = ('event',)
+    search_fields = ('event_id', 'payment_id', 'razorpay_order_id')
+    readonly_fields = ('payload', 'last_error')
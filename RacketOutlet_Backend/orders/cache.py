@@ -0,0 +1,25 @@
+from django.db import transaction
+
+from common.cache import orders_cache
+
+# Staff list every order, so their cached pages go stale on any order change
+STAFF_SCOPE = "staff"
+
+
+def order_cache_scope(user):
+    """Cache scope for a user's order reads: one per customer, one shared by staff."""
+    return STAFF_SCOPE if user.is_staff else f"user:{user.id}"
+
+
+def invalidate_order_cache(*user_ids):
+    """
+    Drop cached order pages for these users (and the staff views) once the
+    current transaction commits, so a read racing the write can't cache
+    pre-commit data.
+    """
+    def _invalidate():
+        for user_id in set(user_ids):
+            orders_cache.invalidate(scope=f"user:{user_id}")
+        orders_cache.invalidate(scope=STAFF_SCOPE)
+
+    transaction.on_commit(_invalidate)
@@ -0,0 +1,140 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from common.cache import cart_cache
+from products.cache import product_payloads
+from .models import Cart, CartItem
+
+# The cart document serves cart reads; every write goes through to the
+# Cart/CartItem rows in the same request, so the rows stay the source of
+# truth and a lost document is rebuilt from them.
+CART_DOC_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def _doc_key(user_id):
+    return f"doc:{user_id}"
+
+
+@transaction.atomic
+def _write_line(cart_id, product_id, quantity, now):
+    """Mirror one line onto its CartItem row (quantity 0 deletes it)."""
+    items = CartItem.objects.filter(cart_id=cart_id, product_id=product_id)
+    if quantity < 1:
+        items.delete()
+    elif not items.update(quantity=quantity):
+        CartItem.objects.create(cart_id=cart_id, product_id=product_id, quantity=quantity)
+    Cart.objects.filter(pk=cart_id).update(updated_at=now)
+
+
+def _save(user_id, doc, product_id):
+    """Write the changed line through to the database, then cache the document."""
+    now = timezone.now()
+    line = doc["items"].get(product_id)
+    _write_line(doc["id"], product_id, line["quantity"] if line else 0, now)
+    doc["updated_at"] = now.isoformat()
+    cart_cache.cache.set(_doc_key(user_id), doc, CART_DOC_TIMEOUT)
+    return doc
+
+
+def _load_from_db(user):
+    cart, _ = Cart.objects.get_or_create(user=user)
+    items = {}
+    for item in CartItem.objects.filter(cart=cart).select_related("product").order_by("id"):
+        items[item.product_id] = {"quantity": item.quantity, "price": str(item.product.current_price)}
+    return {
+        "id": cart.id,
+        "items": items,
+        "created_at": cart.created_at.isoformat(),
+        "updated_at": cart.updated_at.isoformat(),
+    }
+
+
+def load_cart(user):
+    """
+    The user's cart document:
+    {"id", "items": {product_id: {"quantity", "price"}}, "created_at", "updated_at"}
+    where "price" is the unit price when the line was last touched.
+    """
+    doc = cart_cache.cache.get(_doc_key(user.id))
+    if doc is None:
+        doc = _load_from_db(user)
+        cart_cache.cache.set(_doc_key(user.id), doc, CART_DOC_TIMEOUT)
+    return doc
+
+
+# -------------------------------
+# Write-through mutations
+# -------------------------------
+def _active_product(product_id):
+    product = product_payloads([product_id]).get(product_id)
+    if product is None:
+        raise serializers.ValidationError({"product_id": "Product not found"})
+    if not product.get("is_active", True):
+        raise serializers.ValidationError({"product_id": "Product is not active"})
+    return product
+
+
+def add_item(user, product_id, quantity=1):
+    product = _active_product(product_id)
+    with cart_cache.lock("cart", user.id):
+        doc = load_cart(user)
+        line = doc["items"].setdefault(product_id, {"quantity": 0})
+        line["quantity"] += quantity
+        line["price"] = product["current_price"]
+        return _save(user.id, doc, product_id)
+
+
+def set_quantity(user, product_id, quantity):
+    with cart_cache.lock("cart", user.id):
+        doc = load_cart(user)
+        if product_id not in doc["items"]:
+            return None
+        if quantity < 1:
+            del doc["items"][product_id]
+        else:
+            doc["items"][product_id]["quantity"] = quantity
+        return _save(user.id, doc, product_id)
+
+
+def remove_item(user, product_id):
+    with cart_cache.lock("cart", user.id):
+        doc = load_cart(user)
+        if doc["items"].pop(product_id, None) is None:
+            return None
+        return _save(user.id, doc, product_id)
+
+
+# -------------------------------
+# Rendering (same shape as CartSerializer / CartItemSerializer)
+# -------------------------------
+def render_items(doc):
+    products = product_payloads(doc["items"].keys())
+    items = []
+    for product_id, line in doc["items"].items():
+        product = products.get(product_id)
+        if product is None:
+            continue  # product deleted since it was added
+        price = Decimal(product["current_price"] or line["price"])
+        items.append({
+            "id": product_id,
+            "product": product,
+            "product_id": product_id,
+            "quantity": line["quantity"],
+            "subtotal": price * line["quantity"],
+        })
+    return items
+
+
+def render_cart(doc):
+    items = render_items(doc)
+    return {
+        "id": doc["id"],
+        "items": items,
+        "total_price": sum((item["subtotal"] for item in items), Decimal("0")),
+        "created_at": doc["created_at"],
+        "updated_at": doc["updated_at"],
+    }
+
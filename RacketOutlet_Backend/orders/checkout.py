@@ -0,0 +1,83 @@
+import uuid
+from collections import OrderedDict
+
+from django.db import transaction
+from django.db.models import Q
+from rest_framework import serializers
+
+from products.models import Inventory
+from .models import Order, OrderItem
+from .reservations import per_product, create_holds
+
+
+def _merge_lines(items_data):
+    """Collapse repeated product ids into one line, keeping first-seen order."""
+    lines = OrderedDict()
+    for item in items_data:
+        lines[item["product_id"]] = lines.get(item["product_id"], 0) + item["quantity"]
+    return lines
+
+
+@transaction.atomic
+def place_order(user, items_data, **order_fields):
+    """
+    Create an order and take its stock in one transaction.
+
+    All inventory rows are locked with a single SELECT ... FOR UPDATE
+    (in product id order, so concurrent checkouts can't deadlock), stock is
+    moved from quantity into reserved_quantity with one conditional UPDATE,
+    and the order lines and their stock holds are written with one
+    bulk_create each. The number of round trips does not grow with the
+    size of the cart.
+    """
+    if not items_data:
+        raise serializers.ValidationError("Cannot create order with empty items.")
+
+    lines = _merge_lines(items_data)
+
+    inventories = {
+        inv.product_id: inv
+        for inv in Inventory.objects.select_for_update()
+        .select_related("product")
+        .filter(product_id__in=lines.keys())
+        .order_by("product_id")
+    }
+
+    total_amount = 0
+    for product_id, quantity in lines.items():
+        inventory = inventories.get(product_id)
+        if inventory is None:
+            raise serializers.ValidationError(f"Product ID {product_id} not found.")
+        if inventory.quantity < quantity:
+            raise serializers.ValidationError(f"Not enough stock for {inventory.product.name}.")
+        total_amount += inventory.product.current_price * quantity
+
+    # Guard on quantity again in SQL so the decrement can never go negative
+    in_stock = Q()
+    for product_id, quantity in lines.items():
+        in_stock |= Q(product_id=product_id, quantity__gte=quantity)
+    updated = Inventory.objects.filter(in_stock).update(
+        quantity=per_product("quantity", lines, -1),
+        reserved_quantity=per_product("reserved_quantity", lines, 1),
+    )
+    if updated != len(lines):
+        raise serializers.ValidationError("Not enough stock to complete this order.")
+
+    order = Order.objects.create(
+        user=user,
+        total_amount=total_amount,
+        order_number=f"ORD-{uuid.uuid4().hex[:8].upper()}",
+        **order_fields,
+    )
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            product=inventories[product_id].product,
+            quantity=quantity,
+            price=inventories[product_id].product.current_price,
+        )
+        for product_id, quantity in lines.items()
+    ])
+    create_holds(order, lines)
+
+    return order
@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from orders.reservations import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = "Release stock held by unpaid orders whose hold has expired"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.INVENTORY_HOLD_SWEEP_BATCH_SIZE)
+        parser.add_argument(
+            "--interval", type=int, default=0,
+            help="Keep running and sweep every N seconds (default: sweep once and exit)",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            total = 0
+            while True:
+                released = release_expired_holds(batch_size=options["batch_size"])
+                if not released:
+                    break
+                total += released
+            if total:
+                self.stdout.write(self.style.SUCCESS(f"✅ Released {total} expired stock holds"))
+
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
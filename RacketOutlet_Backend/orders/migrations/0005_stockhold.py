@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_alter_order_status_alter_payment_status'),
+        ('products', '0002_inventory_reserved_quantity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField()),
+                ('resolution', models.CharField(blank=True, choices=[('committed', 'Committed'), ('released', 'Released')], max_length=20, null=True)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_holds', to='orders.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_holds', to='products.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['order'], name='orders_stoc_order_i_bf72c5_idx'), models.Index(condition=models.Q(('resolution__isnull', True)), fields=['expires_at'], name='orders_hold_open_expiry_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Single-column indexes the models used to declare on top of db_index=True,
+# unique constraints or foreign keys. They were never part of the migration
+# history, so drop them only where they were created by hand.
+REDUNDANT_INDEXES = [
+    'orders_cart_created_at_5ba8e3ee',
+    'orders_cart_user_id_7d3dad_idx',
+    'orders_cart_cart_id_cb3fba_idx',
+    'orders_cart_product_81483c_idx',
+    'orders_orde_created_0e92de_idx',
+    'orders_orde_payment_bc131d_idx',
+    'orders_orde_status_c6dd84_idx',
+    'orders_orde_user_id_a87c6f_idx',
+    'orders_order_payment_method_c2e563b6',
+    'orders_order_payment_method_c2e563b6_like',
+    'orders_order_payment_status_d9b0ddfc',
+    'orders_order_payment_status_d9b0ddfc_like',
+    'orders_orde_order_i_52f79a_idx',
+    'orders_orde_product_32ff41_idx',
+    'orders_paym_created_4b0957_idx',
+    'orders_paym_payment_d1473d_idx',
+    'orders_paym_status_83f434_idx',
+    'orders_payment_created_at_e6e1591b',
+    'orders_payment_payment_method_44878c0f',
+    'orders_payment_payment_method_44878c0f_like',
+    'orders_wish_user_id_748f16_idx',
+    'orders_wishlist_created_at_20c07f5c',
+    'orders_wish_product_720e72_idx',
+    'orders_wish_wishlis_230ac0_idx',
+    'orders_wishlistitem_added_at_5d61f621',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_stockhold'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cartitem',
+            index=models.Index(fields=['cart', 'product'], name='orders_cartitem_cart_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at'], name='orders_user_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['order', 'product'], name='orders_orderitem_order_idx'),
+        ),
+        # Foreign key indexes now covered by composite/unique indexes
+        migrations.AlterField(
+            model_name='cartitem',
+            name='cart',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='orders.cart'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='orders', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='order',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='orders.order'),
+        ),
+        migrations.AlterField(
+            model_name='wishlistitem',
+            name='wishlist',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='orders.wishlist'),
+        ),
+        # Duplicate of the foreign key's own index
+        migrations.RemoveIndex(
+            model_name='stockhold',
+            name='orders_stoc_order_i_bf72c5_idx',
+        ),
+        migrations.RunSQL(
+            [f'DROP INDEX IF EXISTS "{name}"' for name in REDUNDANT_INDEXES],
+            migrations.RunSQL.noop,
+        ),
+    ]
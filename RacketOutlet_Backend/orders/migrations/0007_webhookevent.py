@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=100, unique=True)),
+                ('event', models.CharField(max_length=50)),
+                ('payment_id', models.CharField(blank=True, max_length=255)),
+                ('razorpay_order_id', models.CharField(blank=True, max_length=255)),
+                ('payload', models.JSONField()),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['payment_id', 'received_at'], name='orders_webhook_pending_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+# Fields the models have always declared with db_index=True but whose
+# indexes never made it into the migration history. Databases built by
+# hand from the models may already have them (see 0006), so they're only
+# created where missing.
+INDEXED_FIELDS = [
+    ('order', 'status'),
+    ('order', 'created_at'),
+    ('payment', 'status'),
+    ('payment', 'razorpay_order_id'),
+    ('payment', 'razorpay_payment_id'),
+    ('payment', 'transaction_id'),
+]
+
+
+def create_missing_indexes(apps, schema_editor):
+    for model_name, field_name in INDEXED_FIELDS:
+        model = apps.get_model('orders', model_name)
+        field = model._meta.get_field(field_name)
+        for statement in schema_editor._field_indexes_sql(model, field):
+            schema_editor.execute(str(statement).replace('CREATE INDEX', 'CREATE INDEX IF NOT EXISTS', 1))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_webhookevent'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='order',
+                    name='created_at',
+                    field=models.DateTimeField(auto_now_add=True, db_index=True),
+                ),
+                migrations.AlterField(
+                    model_name='order',
+                    name='status',
+                    field=models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('processing', 'Processing'), ('payment_failed', 'Payment_Failed'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled'), ('refunded', 'Refunded')], db_index=True, default='pending', max_length=20),
+                ),
+                migrations.AlterField(
+                    model_name='payment',
+                    name='razorpay_order_id',
+                    field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+                ),
+                migrations.AlterField(
+                    model_name='payment',
+                    name='razorpay_payment_id',
+                    field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+                ),
+                migrations.AlterField(
+                    model_name='payment',
+                    name='status',
+                    field=models.CharField(choices=[('pending', 'Pending'), ('created', 'Created'), ('completed', 'Completed'), ('failed', 'Failed'), ('cancelled', 'Cancelled'), ('refunded', 'Refunded'), ('cod', 'COD')], db_index=True, default='pending', max_length=20),
+                ),
+                migrations.AlterField(
+                    model_name='payment',
+                    name='transaction_id',
+                    field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+                ),
+            ],
+        ),
+        migrations.RunPython(create_missing_indexes, migrations.RunPython.noop),
+    ]
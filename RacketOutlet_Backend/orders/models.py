@@ -1,20 +1,20 @@
 from django.db import models
+from django.db.models import F, Sum, Value, DecimalField
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from products.models import Product
 
 
+LINE_SUBTOTAL = F("product__effective_price") * F("quantity")
+
+
 class Wishlist(models.Model):
     user = models.OneToOneField(
-        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='wishlist', db_index=True
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='wishlist'
     )
-    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    class Meta:
-        indexes = [
-            models.Index(fields=["user"]),
-        ]
-
     def __str__(self):
         return f"{self.user.username}'s Wishlist"
 
@@ -24,16 +24,13 @@ class Wishlist(models.Model):
 
 
 class WishlistItem(models.Model):
-    wishlist = models.ForeignKey(Wishlist, on_delete=models.CASCADE, related_name='items', db_index=True)
-    product = models.ForeignKey(Product, on_delete=models.CASCADE, db_index=True)
-    added_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Looked up through the (wishlist, product) unique index
+    wishlist = models.ForeignKey(Wishlist, on_delete=models.CASCADE, related_name='items', db_index=False)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    added_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ('wishlist', 'product')
-        indexes = [
-            models.Index(fields=["wishlist", "product"]),
-            models.Index(fields=["product"]),
-        ]
 
     def __str__(self):
         return f"{self.product.name} in {self.wishlist.user.username}'s Wishlist"
@@ -41,34 +38,43 @@ class WishlistItem(models.Model):
 
 class Cart(models.Model):
     user = models.OneToOneField(
-        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='cart', db_index=True
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='cart'
     )
-    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    class Meta:
-        indexes = [
-            models.Index(fields=["user"]),
-        ]
-
     @property
     def total_price(self):
-        return sum(item.subtotal for item in self.items.all())
+        # Reuse the prefetched (and subtotal-annotated) items the serializer
+        # already loaded; otherwise let the database add it up
+        if "items" in getattr(self, "_prefetched_objects_cache", {}):
+            return sum((item.subtotal for item in self.items.all()), 0)
+        return self.items.aggregate(
+            total=Coalesce(Sum(LINE_SUBTOTAL), Value(0), output_field=DecimalField(max_digits=12, decimal_places=2))
+        )["total"]
+
+
+class CartItemQuerySet(models.QuerySet):
+    def with_subtotals(self):
+        return self.annotate(line_subtotal=LINE_SUBTOTAL)
 
 
 class CartItem(models.Model):
-    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items', db_index=True)
-    product = models.ForeignKey(Product, on_delete=models.CASCADE, db_index=True)
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items', db_index=False)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    objects = CartItemQuerySet.as_manager()
+
     class Meta:
         indexes = [
-            models.Index(fields=["cart", "product"]),
-            models.Index(fields=["product"]),
+            models.Index(fields=["cart", "product"], name="orders_cartitem_cart_idx"),
         ]
 
     @property
     def subtotal(self):
+        if hasattr(self, "line_subtotal"):
+            return self.line_subtotal
         price = self.product.discounted_price if self.product.discounted_price else self.product.price
         return price * self.quantity
 
@@ -83,11 +89,14 @@ class Order(models.Model):
         ('delivered', 'Delivered'),
         ('cancelled', 'Cancelled'),
         ('refunded', 'Refunded'),
+        # Paid after its stock was released and sold elsewhere: refund or fulfil by hand
+        ('needs_review', 'Needs Review'),
     ]
     user = models.ForeignKey(
-        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='orders', db_index=True
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='orders',
+        db_index=False,  # leading column of orders_user_recent_idx
     )
-    order_number = models.CharField(max_length=100, unique=True, db_index=True)
+    order_number = models.CharField(max_length=100, unique=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     shipping_address = models.TextField()
@@ -95,31 +104,28 @@ class Order(models.Model):
     shipping_person_number = models.TextField()
     billing_address = models.TextField()
 
-    payment_method = models.CharField(max_length=50, db_index=True)
-    payment_status = models.CharField(max_length=20, default='pending', db_index=True)
+    payment_method = models.CharField(max_length=50)
+    payment_status = models.CharField(max_length=20, default='pending')
     notes = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         indexes = [
-            models.Index(fields=["user"]),
-            models.Index(fields=["status"]),
-            models.Index(fields=["created_at"]),
-            models.Index(fields=["payment_status"]),
+            # A customer's order history, newest first
+            models.Index(fields=["user", "-created_at"], name="orders_user_recent_idx"),
         ]
 
 
 class OrderItem(models.Model):
-    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items', db_index=True)
-    product = models.ForeignKey(Product, on_delete=models.CASCADE, db_index=True)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items', db_index=False)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
 
     class Meta:
         indexes = [
-            models.Index(fields=["order", "product"]),
-            models.Index(fields=["product"]),
+            models.Index(fields=["order", "product"], name="orders_orderitem_order_idx"),
         ]
 
     @property
@@ -137,25 +143,89 @@ class Payment(models.Model):
         ('refunded', 'Refunded'),
         ('cod', 'COD'),
     ]
-    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='payment', db_index=True)
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='payment')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
-    payment_method = models.CharField(max_length=50, default='razorpay', db_index=True)
+    payment_method = models.CharField(max_length=50, default='razorpay')
 
     razorpay_order_id = models.CharField(max_length=255, blank=True, null=True, db_index=True)
     razorpay_payment_id = models.CharField(max_length=255, blank=True, null=True, db_index=True)
     razorpay_signature = models.CharField(max_length=255, blank=True, null=True)
 
     transaction_id = models.CharField(max_length=255, blank=True, null=True, db_index=True)
-    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Status as stored, so saves can tell whether it actually changed (see orders.payments)
+        instance._loaded_status = instance.__dict__.get("status")
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._loaded_status = self.__dict__.get("status")
+
+    def is_successful(self):
+        return self.status == 'completed'
+
+
+class StockHold(models.Model):
+    """
+    Ledger of stock held for an order until its payment settles.
+
+    Rows are inserted once at checkout and never edited afterwards except
+    for a single resolution (committed on payment, released on failure,
+    cancellation or expiry), which is applied with a conditional UPDATE so
+    a hold can't be released twice.
+    """
+    RESOLUTION_CHOICES = [
+        ('committed', 'Committed'),
+        ('released', 'Released'),
+    ]
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='stock_holds')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_holds')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    resolution = models.CharField(max_length=20, choices=RESOLUTION_CHOICES, blank=True, null=True)
+    resolved_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
     class Meta:
         indexes = [
-            models.Index(fields=["status"]),
-            models.Index(fields=["payment_method"]),
-            models.Index(fields=["created_at"]),
+            # Sweeper only ever looks at open holds, oldest expiry first
+            models.Index(fields=["expires_at"], condition=models.Q(resolution__isnull=True), name="orders_hold_open_expiry_idx"),
         ]
 
-    def is_successful(self):
-        return self.status == 'completed'
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} held for order {self.order_id}"
+
+
+class WebhookEvent(models.Model):
+    """
+    Inbox of Razorpay webhook deliveries. The view only verifies and stores
+    an event (the unique event_id makes redeliveries a no-op); the
+    orders.webhooks worker applies them to payments in batches.
+    """
+    event_id = models.CharField(max_length=100, unique=True)
+    event = models.CharField(max_length=50)
+    payment_id = models.CharField(max_length=255, blank=True)  # Razorpay payment id
+    razorpay_order_id = models.CharField(max_length=255, blank=True)
+    payload = models.JSONField()
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # Worker only ever reads unprocessed events, grouped by payment
+            models.Index(
+                fields=["payment_id", "received_at"], condition=models.Q(processed_at__isnull=True),
+                name="orders_webhook_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.event} {self.event_id}"
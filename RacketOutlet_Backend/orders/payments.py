@@ -0,0 +1,185 @@
+import logging
+
+from django.db import IntegrityError, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from common import razorpay_client
+from .cache import invalidate_order_cache
+from .models import Order, Payment
+from .reservations import HoldsReleased, commit_holds, holds_released, release_holds, retake_stock
+
+logger = logging.getLogger(__name__)
+
+# Sent once per actual status change, with payment= and previous= (None for a new payment)
+payment_status_changed = Signal()
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+class OutOfStock(InvalidTransition):
+    """The order's released stock sold out before a new payment attempt."""
+
+
+# -------------------------------
+# Allowed transitions
+# -------------------------------
+# Payment status -> statuses it may move to
+PAYMENT_TRANSITIONS = {
+    "pending": {"created", "completed", "failed", "cancelled", "cod"},
+    "created": {"completed", "failed", "cancelled", "cod"},
+    # A new checkout attempt, or a capture Razorpay reports after a failed attempt
+    "failed": {"created", "completed", "cancelled", "cod"},
+    "cancelled": {"completed"},  # captured after the customer gave up; the money is taken
+    "completed": {"refunded"},
+    "cod": {"completed", "cancelled", "refunded"},
+    "refunded": set(),
+}
+
+# Payment status -> (Order.status, Order.payment_status) it implies, and the
+# order statuses that may move there. Payments never pull a shipped or
+# delivered order back, except for a refund. A payment that settles after
+# its stock was released and sold elsewhere puts the order in needs_review
+# instead of confirmed (see settle_order).
+ORDER_TRANSITIONS = {
+    "pending": ("pending", "pending", {"pending", "payment_failed"}),
+    "created": ("pending", "created", {"pending", "payment_failed"}),
+    "completed": ("confirmed", "completed", {"pending", "payment_failed", "cancelled"}),
+    "cod": ("confirmed", "Cash on Delivery", {"pending", "payment_failed"}),
+    "failed": ("payment_failed", "failed", {"pending"}),
+    "cancelled": ("cancelled", "cancelled", {"pending", "payment_failed"}),
+    "refunded": (
+        "refunded", "refunded",
+        {"pending", "confirmed", "processing", "payment_failed", "shipped", "delivered", "cancelled", "needs_review"},
+    ),
+}
+
+
+# -------------------------------
+# Transitions
+# -------------------------------
+def transition_payment(payment, status, **fields):
+    """
+    Move a payment to `status` (optionally setting other fields) with one
+    conditional UPDATE ... WHERE status=<status it was loaded with>, then
+    settle its order. Returns False without writing anything when there's
+    nothing to change, or when a concurrent request (e.g. the webhook)
+    already made the same transition. Raises InvalidTransition for a move
+    PAYMENT_TRANSITIONS doesn't allow or one that lost a race.
+    """
+    previous = payment.status
+    if status != previous and status not in PAYMENT_TRANSITIONS.get(previous, ()):
+        raise InvalidTransition(f"Payment {payment.pk} can't go from {previous} to {status}")
+
+    fields = {name: value for name, value in fields.items() if getattr(payment, name) != value}
+    if status == previous and not fields:
+        return False
+
+    now = timezone.now()
+    with transaction.atomic():
+        updated = Payment.objects.filter(pk=payment.pk, status=previous).update(status=status, updated_at=now, **fields)
+        if not updated:
+            current = Payment.objects.filter(pk=payment.pk).values_list("status", flat=True).first()
+            if current == status:
+                payment.status = payment._loaded_status = status
+                return False
+            raise InvalidTransition(f"Payment {payment.pk} moved from {previous} to {current} concurrently")
+
+        for name, value in fields.items():
+            setattr(payment, name, value)
+        payment.status = payment._loaded_status = status
+        payment.updated_at = now
+        if status != previous:
+            settle_order(payment, previous)
+    return True
+
+
+def settle_order(payment, previous):
+    """
+    Resolve the order's stock holds, apply the payment's new status to the
+    order (one conditional UPDATE, none if the order already matches) and
+    announce the change on payment_status_changed.
+    """
+    order = payment.order
+    order_status, order_payment_status, sources = ORDER_TRANSITIONS[payment.status]
+    if payment.status in ("completed", "cod"):
+        if not sell_stock(order):
+            order_status = "needs_review"
+    elif payment.status in ("failed", "cancelled"):
+        release_holds(order)
+
+    updated = (
+        Order.objects.filter(pk=order.pk, status__in=sources)
+        .exclude(status=order_status, payment_status=order_payment_status)
+        .update(status=order_status, payment_status=order_payment_status, updated_at=timezone.now())
+    )
+    if updated:
+        order.status, order.payment_status = order_status, order_payment_status
+
+    invalidate_order_cache(order.user_id)
+    payment_status_changed.send(sender=Payment, payment=payment, previous=previous)
+
+
+def sell_stock(order):
+    """
+    Commit the order's holds. When they were already released (captured
+    after the payment failed, was cancelled or expired) the units are taken
+    out of stock again; returns False, with nothing sold, when they have
+    sold out since and the order needs a refund or a manual decision.
+    """
+    try:
+        commit_holds(order)
+    except HoldsReleased:
+        if not retake_stock(order, hold=False):
+            logger.warning("Order %s was paid after its stock was released and sold out", order.order_number)
+            return False
+    return True
+
+
+# -------------------------------
+# Checkout
+# -------------------------------
+def start_checkout(order):
+    """
+    Payment of an order with a Razorpay order to pay it through. A Razorpay
+    order accepts several payment attempts, so an open one from an earlier
+    attempt (double-click, retry after a failure) is reused without calling
+    the gateway; the gateway call itself runs outside any lock or
+    transaction. Raises InvalidTransition for a settled payment, OutOfStock
+    when stock released since can't be reserved again, and
+    razorpay_client.GatewayError when the gateway can't create the order.
+    """
+    payment = Payment.objects.filter(order=order).first()
+    if payment is not None and payment.status != "created" and "created" not in PAYMENT_TRANSITIONS[payment.status]:
+        raise InvalidTransition(f"Payment {payment.pk} is already {payment.status}")
+
+    # A failed or expired attempt put the stock back on sale: reserve it again before taking payment.
+    # The order row lock makes a concurrent attempt wait and then find the fresh holds.
+    with transaction.atomic():
+        list(Order.objects.select_for_update().filter(pk=order.pk).values_list("pk", flat=True))
+        if holds_released(order) and not retake_stock(order, hold=True):
+            raise OutOfStock(f"Order {order.order_number} is no longer in stock")
+
+    if payment is not None and payment.razorpay_order_id and payment.amount == order.total_amount:
+        payment.order = order
+        transition_payment(payment, "created")
+        return payment
+
+    razorpay_order = razorpay_client.create_order(
+        int(order.total_amount * 100), receipt=order.order_number, notes={"order_id": str(order.pk)},
+    )
+    fields = {"amount": order.total_amount, "payment_method": "razorpay", "razorpay_order_id": razorpay_order["id"]}
+    if payment is None:
+        try:
+            with transaction.atomic():
+                return Payment.objects.create(order=order, status="created", **fields)
+        except IntegrityError:
+            # A concurrent first attempt (double-click) got there first; its
+            # Razorpay order is the one to pay, ours is simply never used
+            return Payment.objects.get(order=order)
+    payment.order = order
+    transition_payment(payment, "created", **fields)
+    return payment
+
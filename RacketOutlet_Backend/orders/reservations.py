@@ -0,0 +1,180 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, When, F, PositiveIntegerField
+from django.utils import timezone
+
+from products.models import Inventory
+from .models import Order, OrderItem, StockHold
+from .cache import invalidate_order_cache
+
+
+class HoldsReleased(Exception):
+    """The order's holds were already released, so its units are back on sale."""
+
+
+def per_product(field, quantities, sign):
+    """CASE expression adding sign * units to `field` for each product in one UPDATE."""
+    return Case(
+        *[When(product_id=product_id, then=F(field) + sign * units) for product_id, units in quantities.items()],
+        default=F(field),
+        output_field=PositiveIntegerField(),
+    )
+
+
+def _shift_stock(quantities, to_available):
+    """
+    Take units out of Inventory.reserved_quantity for many products in one UPDATE,
+    putting them back into Inventory.quantity when `to_available` (release)
+    or dropping them because they were sold (commit).
+    """
+    if not quantities:
+        return
+    changes = {"reserved_quantity": per_product("reserved_quantity", quantities, -1)}
+    if to_available:
+        changes["quantity"] = per_product("quantity", quantities, 1)
+    Inventory.objects.filter(product_id__in=quantities.keys()).update(**changes)
+
+
+# -------------------------------
+# Hold lifecycle
+# -------------------------------
+def create_holds(order, lines):
+    """
+    Record the holds for a freshly placed order.
+    The stock itself was already moved into reserved_quantity by checkout.
+    """
+    expires_at = timezone.now() + settings.INVENTORY_HOLD_TTL
+    StockHold.objects.bulk_create([
+        StockHold(order=order, product_id=product_id, quantity=quantity, expires_at=expires_at)
+        for product_id, quantity in lines.items()
+    ])
+
+
+@transaction.atomic
+def _resolve_holds(holds, resolution, skip_locked=False):
+    """
+    Resolve open holds once and move their stock accordingly. Returns the
+    holds resolved; with `skip_locked`, holds another transaction has locked
+    (e.g. a payment settling right now) are left alone and not returned.
+    """
+    open_holds = list(
+        holds.filter(resolution__isnull=True)
+        .select_for_update(skip_locked=skip_locked)
+        .only("id", "order_id", "product_id", "quantity")
+    )
+    if not open_holds:
+        return []
+
+    StockHold.objects.filter(pk__in=[hold.pk for hold in open_holds], resolution__isnull=True).update(
+        resolution=resolution, resolved_at=timezone.now()
+    )
+
+    quantities = defaultdict(int)
+    for hold in open_holds:
+        quantities[hold.product_id] += hold.quantity
+    _shift_stock(quantities, to_available=(resolution == "released"))
+    return open_holds
+
+
+def holds_released(order):
+    """True when the order was given holds and every one of them has been released."""
+    resolutions = set(StockHold.objects.filter(order=order).values_list("resolution", flat=True).distinct())
+    return resolutions == {"released"}
+
+
+def commit_holds(order):
+    """
+    Payment went through: the held units are sold. Returns the number of
+    holds committed, 0 when they already were (or the order predates
+    holds). Raises HoldsReleased when they were released instead, so the
+    caller doesn't count stock that is back on sale as sold.
+    """
+    committed = len(_resolve_holds(StockHold.objects.filter(order=order), "committed"))
+    if not committed and holds_released(order):
+        raise HoldsReleased(f"Stock held for order {order.pk} was already released")
+    return committed
+
+
+def release_holds(order):
+    """Payment failed or was cancelled: put the held units back on sale. Returns the number released."""
+    return len(_resolve_holds(StockHold.objects.filter(order=order), "released"))
+
+
+def retake_stock(order, hold):
+    """
+    Take an order's units out of Inventory.quantity again after its holds
+    were released. The inventory rows are locked (in product id order, like
+    checkout) and checked before anything is written, so either every line
+    is taken or none. With `hold` the units are reserved under fresh holds
+    for a new payment attempt; otherwise they're sold and recorded as
+    committed holds. Returns False, changing nothing, when a line has sold
+    out since.
+    """
+    lines = defaultdict(int)
+    for product_id, quantity in OrderItem.objects.filter(order=order).values_list("product_id", "quantity"):
+        lines[product_id] += quantity
+    if not lines:
+        return True
+
+    with transaction.atomic():
+        available = dict(
+            Inventory.objects.select_for_update()
+            .filter(product_id__in=lines.keys())
+            .order_by("product_id")
+            .values_list("product_id", "quantity")
+        )
+        if any(available.get(product_id, 0) < quantity for product_id, quantity in lines.items()):
+            return False
+
+        changes = {"quantity": per_product("quantity", lines, -1)}
+        if hold:
+            changes["reserved_quantity"] = per_product("reserved_quantity", lines, 1)
+        Inventory.objects.filter(product_id__in=lines.keys()).update(**changes)
+
+        if hold:
+            create_holds(order, lines)
+        else:
+            now = timezone.now()
+            StockHold.objects.bulk_create([
+                StockHold(
+                    order=order, product_id=product_id, quantity=quantity,
+                    expires_at=now, resolution="committed", resolved_at=now,
+                )
+                for product_id, quantity in lines.items()
+            ])
+    return True
+
+
+# -------------------------------
+# Sweeper
+# -------------------------------
+def release_expired_holds(batch_size=None, now=None):
+    """
+    Release one batch of holds whose TTL has passed and cancel their still
+    pending orders. Orders whose holds are locked by a payment settling
+    concurrently are skipped, holds and all. Returns the number of holds
+    released; call repeatedly until it returns 0.
+    """
+    batch_size = batch_size or settings.INVENTORY_HOLD_SWEEP_BATCH_SIZE
+    now = now or timezone.now()
+
+    with transaction.atomic():
+        order_ids = list(
+            StockHold.objects.filter(resolution__isnull=True, expires_at__lte=now)
+            # Never expire an order whose payment already settled
+            .exclude(order__payment__status__in=["completed", "cod"])
+            .order_by("expires_at")
+            .values_list("order_id", flat=True)[:batch_size]
+        )
+        order_ids = list(dict.fromkeys(order_ids))
+        if not order_ids:
+            return 0
+
+        released = _resolve_holds(StockHold.objects.filter(order_id__in=order_ids), "released", skip_locked=True)
+        expired_orders = Order.objects.filter(pk__in={hold.order_id for hold in released}, status="pending")
+        # Bulk update skips post_save, so drop the owners' cached order pages here
+        invalidate_order_cache(*expired_orders.values_list("user_id", flat=True))
+        expired_orders.update(status="cancelled", updated_at=now)
+    return len(released)
@@ -1,8 +1,9 @@
 import uuid
 from rest_framework import serializers
-from .models import Cart, CartItem, Order, OrderItem, Payment, WishlistItem, Wishlist
+from .models import Cart, CartItem, CartItemQuerySet, Order, OrderItem, Payment, WishlistItem, Wishlist
 from products.serializers import ProductSerializer
 from products.models import Product
+from common.prefetch import register_prefetch_plan
 
 class WishlistItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
@@ -83,6 +84,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
 
 from rest_framework import serializers
 from .models import Order, OrderItem, Product
+from .checkout import place_order
 import uuid
 
 # Input serializer for each item in the payload
@@ -110,50 +112,7 @@ class CreateOrderSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         user = self.context["request"].user
         items_data = validated_data.pop("items")
-
-        if not items_data:
-            raise serializers.ValidationError("Cannot create order with empty items.")
-
-        total_amount = 0
-
-        order = Order.objects.create(
-            user=user,
-            total_amount=0,  # will update later
-            order_number=f"ORD-{uuid.uuid4().hex[:8].upper()}",
-            **validated_data,
-        )
-
-        for item in items_data:
-            try:
-                product = Product.objects.get(id=item["product_id"])
-            except Product.DoesNotExist:
-                order.delete()
-                raise serializers.ValidationError(f"Product ID {item['product_id']} not found.")
-
-            if product.inventory.quantity < item["quantity"]:
-                order.delete()
-                raise serializers.ValidationError(f"Not enough stock for {product.name}.")
-
-            price = product.discounted_price or product.price
-
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=item["quantity"],
-                price=price,
-            )
-
-            total_amount += price * item["quantity"]
-
-            # Deduct inventory
-            product.inventory.quantity -= item["quantity"]
-            product.inventory.save()
-
-        # Update order total
-        order.total_amount = total_amount
-        order.save()
-
-        return order
+        return place_order(user, items_data, **validated_data)
 
 
 
@@ -218,3 +177,15 @@ class PaymentSerializer(serializers.ModelSerializer):
             "updated_at",
         )
         read_only_fields = ("amount", "status", "created_at", "updated_at")
+
+
+# ============================
+# Prefetch plans
+# ============================
+register_prefetch_plan(WishlistItemSerializer, product=ProductSerializer)
+register_prefetch_plan(WishlistSerializer, items=WishlistItemSerializer)
+register_prefetch_plan(CartItemSerializer, refine=CartItemQuerySet.with_subtotals, product=ProductSerializer)
+register_prefetch_plan(CartSerializer, items=CartItemSerializer)
+register_prefetch_plan(OrderItemSerializer, product=ProductSerializer)
+register_prefetch_plan(OrderSerializer, "user", items=OrderItemSerializer)
+register_prefetch_plan(PaymentSerializer, order=OrderSerializer)
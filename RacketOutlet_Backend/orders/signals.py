@@ -1,30 +1,31 @@
 # signals.py
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import Payment
+from .models import Order, Payment
+from .cache import invalidate_order_cache
+from .payments import settle_order
 
 @receiver(post_save, sender=Payment)
 def sync_order_status(sender, instance: Payment, created, **kwargs):
     """
-    Automatically update the associated Order status based on Payment status.
+    Payments created with a status, or saved directly (admin, API), settle
+    their order like orders.payments.transition_payment does. Saves that
+    don't change the status don't touch the order at all; they only drop
+    its owner's cached order pages (settling does that itself).
     """
-    order = instance.order
-    status = instance.status.lower()
+    previous = None if created else getattr(instance, "_loaded_status", None)
+    if not created and previous == instance.status:
+        if Payment.order.is_cached(instance):
+            user_id = instance.order.user_id
+        else:
+            user_id = Order.objects.filter(pk=instance.order_id).values_list("user_id", flat=True).first()
+        invalidate_order_cache(user_id)
+        return
+    instance._loaded_status = instance.status
+    settle_order(instance, previous)
 
-    if status == "completed":
-        order.status = "confirmed"
-        order.payment_status = "completed"
-    elif status == "failed":
-        order.status = "payment_failed"  # You can also have 'payment_failed'
-        order.payment_status = "failed"
-    elif status == "cancelled":
-        order.status = "cancelled"
-        order.payment_status = "cancelled"
-    elif status == "refunded":
-        order.status = "refunded"
-        order.payment_status = "refunded"
-    elif status in ["created", "pending"]:
-        order.status = "pending"
-        order.payment_status = status
 
-    order.save()
+@receiver([post_save, post_delete], sender=Order)
+def invalidate_cached_orders(sender, instance: Order, **kwargs):
+    """Cached order history of the owner (and staff listings) is stale after any order write."""
+    invalidate_order_cache(instance.user_id)
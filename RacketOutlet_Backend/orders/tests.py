@@ -1,3 +1,627 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from products.models import Category, SubCategory, Product, ProductImage, Inventory
+from .models import Cart, CartItem, Order, OrderItem, Payment, StockHold, WebhookEvent, Wishlist, WishlistItem
+from .reservations import HoldsReleased, commit_holds, release_expired_holds, release_holds
+from .serializers import CartSerializer
+from .payments import InvalidTransition, transition_payment
+from .webhooks import apply_webhook_events
+from common import razorpay_client
+from common.jobs import run_due_jobs
+from common.prefetch import prefetch_instances
+from common.tests import RazorpayGatewayTestCase, local_caches
+
+User = get_user_model()
+
+
+def clear_caches():
+    for cache in caches.all():
+        cache.clear()
+
+
+def make_products(count, prefix="P"):
+    category, _ = Category.objects.get_or_create(name="Tennis")
+    subcategory, _ = SubCategory.objects.get_or_create(name="Rackets", parent_category=category)
+    products = []
+    for i in range(count):
+        product = Product.objects.create(
+            name=f"{prefix}{i}", description="-", subcategory=subcategory,
+            price=Decimal("100.00"), sku=f"{prefix}-SKU-{i}",
+        )
+        Inventory.objects.create(product=product, quantity=50)
+        ProductImage.objects.create(product=product, image=f"product_images/{prefix}{i}.jpg")
+        products.append(product)
+    return products
+
+
+# -------------------------------
+# Prefetch plan query counts
+# -------------------------------
+class PrefetchPlanQueryCountTests(TestCase):
+    """Serializing N embedded products must cost the same number of queries as 1."""
+
+    def setUp(self):
+        clear_caches()
+        self.user = User.objects.create_user(username="buyer", email="buyer@example.com", password="x")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def count_queries(self, url):
+        clear_caches()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def fill_cart(self, products):
+        cart, _ = Cart.objects.get_or_create(user=self.user)
+        for product in products:
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+
+    def fill_order(self, products):
+        order = Order.objects.create(
+            user=self.user, order_number=f"ORD-{Order.objects.count()}", total_amount=0,
+            shipping_address="-", shipping_person_name="-", shipping_person_number="-",
+            billing_address="-", payment_method="cod",
+        )
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+
+    def fill_wishlist(self, products):
+        wishlist, _ = Wishlist.objects.get_or_create(user=self.user)
+        for product in products:
+            WishlistItem.objects.create(wishlist=wishlist, product=product)
+
+    def assert_constant(self, fill, url):
+        fill(make_products(1, prefix="A"))
+        small = self.count_queries(url)
+        fill(make_products(20, prefix="B"))
+        large = self.count_queries(url)
+        self.assertEqual(small, large)
+
+    def test_cart_items(self):
+        self.assert_constant(self.fill_cart, "/api/cart/items/")
+
+    def test_order_list(self):
+        self.assert_constant(self.fill_order, "/api/orders/")
+
+    def test_wishlist(self):
+        self.assert_constant(self.fill_wishlist, "/api/wishlist/")
+
+
+# -------------------------------
+# Checkout
+# -------------------------------
+class CheckoutTestCase(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = User.objects.create_user(username="buyer", email="buyer@example.com", password="x")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def checkout(self, lines):
+        payload = {
+            "shipping_address": "-", "billing_address": "-",
+            "shipping_person_name": "-", "shipping_person_number": "-",
+            "payment_method": "cod",
+            "items": [{"product_id": p.id, "quantity": q} for p, q in lines],
+        }
+        return self.client.post("/api/orders/", payload, format="json")
+
+
+class CheckoutTests(CheckoutTestCase):
+    def test_query_count_is_flat(self):
+        counts = []
+        for size in (1, 10):
+            products = make_products(size, prefix=f"S{size}-")
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.checkout([(p, 2) for p in products])
+            self.assertEqual(response.status_code, 201)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_stock_is_decremented(self):
+        product, other = make_products(2)
+        response = self.checkout([(product, 3), (other, 1), (product, 2)])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Inventory.objects.get(product=product).quantity, 45)
+        self.assertEqual(Inventory.objects.get(product=other).quantity, 49)
+        order = Order.objects.get()
+        self.assertEqual(order.total_amount, Decimal("600.00"))
+        self.assertEqual(order.items.count(), 2)
+
+    def test_oversell_is_rejected_without_side_effects(self):
+        product, other = make_products(2)
+        response = self.checkout([(other, 1), (product, 51)])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Inventory.objects.get(product=other).quantity, 50)
+        self.assertFalse(Order.objects.exists())
+
+
+# -------------------------------
+# Stock holds
+# -------------------------------
+class StockHoldTests(CheckoutTestCase):
+    def place(self, product, quantity=5):
+        response = self.checkout([(product, quantity)])
+        self.assertEqual(response.status_code, 201)
+        return Order.objects.get(order_number=response.data["order_number"])
+
+    def test_checkout_reserves_stock(self):
+        product, = make_products(1)
+        order = self.place(product)
+        inventory = Inventory.objects.get(product=product)
+        self.assertEqual((inventory.quantity, inventory.reserved_quantity), (45, 5))
+        self.assertEqual(order.stock_holds.get().quantity, 5)
+
+    def test_failed_payment_releases_stock_once(self):
+        product, = make_products(1)
+        order = self.place(product)
+        payment = Payment.objects.create(order=order, amount=order.total_amount, status="failed")
+        payment.status = "cancelled"
+        payment.save()
+        inventory = Inventory.objects.get(product=product)
+        self.assertEqual((inventory.quantity, inventory.reserved_quantity), (50, 0))
+        self.assertEqual(order.stock_holds.get().resolution, "released")
+
+    def test_committing_released_holds_raises(self):
+        product, = make_products(1)
+        order = self.place(product)
+        self.assertEqual(release_holds(order), 1)
+        with self.assertRaises(HoldsReleased):
+            commit_holds(order)
+        inventory = Inventory.objects.get(product=product)
+        self.assertEqual((inventory.quantity, inventory.reserved_quantity), (50, 0))
+
+        fresh = self.place(product)
+        self.assertEqual(commit_holds(fresh), 1)
+        self.assertEqual(commit_holds(fresh), 0)
+
+    def test_sweeper_releases_expired_holds(self):
+        product, = make_products(1)
+        order = self.place(product)
+        fresh = self.place(product)
+        StockHold.objects.filter(order=order).update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(release_expired_holds(batch_size=10), 1)
+        self.assertEqual(release_expired_holds(batch_size=10), 0)
+
+        inventory = Inventory.objects.get(product=product)
+        self.assertEqual((inventory.quantity, inventory.reserved_quantity), (45, 5))
+        order.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual((order.status, fresh.status), ("cancelled", "pending"))
+
+    def test_sweeper_leaves_orders_whose_holds_are_locked(self):
+        product, = make_products(1)
+        settling, expired = self.place(product), self.place(product)
+        StockHold.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        # sqlite has no row locks: hide the settling order's holds from the
+        # skip_locked read, as Postgres does while its payment holds them
+        select_for_update = QuerySet.select_for_update
+
+        def skip_settling(queryset, *args, skip_locked=False, **kwargs):
+            if skip_locked:
+                queryset = queryset.exclude(order=settling)
+            return select_for_update(queryset, *args, skip_locked=skip_locked, **kwargs)
+
+        with mock.patch.object(QuerySet, "select_for_update", skip_settling):
+            self.assertEqual(release_expired_holds(batch_size=10), 1)
+        settling.refresh_from_db()
+        expired.refresh_from_db()
+        self.assertEqual((settling.status, expired.status), ("pending", "cancelled"))
+        self.assertIsNone(settling.stock_holds.get().resolution)
+
+
+@skipUnlessDBFeature("has_select_for_update_skip_locked")
+class StockHoldLockTests(TransactionTestCase):
+    def place(self, user, product):
+        order = Order.objects.create(
+            user=user, order_number=f"ORD-{Order.objects.count()}", total_amount=Decimal("100.00"),
+            shipping_address="-", shipping_person_name="-", shipping_person_number="-",
+            billing_address="-", payment_method="razorpay",
+        )
+        OrderItem.objects.create(order=order, product=product, quantity=1, price=Decimal("100.00"))
+        StockHold.objects.create(order=order, product=product, quantity=1, expires_at=timezone.now() - timedelta(minutes=1))
+        return order
+
+    @mock.patch("homepage.snapshot._start_rebuild")
+    def test_sweeper_leaves_orders_a_payment_is_settling(self, _):
+        user = User.objects.create_user(username="buyer", email="buyer@example.com", password="x")
+        product, = make_products(1)
+        Inventory.objects.filter(product=product).update(quantity=48, reserved_quantity=2)
+        settling, expired = self.place(user, product), self.place(user, product)
+
+        locked, settled = threading.Event(), threading.Event()
+
+        def settle():
+            # A concurrent commit_holds: holds the order's hold rows until told to finish
+            try:
+                with transaction.atomic():
+                    list(StockHold.objects.select_for_update().filter(order=settling))
+                    locked.set()
+                    settled.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=settle)
+        thread.start()
+        try:
+            self.assertTrue(locked.wait(10))
+            self.assertEqual(release_expired_holds(batch_size=10), 1)
+        finally:
+            settled.set()
+            thread.join()
+
+        settling.refresh_from_db()
+        expired.refresh_from_db()
+        self.assertEqual((settling.status, expired.status), ("pending", "cancelled"))
+        self.assertIsNone(settling.stock_holds.get().resolution)
+
+
+# -------------------------------
+# Order read cache
+# -------------------------------
+@local_caches("orders")
+class OrderCacheTests(CheckoutTestCase):
+    def test_cache_is_per_user(self):
+        product, = make_products(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.checkout([(product, 1)])
+        self.assertEqual(self.client.get("/api/orders/").data["count"], 1)
+
+        other = User.objects.create_user(username="other", email="other@example.com", password="x")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get("/api/orders/").data["count"], 0)
+
+    def test_status_change_invalidates(self):
+        product, = make_products(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            order_id = self.checkout([(product, 1)]).data["id"]
+        self.assertEqual(self.client.get(f"/api/orders/{order_id}/").data["status"], "pending")
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(f"/api/orders/{order_id}/")
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(order_id=order_id, amount=100, status="cancelled")
+        self.assertEqual(self.client.get(f"/api/orders/{order_id}/").data["status"], "cancelled")
+        self.assertEqual(self.client.get("/api/orders/").data["results"][0]["status"], "cancelled")
+
+    def test_payment_saves_invalidate_without_loading_the_order(self):
+        product, = make_products(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            order_id = self.checkout([(product, 1)]).data["id"]
+        payment = Payment.objects.create(order_id=order_id, amount=100, status="created")
+
+        payment = Payment.objects.get(pk=payment.pk)
+        payment.transaction_id = "txn_1"
+        with mock.patch("orders.signals.invalidate_order_cache") as invalidate, \
+                CaptureQueriesContext(connection) as ctx:
+            payment.save()
+        invalidate.assert_called_once_with(self.user.id)
+        order_reads = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith('SELECT "orders_order"')]
+        self.assertEqual(len(order_reads), 1)
+        self.assertNotIn("order_number", order_reads[0])  # just the owner, not the whole row
+
+        with mock.patch("orders.signals.invalidate_order_cache") as invalidate, \
+                mock.patch("orders.payments.invalidate_order_cache") as settled:
+            transition_payment(payment, "cancelled")
+        invalidate.assert_not_called()
+        settled.assert_called_once_with(self.user.id)
+
+
+# -------------------------------
+# Payment state machine
+# -------------------------------
+class PaymentStateMachineTests(CheckoutTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product, = make_products(1)
+        self.order = Order.objects.get(order_number=self.checkout([(self.product, 5)]).data["order_number"])
+        Payment.objects.create(order=self.order, amount=self.order.total_amount, status="created")
+
+    def load(self):
+        return Payment.objects.select_related("order").get(order=self.order)
+
+    def test_verification_is_one_write_per_row(self):
+        payment = self.load()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertTrue(transition_payment(payment, "completed", razorpay_payment_id="pay_1"))
+        updates = [q["sql"].split()[1].strip('"') for q in ctx.captured_queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(updates.count("orders_payment"), 1)
+        self.assertEqual(updates.count("orders_order"), 1)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.payment_status), ("confirmed", "completed"))
+
+        with self.assertNumQueries(0):
+            self.assertFalse(transition_payment(payment, "completed", razorpay_payment_id="pay_1"))
+
+    def test_stale_copies_cannot_undo_a_settled_payment(self):
+        webhook, verify = self.load(), self.load()
+        transition_payment(webhook, "completed")
+
+        self.assertFalse(transition_payment(verify, "completed"))  # same outcome, nothing written
+        with self.assertRaises(InvalidTransition):
+            transition_payment(self.load(), "failed")
+        self.assertEqual(self.load().status, "completed")
+        self.assertEqual(self.order.stock_holds.get().resolution, "committed")
+
+    def test_payments_never_pull_back_a_shipped_order(self):
+        Order.objects.filter(pk=self.order.pk).update(status="shipped")
+        transition_payment(self.load(), "failed")
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "shipped")
+
+    def stock(self):
+        inventory = Inventory.objects.get(product=self.product)
+        return inventory.quantity, inventory.reserved_quantity
+
+    def test_capture_after_expiry_takes_the_stock_again(self):
+        StockHold.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        release_expired_holds()
+        self.assertEqual(self.stock(), (50, 0))
+
+        transition_payment(self.load(), "completed")
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "confirmed")
+        self.assertEqual(self.stock(), (45, 0))
+        self.assertEqual(sorted(self.order.stock_holds.values_list("resolution", flat=True)), ["committed", "released"])
+
+    def test_capture_after_the_stock_sold_out_needs_review(self):
+        transition_payment(self.load(), "failed")
+        self.checkout([(self.product, 48)])
+
+        with mock.patch("notifications.signals.send_order_email") as send_email, \
+                self.assertLogs("orders.payments", "WARNING"):
+            transition_payment(self.load(), "completed")
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.payment_status), ("needs_review", "completed"))
+        self.assertEqual(self.stock(), (2, 48))
+        self.assertFalse(send_email.called)
+
+    def test_saves_without_status_change_leave_the_order_alone(self):
+        payment = self.load()
+        with CaptureQueriesContext(connection) as ctx:
+            payment.transaction_id = "txn_1"
+            payment.save()
+        self.assertFalse(any("orders_order" in q["sql"] for q in ctx.captured_queries if q["sql"].startswith("UPDATE")))
+
+
+# -------------------------------
+# Razorpay checkout
+# -------------------------------
+class RazorpayCheckoutTests(RazorpayGatewayTestCase, CheckoutTestCase):
+    def setUp(self):
+        CheckoutTestCase.setUp(self)
+        RazorpayGatewayTestCase.setUp(self)
+        self.product, = make_products(1)
+        self.order = Order.objects.get(order_number=self.checkout([(self.product, 2)]).data["order_number"])
+
+    def test_checkout_reuses_the_gateway_order_then_verifies(self):
+        first = self.client.post(f"/api/orders/{self.order.pk}/payment/")
+        again = self.client.post(f"/api/orders/{self.order.pk}/payment/")
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.data["order_id"], again.data["order_id"])
+        self.assertEqual(first.data["amount"], 20000)
+        self.assertEqual(len(self.gateway.orders), 1)
+
+        rzp_order = first.data["order_id"]
+        signature = razorpay_client.payment_signature(rzp_order, "pay_1")
+        response = self.client.post(
+            f"/api/orders/{self.order.pk}/payment/verify/",
+            {"razorpay_order_id": rzp_order, "razorpay_payment_id": "pay_1", "razorpay_signature": signature},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "confirmed")
+
+        # Settled: no new gateway order
+        self.assertEqual(self.client.post(f"/api/orders/{self.order.pk}/payment/").status_code, 400)
+
+    def test_gateway_outage_is_a_fast_503(self):
+        self.gateway.failures = [503] * 10
+        with self.assertLogs("common.razorpay_client", "WARNING"):
+            for _ in range(2):
+                self.assertEqual(self.client.post(f"/api/orders/{self.order.pk}/payment/").status_code, 503)
+        self.assertFalse(Payment.objects.exists())
+
+
+    def test_concurrent_first_attempts_share_one_payment(self):
+        create_order = razorpay_client.create_order
+
+        def race(*args, **kwargs):
+            # The other request creates its payment while this one waits on the gateway
+            Payment.objects.create(order=self.order, amount=self.order.total_amount, status="created", razorpay_order_id="order_other")
+            return create_order(*args, **kwargs)
+
+        with mock.patch.object(razorpay_client, "create_order", side_effect=race):
+            response = self.client.post(f"/api/orders/{self.order.pk}/payment/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["order_id"], "order_other")
+        self.assertEqual(Payment.objects.filter(order=self.order).count(), 1)
+
+    def test_retry_after_a_failure_reserves_the_stock_again(self):
+        url = f"/api/orders/{self.order.pk}/payment/"
+        rzp_order = self.client.post(url).data["order_id"]
+        transition_payment(Payment.objects.get(order=self.order), "failed")
+
+        self.assertEqual(self.client.post(url).data["order_id"], rzp_order)
+        inventory = Inventory.objects.get(product=self.product)
+        self.assertEqual((inventory.quantity, inventory.reserved_quantity), (48, 2))
+        self.assertEqual(self.order.stock_holds.filter(resolution__isnull=True).count(), 1)
+
+        transition_payment(Payment.objects.get(order=self.order), "failed")
+        self.checkout([(self.product, 49)])
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("no longer in stock", response.data["error"])
+        self.assertEqual(Payment.objects.get(order=self.order).status, "failed")
+
+
+# -------------------------------
+# Razorpay webhooks
+# -------------------------------
+@override_settings(RAZORPAY_WEBHOOK_SECRET="whsec")
+class RazorpayWebhookTests(CheckoutTestCase):
+    def setUp(self):
+        super().setUp()
+        product, = make_products(1)
+        self.order = Order.objects.get(order_number=self.checkout([(product, 5)]).data["order_number"])
+        self.payment = Payment.objects.create(
+            order=self.order, amount=self.order.total_amount, status="created", razorpay_order_id="order_rzp1",
+        )
+
+    def deliver(self, event, event_id, secret="whsec"):
+        body = json.dumps({
+            "event": event,
+            "payload": {"payment": {"entity": {"id": "pay_1", "order_id": "order_rzp1"}}},
+        }).encode()
+        signature = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+        return APIClient().post(
+            "/api/razorpay/webhook/", body, content_type="application/json",
+            HTTP_X_RAZORPAY_SIGNATURE=signature, HTTP_X_RAZORPAY_EVENT_ID=event_id,
+        )
+
+    def test_bad_signature_is_rejected(self):
+        self.assertEqual(self.deliver("payment.captured", "evt_1", secret="wrong").status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_events_are_acknowledged_deduplicated_then_applied(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.deliver("payment.captured", "evt_1")
+            again = self.deliver("payment.captured", "evt_1")
+        self.assertEqual((first.json()["status"], again.json()["status"]), ("received", "duplicate"))
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, "created")  # nothing applied in the request
+
+        with self.captureOnCommitCallbacks():
+            run_due_jobs()
+        self.payment.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual((self.payment.status, self.payment.razorpay_payment_id), ("completed", "pay_1"))
+        self.assertEqual(self.order.status, "confirmed")
+        self.assertEqual(self.order.stock_holds.get().resolution, "committed")
+        self.assertIsNotNone(WebhookEvent.objects.get().processed_at)
+
+    def test_failed_events_are_retried(self):
+        self.payment.delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.deliver("payment.failed", "evt_1")
+        with self.assertLogs("orders.webhooks", "WARNING"), self.assertLogs("common.jobs", "WARNING"):
+            run_due_jobs()
+        event = WebhookEvent.objects.get()
+        self.assertEqual((event.attempts, event.processed_at), (1, None))
+        self.assertIn("DoesNotExist", event.last_error)
+
+        Payment.objects.create(order=self.order, amount=self.order.total_amount, razorpay_order_id="order_rzp1")
+        self.assertEqual(apply_webhook_events(), (1, 0))
+        self.assertEqual(Payment.objects.get().status, "failed")
+
+    def test_later_events_see_the_rolled_back_state(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.deliver("payment.captured", "evt_1")
+            self.deliver("payment.failed", "evt_2")
+        # The capture moves the payment in memory, then fails settling the order
+        with mock.patch("orders.payments.invalidate_order_cache", side_effect=[RuntimeError("boom"), None]), \
+                self.assertLogs("orders.webhooks", "WARNING"):
+            self.assertEqual(apply_webhook_events(), (2, 1))
+        self.payment.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual((self.payment.status, self.order.status), ("failed", "payment_failed"))
+
+
+# -------------------------------
+# Cart document
+# -------------------------------
+@local_caches("cart", "catalog")
+class CartDocumentTests(CheckoutTestCase):
+    def test_warm_cart_reads_skip_the_database(self):
+        first, second = make_products(2)
+        self.client.post("/api/cart/items/", {"product_id": first.id, "quantity": 2}, format="json")
+        self.client.post("/api/cart/items/", {"product_id": second.id}, format="json")
+
+        with CaptureQueriesContext(connection) as ctx:
+            cart = self.client.get("/api/cart/").data
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual([item["quantity"] for item in cart["items"]], [2, 1])
+        self.assertEqual(cart["total_price"], Decimal("300.00"))
+
+    def test_item_ids_are_product_ids(self):
+        first, second = make_products(2)
+        self.client.post("/api/cart/items/", {"product_id": first.id}, format="json")
+        self.client.post("/api/cart/items/", {"product_id": second.id}, format="json")
+
+        response = self.client.patch(f"/api/cart/items/{first.id}/", {"quantity": 5}, format="json")
+        self.assertEqual(response.data["quantity"], 5)
+        self.assertEqual(self.client.delete(f"/api/cart/items/{second.id}/").status_code, 204)
+        self.assertEqual(self.client.delete(f"/api/cart/items/{second.id}/").status_code, 404)
+        self.assertEqual([item["id"] for item in self.client.get("/api/cart/").data["items"]], [first.id])
+
+    def test_writes_go_through_to_the_rows(self):
+        first, second = make_products(2)
+        self.client.post("/api/cart/items/", {"product_id": first.id, "quantity": 3}, format="json")
+        self.client.post("/api/cart/items/", {"product_id": second.id}, format="json")
+        self.client.patch(f"/api/cart/items/{first.id}/", {"quantity": 4}, format="json")
+        self.client.delete(f"/api/cart/items/{second.id}/")
+        self.assertEqual(list(CartItem.objects.values_list("product_id", "quantity")), [(first.id, 4)])
+
+        clear_caches()  # restart / eviction loses nothing
+        self.assertEqual(self.client.get("/api/cart/").data["items"][0]["quantity"], 4)
+
+
+# -------------------------------
+# Cart read query counts
+# -------------------------------
+class CartReadQueryCountTests(TestCase):
+    """
+    Serializing a cart of 1, 10 and 50 lines through the CartSerializer
+    prefetch plan costs the same queries every time; lazily it grows with the lines.
+    """
+
+    def read(self, cart_id, planned):
+        with CaptureQueriesContext(connection) as ctx:
+            cart = Cart.objects.get(pk=cart_id)
+            if planned:
+                prefetch_instances([cart], CartSerializer)
+            data = CartSerializer(cart).data
+        return data, len(ctx.captured_queries)
+
+    def test_planned_reads_do_not_grow_with_the_cart(self):
+        user = User.objects.create_user(username="buyer", email="buyer@example.com", password="x")
+        cart = Cart.objects.create(user=user)
+        planned_counts, lazy_counts = [], []
+        added = 0
+        for size in (1, 10, 50):
+            for product in make_products(size - added, prefix=f"L{size}-"):
+                CartItem.objects.create(cart=cart, product=product, quantity=2)
+            added = size
+
+            lazy, lazy_queries = self.read(cart.pk, planned=False)
+            planned, planned_queries = self.read(cart.pk, planned=True)
+            self.assertEqual(planned["total_price"], lazy["total_price"])
+            self.assertEqual(planned["total_price"], Decimal("200.00") * size)
+            planned_counts.append(planned_queries)
+            lazy_counts.append(lazy_queries)
+
+        self.assertEqual(len(set(planned_counts)), 1)
+        self.assertLess(planned_counts[-1], lazy_counts[-1])
+        self.assertEqual(lazy_counts, sorted(set(lazy_counts)))
@@ -12,10 +12,12 @@ from django.views.decorators.csrf import csrf_exempt
 from rest_framework import generics, permissions, status, serializers
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.exceptions import NotFound
 from django.db import transaction
 from django.core.cache import cache
 
 from .models import Cart, CartItem, Order, OrderItem, Payment
+from .payments import InvalidTransition, start_checkout, transition_payment
 from .serializers import (
     CartSerializer,
     CartItemSerializer,
@@ -23,81 +25,45 @@ from .serializers import (
     CreateOrderSerializer,
     PaymentSerializer
 )
-from common.razorpay_client import razorpay_client
-import razorpay
+from common import razorpay_client
+from common.prefetch import apply_prefetch_plan, prefetch_instances
+from common.pagination import PageOrKeysetPagination
+from .cart import load_cart, render_cart, render_items, add_item, set_quantity, remove_item
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
 # orders/views.py
-import razorpay
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
 from django.http import JsonResponse
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
 from .models import Payment, Order
+from .webhooks import record_event, verify_signature
 
 class RazorpayWebhookView(APIView):
+    """
+    Razorpay webhook: verify the signature, store the event in the inbox and
+    acknowledge straight away. Payments are updated by the
+    process_webhook_events job (see orders.webhooks), so Razorpay retry
+    storms only cost one insert per delivery.
+    """
     permission_classes = [AllowAny]  # Webhooks are external calls, no auth
+    authentication_classes = []
 
-    @csrf_exempt
     def post(self, request, *args, **kwargs):
-        data = request.data
-        event = data.get("event")
-
-        if event == "payment.captured":
-            payment_id = data["payload"]["payment"]["entity"]["id"]
-            order_id = data["payload"]["payment"]["entity"].get("notes", {}).get("order_id")
-
-            try:
-                payment = Payment.objects.get(razorpay_payment_id=payment_id)
-            except Payment.DoesNotExist:
-                return JsonResponse({"error": "Payment not found"}, status=404)
-
-            payment.status = "captured"
-            payment.save()
-
-            if order_id:
-                try:
-                    order = Order.objects.get(id=order_id)
-                    order.status = "paid"
-                    order.save()
-                except Order.DoesNotExist:
-                    pass
-
-            return JsonResponse({"status": "payment captured processed"})
-
-        elif event == "payment.failed":
-            payment_id = data["payload"]["payment"]["entity"]["id"]
-
-            try:
-                payment = Payment.objects.get(razorpay_payment_id=payment_id)
-            except Payment.DoesNotExist:
-                return JsonResponse({"error": "Payment not found"}, status=404)
-
-            payment.status = "failed"
-            payment.save()
-
-            return JsonResponse({"status": "payment failed processed"})
-
-        elif event == "refund.processed":
-            refund_id = data["payload"]["refund"]["entity"]["id"]
-            payment_id = data["payload"]["refund"]["entity"]["payment_id"]
-
-            try:
-                payment = Payment.objects.get(razorpay_payment_id=payment_id)
-            except Payment.DoesNotExist:
-                return JsonResponse({"error": "Payment not found"}, status=404)
+        body = request.body
+        if not verify_signature(body, request.headers.get("X-Razorpay-Signature", "")):
+            return JsonResponse({"error": "Invalid signature"}, status=400)
 
-            payment.status = "refunded"
-            payment.save()
-
-            return JsonResponse({"status": f"refund {refund_id} processed"})
+        try:
+            created = record_event(body, request.headers.get("X-Razorpay-Event-Id"))
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse({"error": "Invalid payload"}, status=400)
 
-        else:
-            return JsonResponse({"status": f"Unhandled event {event}"}, status=200)
+        return JsonResponse({"status": "received" if created else "duplicate"})
 
 
 # =====================================================
@@ -108,30 +74,20 @@ def create_order(request, order_id):
     """ Create Razorpay order for checkout """
     order = get_object_or_404(Order, id=order_id, user=request.user)
 
-    amount = int(order.total_amount * 100)  # paise
-    currency = "INR"
-
-    razorpay_order = razorpay_client.order.create({
-        "amount": amount,
-        "currency": currency,
-        "payment_capture": 1,  # auto-capture
-    })
-
-    # Update or create payment record
-    payment, _ = Payment.objects.update_or_create(
-        order=order,
-        defaults={
-            "amount": order.total_amount,
-            "status": "created",
-            "payment_method": "razorpay",
-            "razorpay_order_id": razorpay_order["id"],
-        }
-    )
+    # Create the payment record, or restart a failed/unfinished one
+    try:
+        payment = start_checkout(order)
+    except InvalidTransition as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    except razorpay_client.GatewayUnavailable:
+        return JsonResponse({"error": "Payment gateway unavailable, please retry"}, status=503)
+    except razorpay_client.GatewayError:
+        return JsonResponse({"error": "Payment gateway error"}, status=502)
 
     return JsonResponse({
-        "order_id": razorpay_order["id"],
-        "amount": amount,
-        "currency": currency,
+        "order_id": payment.razorpay_order_id,
+        "amount": int(order.total_amount * 100),  # paise
+        "currency": "INR",
         "razorpay_key": os.environ.get("RAZORPAY_KEY_ID"),
     })
 
@@ -147,31 +103,32 @@ def verify_payment(request):
     razorpay_payment_id = data.get("razorpay_payment_id")
     razorpay_signature = data.get("razorpay_signature")
 
-    payment = get_object_or_404(Payment, razorpay_order_id=razorpay_order_id)
+    payment = get_object_or_404(Payment.objects.select_related("order"), razorpay_order_id=razorpay_order_id)
 
     try:
-        razorpay_client.utility.verify_payment_signature({
-            "razorpay_order_id": razorpay_order_id,
-            "razorpay_payment_id": razorpay_payment_id,
-            "razorpay_signature": razorpay_signature
-        })
-
-        payment.status = "completed"
-        payment.razorpay_payment_id = razorpay_payment_id
-        payment.razorpay_signature = razorpay_signature
-        payment.save()
-
-        payment.order.status = "confirmed"
-        payment.order.payment_status = "completed"
-        payment.order.save()
-
-        return JsonResponse({"status": "success", "message": "Payment verified successfully."})
-
-    except razorpay.errors.SignatureVerificationError:
-        payment.status = "failed"
-        payment.save()
+        razorpay_client.verify_payment_signature(razorpay_order_id, razorpay_payment_id, razorpay_signature)
+    except razorpay_client.SignatureVerificationError:
+        fail_payment(payment)
         return JsonResponse({"status": "failed", "message": "Payment verification failed."}, status=400)
 
+    try:
+        # No-op if the webhook already captured it
+        transition_payment(
+            payment, "completed", razorpay_payment_id=razorpay_payment_id, razorpay_signature=razorpay_signature,
+        )
+    except InvalidTransition:
+        return JsonResponse({"status": "failed", "message": f"Payment is already {payment.status}."}, status=409)
+
+    return JsonResponse({"status": "success", "message": "Payment verified successfully."})
+
+
+def fail_payment(payment):
+    """A bad signature fails an open payment, but never undoes one that already settled."""
+    try:
+        transition_payment(payment, "failed")
+    except InvalidTransition:
+        pass
+
 
 from rest_framework import generics, status
 from rest_framework.permissions import IsAuthenticated
@@ -189,6 +146,7 @@ class WishlistView(generics.RetrieveAPIView):
     def get_object(self):
         # Get or create a wishlist for the current user
         wishlist, _ = Wishlist.objects.get_or_create(user=self.request.user)
+        prefetch_instances([wishlist], WishlistSerializer)
         return wishlist
 
 
@@ -210,6 +168,7 @@ class AddToWishlistView(generics.CreateAPIView):
         if not created:
             return Response({"message": "Product already in wishlist"}, status=status.HTTP_200_OK)
 
+        prefetch_instances([item], WishlistItemSerializer)
         serializer = WishlistItemSerializer(item)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -229,52 +188,74 @@ class RemoveFromWishlistView(generics.DestroyAPIView):
 # DRF Views (Cart / Order / Payment)
 # =====================================================
 class BaseCartMixin:
+    """
+    Cart endpoints read the compact cart document in the cart cache
+    (see orders.cart); writes also go through to the CartItem rows, and
+    Postgres is otherwise only read to rebuild a missing document or when
+    a product isn't in the catalog cache yet.
+    Cart item ids are product ids.
+    """
     def get_cart(self):
-        user = self.request.user
-        cache_key = f"cart:{user.id}"
-        cart = cache.get(cache_key)
-        if not cart:
-            cart, _ = Cart.objects.get_or_create(user=user)
-            cache.set(cache_key, cart, timeout=60*30)
-        return cart
+        return load_cart(self.request.user)
 
 
-class CartView(BaseCartMixin, generics.RetrieveAPIView):
-    serializer_class = CartSerializer
+class CartView(BaseCartMixin, generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_object(self):
-        return self.get_cart()
+    def get(self, request, *args, **kwargs):
+        return Response(render_cart(self.get_cart()))
 
 
-class CartItemView(BaseCartMixin, generics.ListCreateAPIView):
-    serializer_class = CartItemSerializer
+class CartItemView(BaseCartMixin, generics.GenericAPIView):
+    serializer_class = CartItemSerializer  # validates product_id / quantity
     permission_classes = [permissions.IsAuthenticated]
-    extra_kwargs = {
-            'product': {'required': False}  # so only quantity is required for update
-        }
-
-    def get_queryset(self):
-        return CartItem.objects.filter(cart=self.get_cart())
 
-    def perform_create(self, serializer):
-        serializer.save(cart=self.get_cart())
-        cache.delete(f"cart:{self.request.user.id}")
+    def get(self, request, *args, **kwargs):
+        items = render_items(self.get_cart())
+        page = self.paginate_queryset(items)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(items)
 
-    def create(self, request, *args, **kwargs):
-        response = super().create(request, *args, **kwargs)
-        cart = self.get_cart()
-        serializer = CartSerializer(cart)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        cart = add_item(request.user, serializer.validated_data["product_id"], serializer.validated_data.get("quantity", 1))
+        return Response(render_cart(cart), status=status.HTTP_201_CREATED)
 
 
 
-class CartItemDetailView(BaseCartMixin, generics.RetrieveUpdateDestroyAPIView):
+class CartItemDetailView(BaseCartMixin, generics.GenericAPIView):
     serializer_class = CartItemSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_queryset(self):
-        return CartItem.objects.filter(cart=self.get_cart())
+    def render_item(self, cart, product_id):
+        for item in render_items(cart):
+            if item["id"] == product_id:
+                return item
+        raise NotFound()
+
+    def get(self, request, pk, *args, **kwargs):
+        return Response(self.render_item(self.get_cart(), pk))
+
+    def put(self, request, pk, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        if "quantity" not in serializer.validated_data:
+            return Response(self.render_item(self.get_cart(), pk))
+        cart = set_quantity(request.user, pk, serializer.validated_data["quantity"])
+        if cart is None:
+            raise NotFound()
+        if pk not in cart["items"]:
+            return Response(status=status.HTTP_204_NO_CONTENT)  # quantity 0 removes the line
+        return Response(self.render_item(cart, pk))
+
+    patch = put
+
+    def delete(self, request, pk, *args, **kwargs):
+        if remove_item(request.user, pk) is None:
+            raise NotFound()
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
@@ -301,64 +282,72 @@ def confirm_cod(request, order_id):
     if order.payment_method != "cod":
         return Response({"detail": "This order is not COD"}, status=status.HTTP_400_BAD_REQUEST)
 
-    if order.payment_status == "paid":
+    payment = Payment.objects.filter(order=order).first()
+    if payment is not None and payment.status in ("cod", "completed", "refunded"):
         return Response({"detail": "Order already confirmed"}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Mark payment as 'paid' for COD
-    order.payment_status = "Cash on Delivery"  # ✅ Use 'paid' instead of 'COD'
-    order.status = "confirmed"
-    order.save()
     total_amount = sum([item.product.price * item.quantity for item in order.items.all()])
 
-    # Optionally, create a Payment object for consistency
-    Payment.objects.create(
-        order=order,
-        payment_method='cod',
-        razorpay_payment_id=None,  # no online payment ID
-        status='cod',
-        amount=total_amount,
-        razorpay_order_id = None,
-        razorpay_signature = None,
-        transaction_id = None,
-    )
+    # The 'cod' payment confirms the order (see orders.payments)
+    if payment is None:
+        Payment.objects.create(
+            order=order,
+            payment_method='cod',
+            razorpay_payment_id=None,  # no online payment ID
+            status='cod',
+            amount=total_amount,
+            razorpay_order_id = None,
+            razorpay_signature = None,
+            transaction_id = None,
+        )
+    else:
+        # Switching an unfinished online payment to COD
+        payment.order = order
+        try:
+            transition_payment(payment, "cod", payment_method="cod", amount=total_amount)
+        except InvalidTransition:
+            return Response({"detail": f"Payment is already {payment.status}"}, status=status.HTTP_400_BAD_REQUEST)
 
     return Response({"detail": "COD confirmed successfully"}, status=status.HTTP_200_OK)
 
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
+from django.utils.http import urlencode
 from .models import Order
 from .serializers import OrderSerializer, CreateOrderSerializer
-from django.core.cache import cache
-from django.core.cache.utils import make_template_fragment_key
+from .cache import order_cache_scope
+from common.cache import orders_cache
+
+
+def cached_order_read(request, parts, build):
+    """Serve an order read from the requesting user's slice of the orders cache."""
+    return Response(orders_cache.get_or_build(parts, lambda: build().data, scope=order_cache_scope(request.user)))
 
-CACHE_TTL = 3600  # seconds
 
 class OrderListCreateView(generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = PageOrKeysetPagination
 
     def get_serializer_class(self):
         return CreateOrderSerializer if self.request.method == "POST" else OrderSerializer
 
     def get_queryset(self):
         user = self.request.user
-        return Order.objects.all() if user.is_staff else Order.objects.filter(user=user)
+        qs = Order.objects.all() if user.is_staff else Order.objects.filter(user=user)
+        return apply_prefetch_plan(qs.order_by("-created_at"), OrderSerializer)
 
-    @method_decorator(cache_page(CACHE_TTL))
-    def get(self, request, *args, **kwargs):
-        return super().get(request, *args, **kwargs)
+    def list(self, request, *args, **kwargs):
+        # Keyed by page and filters; invalidated by orders.signals on Order/Payment saves
+        query = urlencode(sorted(request.query_params.items()))
+        build = super().list
+        return cached_order_read(request, ("list", query), lambda: build(request, *args, **kwargs))
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data, context={"request": request})
         serializer.is_valid(raise_exception=True)
         order = serializer.save()
 
-        # Delete cache for this user’s order list page
-        list_url = request.path  # the URL that was cached
-        cache_key = f"views.decorators.cache.cache_page.{list_url}"
-        cache.delete(cache_key)
-
+        prefetch_instances([order], OrderSerializer)
         return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
 
 class OrderDetailView(generics.RetrieveUpdateAPIView):
@@ -367,13 +356,13 @@ class OrderDetailView(generics.RetrieveUpdateAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        return Order.objects.all() if user.is_staff else Order.objects.filter(user=user)
-    
-    @method_decorator(cache_page(CACHE_TTL))
-    def get(self, request, *args, **kwargs):
-        return super().get(request, *args, **kwargs)
+        qs = Order.objects.all() if user.is_staff else Order.objects.filter(user=user)
+        return apply_prefetch_plan(qs, OrderSerializer)
+
+    def retrieve(self, request, *args, **kwargs):
+        build = super().retrieve
+        return cached_order_read(request, ("detail", kwargs["pk"]), lambda: build(request, *args, **kwargs))
 
-import razorpay
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -387,63 +376,51 @@ class ProcessPaymentView(APIView):
     def post(self, request, order_id):
         try:
             order = Order.objects.get(pk=order_id)
-            # Create Razorpay order
-            razorpay_order = razorpay_client.order.create({
-                "amount": int(order.total_amount * 100),
-                "currency": "INR",
-                "payment_capture": 1,
-            })
-            # Save as pending
-            payment, created = Payment.objects.get_or_create(
-                order=order,
-                defaults={"amount": order.total_amount, "status": "created", "razorpay_order_id": razorpay_order['id']}
-            )
+            # Razorpay order + payment record, reused across attempts
+            payment = start_checkout(order)
 
+            prefetch_instances([payment], PaymentSerializer)
             return Response({
-                "order_id": razorpay_order['id'],
-                "amount": razorpay_order['amount'],
-                "currency": razorpay_order['currency'],
+                "order_id": payment.razorpay_order_id,
+                "amount": int(order.total_amount * 100),
+                "currency": "INR",
                 "payment": PaymentSerializer(payment).data
             })
         except Order.DoesNotExist:
             return Response({"error": "Order not found"}, status=404)
+        except InvalidTransition as exc:
+            return Response({"error": str(exc)}, status=400)
+        except razorpay_client.GatewayUnavailable:
+            return Response({"error": "Payment gateway unavailable, please retry"}, status=503)
+        except razorpay_client.GatewayError:
+            return Response({"error": "Payment gateway error"}, status=502)
 
 # 2️⃣ Verify Razorpay Payment
 class VerifyPaymentView(APIView):
     def post(self, request, order_id):
         try:
-            payment = Payment.objects.get(order__id=order_id)
+            payment = Payment.objects.select_related("order").get(order__id=order_id)
             data = request.data
 
             # Verify signature
-            params_dict = {
-                'razorpay_order_id': data['razorpay_order_id'],
-                'razorpay_payment_id': data['razorpay_payment_id'],
-                'razorpay_signature': data['razorpay_signature']
-            }
-
             try:
-                razorpay_client.utility.verify_payment_signature(params_dict)
-            except razorpay.errors.SignatureVerificationError:
-                payment.status = "failed"
-                payment.save()
-
-                # Also mark order as failed
-                payment.order.status = "payment_failed"
-                payment.order.save()
-
+                razorpay_client.verify_payment_signature(
+                    data['razorpay_order_id'], data['razorpay_payment_id'], data['razorpay_signature'],
+                )
+            except razorpay_client.SignatureVerificationError:
+                fail_payment(payment)  # also marks the order as failed
                 return Response({"error": "Payment verification failed"}, status=400)
 
-            # Mark payment as completed
-            payment.status = "completed"
-            payment.razorpay_payment_id = data['razorpay_payment_id']
-            payment.razorpay_signature = data['razorpay_signature']
-            payment.save()
-
-            # ✅ Update Order status too
-            payment.order.status = "confirmed"  # or "completed" depending on your Order.status choices
-            payment.order.save()
-
+            # Mark payment (and its order) as completed
+            try:
+                transition_payment(
+                    payment, "completed",
+                    razorpay_payment_id=data['razorpay_payment_id'], razorpay_signature=data['razorpay_signature'],
+                )
+            except InvalidTransition:
+                return Response({"error": f"Payment is already {payment.status}"}, status=409)
+
+            prefetch_instances([payment], PaymentSerializer)
             return Response(PaymentSerializer(payment).data)
 
         except Payment.DoesNotExist:
@@ -455,24 +432,26 @@ class CancelPaymentView(APIView):
     """Optional: Mark payment as cancelled."""
     def post(self, request, order_id):
         try:
-            payment = Payment.objects.get(order__id=order_id)
-            payment.status = "cancelled"
-            payment.save()  # signal auto-updates order
+            payment = Payment.objects.select_related("order").get(order__id=order_id)
+            transition_payment(payment, "cancelled")  # also cancels the order
             return Response({"status": "Payment cancelled"})
         except Payment.DoesNotExist:
             return Response({"error": "Payment not found"}, status=404)
+        except InvalidTransition:
+            return Response({"error": f"Payment is already {payment.status}"}, status=409)
 
 # views.py
 class FailPaymentView(APIView):
     """Mark a payment as failed manually or via webhook."""
     def post(self, request, order_id):
         try:
-            payment = Payment.objects.get(order__id=order_id)
-            payment.status = "failed"
-            payment.save()  # signal auto-updates order
+            payment = Payment.objects.select_related("order").get(order__id=order_id)
+            transition_payment(payment, "failed")  # also marks the order as failed
             return Response({"status": "Payment marked as failed"})
         except Payment.DoesNotExist:
             return Response({"error": "Payment not found"}, status=404)
+        except InvalidTransition:
+            return Response({"error": f"Payment is already {payment.status}"}, status=409)
 
 
 
@@ -482,4 +461,5 @@ class PaymentView(generics.RetrieveUpdateAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        return Payment.objects.all() if user.is_staff else Payment.objects.filter(order__user=user)
+        qs = Payment.objects.all() if user.is_staff else Payment.objects.filter(order__user=user)
+        return apply_prefetch_plan(qs, PaymentSerializer)
@@ -0,0 +1,163 @@
+import hashlib
+import hmac
+import json
+import logging
+import traceback
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from common.jobs import job
+from .models import Payment, WebhookEvent
+from .payments import InvalidTransition, transition_payment
+
+logger = logging.getLogger(__name__)
+
+# Razorpay event -> Payment.status it settles the payment to
+EVENT_STATUSES = {
+    "payment.captured": "completed",
+    "payment.failed": "failed",
+    "refund.processed": "refunded",
+}
+
+
+# -------------------------------
+# Receiving
+# -------------------------------
+def verify_signature(body, signature):
+    """Check X-Razorpay-Signature: hex HMAC-SHA256 of the raw body under the webhook secret."""
+    secret = settings.RAZORPAY_WEBHOOK_SECRET
+    if not secret or not signature:
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def _entity_ids(data):
+    """(Razorpay payment id, Razorpay order id) an event is about."""
+    if not isinstance(data, dict) or not isinstance(data.get("payload"), dict):
+        raise ValueError("Webhook payload is not an event")
+    payload = data["payload"]
+    if "refund" in payload:
+        return payload["refund"]["entity"].get("payment_id") or "", ""
+    if "payment" in payload:
+        entity = payload["payment"]["entity"]
+        return entity.get("id") or "", entity.get("order_id") or ""
+    return "", ""
+
+
+def record_event(body, event_id=None):
+    """
+    Store a verified delivery in the inbox and queue the worker. Returns
+    False for a redelivery of an event already stored. Deliveries without
+    an X-Razorpay-Event-Id are deduplicated on their body.
+    """
+    data = json.loads(body)
+    payment_id, razorpay_order_id = _entity_ids(data)
+    try:
+        with transaction.atomic():
+            WebhookEvent.objects.create(
+                event_id=event_id or hashlib.sha256(body).hexdigest(),
+                event=data.get("event") or "",
+                payment_id=payment_id,
+                razorpay_order_id=razorpay_order_id,
+                payload=data,
+            )
+    except IntegrityError:
+        return False
+    process_webhook_events.enqueue()
+    return True
+
+
+# -------------------------------
+# Applying
+# -------------------------------
+def apply_event(event, payment):
+    status = EVENT_STATUSES.get(event.event)
+    if status is None:
+        return  # recorded, but nothing to do
+    if payment is None:
+        raise Payment.DoesNotExist(f"No payment for {event.payment_id or event.razorpay_order_id}")
+
+    fields = {}
+    if event.payment_id and not payment.razorpay_payment_id:
+        fields["razorpay_payment_id"] = event.payment_id
+    try:
+        # Also settles the order, its stock holds and the confirmation email
+        transition_payment(payment, status, **fields)
+    except InvalidTransition:
+        # e.g. a late payment.failed for an attempt before the one that was captured
+        logger.info("Ignoring webhook event %s: %s", event.event_id, payment.status)
+
+
+def apply_webhook_events(batch_size=None):
+    """
+    Apply one batch of pending events in a single transaction and return
+    (events taken, events that failed). Events are taken and their payments
+    locked in payment id order, so concurrent workers skip each other's
+    events and never deadlock on payments, and each payment sees its events
+    in the order they arrived. A failing event is rolled back on its own and
+    retried in a later batch, up to WEBHOOK_MAX_ATTEMPTS.
+    """
+    batch_size = batch_size or settings.WEBHOOK_BATCH_SIZE
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(
+            WebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True, attempts__lt=settings.WEBHOOK_MAX_ATTEMPTS)
+            .order_by("payment_id", "received_at")[:batch_size]
+        )
+        if not events:
+            return 0, 0
+
+        payments = (
+            Payment.objects.select_for_update(of=("self",))
+            .select_related("order")
+            .filter(
+                Q(razorpay_payment_id__in={e.payment_id for e in events if e.payment_id})
+                | Q(razorpay_order_id__in={e.razorpay_order_id for e in events if e.razorpay_order_id})
+            )
+            .order_by("pk")
+        )
+        by_payment_id, by_order_id = {}, {}
+        for payment in payments:
+            by_payment_id[payment.razorpay_payment_id] = payment
+            by_order_id[payment.razorpay_order_id] = payment
+
+        failed = 0
+        for event in events:
+            payment = by_payment_id.get(event.payment_id) or by_order_id.get(event.razorpay_order_id)
+            try:
+                with transaction.atomic():
+                    apply_event(event, payment)
+            except Exception:
+                failed += 1
+                event.attempts += 1
+                event.last_error = traceback.format_exc()
+                logger.warning("Webhook event %s (%s) failed", event.event_id, event.event)
+                if payment is not None:
+                    # The savepoint undid the event's writes but not its in-memory changes,
+                    # which the payment's later events in this batch would act on
+                    payment.refresh_from_db()
+                    payment.order.refresh_from_db()
+            else:
+                event.processed_at = now
+        WebhookEvent.objects.bulk_update(events, ["attempts", "last_error", "processed_at"])
+    return len(events), failed
+
+
+@job
+def process_webhook_events():
+    """
+    Background job queued by every new delivery. Several deliveries in a
+    burst are applied by whichever job gets to them first; the rest find
+    an empty inbox.
+    """
+    taken, failed = apply_webhook_events()
+    if taken == settings.WEBHOOK_BATCH_SIZE:
+        process_webhook_events.enqueue()
+    if failed:
+        # Let the job queue back off before the failed events are tried again
+        raise RuntimeError(f"{failed} webhook event(s) failed")
@@ -1,4 +1,6 @@
 from django.contrib import admin
+
+from common.models import upload_pending_files
 from .models import Category, SubCategory, Product, ProductImage, Inventory
 
 # ---------------------------
@@ -21,8 +23,8 @@ class ProductImageInline(admin.TabularInline):
 # ---------------------------
 class InventoryInline(admin.StackedInline):
     model = Inventory
-    fields = ('quantity', 'low_stock_threshold', 'is_low_stock_display', 'last_restocked_at')
-    readonly_fields = ('is_low_stock_display', 'last_restocked_at')  # mark non-editable fields as readonly
+    fields = ('quantity', 'reserved_quantity', 'low_stock_threshold', 'is_low_stock_display', 'last_restocked_at')
+    readonly_fields = ('reserved_quantity', 'is_low_stock_display', 'last_restocked_at')  # mark non-editable fields as readonly
     extra = 0
     max_num = 1
 
@@ -88,6 +90,12 @@ class ProductAdmin(admin.ModelAdmin):
         return f"{obj.subcategory.parent_category.name} -> {obj.subcategory.name}"
     subcategory_name.short_description = 'Category'
 
+    def save_formset(self, request, form, formset, change):
+        # Upload all new inline images at once instead of one per row save
+        if formset.model is ProductImage:
+            upload_pending_files(inline_form.instance for inline_form in formset.forms if inline_form.has_changed())
+        super().save_formset(request, form, formset, change)
+
 
 # ---------------------------
 # ProductImage Admin
@@ -110,17 +118,17 @@ class ProductImageAdmin(admin.ModelAdmin):
 # ---------------------------
 @admin.register(Inventory)
 class InventoryAdmin(admin.ModelAdmin):
-    list_display = ('product', 'quantity', 'low_stock_threshold', 'last_restocked_at', 'is_low_stock_display')
+    list_display = ('product', 'quantity', 'reserved_quantity', 'low_stock_threshold', 'last_restocked_at', 'is_low_stock_display')
     search_fields = ('product__name',)
     ordering = ('product',)
     list_per_page = 50
     autocomplete_fields = ('product',)
-    readonly_fields = ('last_restocked_at', 'is_low_stock_display')  # ✅ fix for non-editable field
+    readonly_fields = ('reserved_quantity', 'last_restocked_at', 'is_low_stock_display')  # ✅ fix for non-editable field
 
     def get_queryset(self, request):
         qs = super().get_queryset(request)
         return qs.select_related('product').only(
-            'id', 'quantity', 'low_stock_threshold', 'last_restocked_at',
+            'id', 'quantity', 'reserved_quantity', 'low_stock_threshold', 'last_restocked_at',
             'product__id', 'product__name'
         )
 
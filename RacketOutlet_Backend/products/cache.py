@@ -0,0 +1,27 @@
+from common.cache import catalog_cache
+from common.prefetch import apply_prefetch_plan
+from .models import Product
+from .serializers import ProductSerializer
+
+
+def product_payloads(product_ids):
+    """
+    Serialized ProductSerializer data for these products, keyed by id.
+
+    Served from the catalog cache; the misses are loaded in one planned
+    query and cached for the next caller. Unknown ids are left out.
+    """
+    product_ids = list(dict.fromkeys(product_ids))
+    if not product_ids:
+        return {}
+
+    payloads = {parts[1]: data for parts, data in catalog_cache.get_many([("product", pid) for pid in product_ids]).items()}
+    missing = [pid for pid in product_ids if pid not in payloads]
+    if missing:
+        loaded = {
+            product.id: ProductSerializer(product).data
+            for product in apply_prefetch_plan(Product.objects.filter(pk__in=missing), ProductSerializer)
+        }
+        catalog_cache.set_many({("product", pid): data for pid, data in loaded.items()})
+        payloads.update(loaded)
+    return payloads
@@ -0,0 +1,92 @@
+import hashlib
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import BooleanField, Case, Count, IntegerField, Q, When
+
+# Upper bounds of the price histogram buckets; the last bucket is open-ended
+PRICE_BUCKETS = (1000, 2500, 5000, 10000, 20000)
+
+# Query parameters of ProductListBySubCategoryView that narrow the product set
+FACET_FILTER_PARAMS = ("price_min", "price_max", "brand", "productType", "inStock", "search")
+
+
+def _normalize(name, value):
+    value = value.strip()
+    if name in ("price_min", "price_max"):
+        try:
+            return str(Decimal(value).normalize())
+        except InvalidOperation:
+            return value
+    if name == "inStock":
+        return str(value.lower() == "true")
+    return value.lower()
+
+
+def facet_filter_key(subcategory_id, params):
+    """
+    Cache key part for a filter set: equal filters in any order, case or
+    number format map to the same key. Paging and sorting are ignored.
+    """
+    normalized = sorted(
+        (name, _normalize(name, params[name]))
+        for name in FACET_FILTER_PARAMS
+        if params.get(name, "").strip()
+    )
+    digest = hashlib.sha1(repr(normalized).encode()).hexdigest()
+    return f"{subcategory_id}:{digest}"
+
+
+def _price_bucket():
+    """Index of the PRICE_BUCKETS bucket of effective_price."""
+    return Case(
+        *[When(effective_price__lt=bound, then=index) for index, bound in enumerate(PRICE_BUCKETS)],
+        default=len(PRICE_BUCKETS),
+        output_field=IntegerField(),
+    )
+
+
+def _bucket_bounds():
+    lower = (0, *PRICE_BUCKETS)
+    upper = (*PRICE_BUCKETS, None)
+    return list(zip(lower, upper))
+
+
+def product_facets(queryset):
+    """
+    Brand, product type, price bucket and in-stock counts for a filtered
+    product queryset, from a single GROUP BY over every facet at once.
+    """
+    rows = (
+        queryset.order_by()
+        .prefetch_related(None)
+        .annotate(
+            price_bucket=_price_bucket(),
+            in_stock=Case(When(Q(inventory__quantity__gt=0), then=True), default=False, output_field=BooleanField()),
+        )
+        .values("brand", "subcategory__name", "price_bucket", "in_stock")
+        .annotate(count=Count("pk"))
+    )
+
+    total = in_stock = 0
+    brands, product_types, buckets = Counter(), Counter(), Counter()
+    for row in rows:
+        count = row["count"]
+        total += count
+        if row["in_stock"]:
+            in_stock += count
+        if row["brand"]:
+            brands[row["brand"]] += count
+        product_types[row["subcategory__name"]] += count
+        buckets[row["price_bucket"]] += count
+
+    return {
+        "total": total,
+        "in_stock": in_stock,
+        "brands": [{"value": name, "count": count} for name, count in sorted(brands.items())],
+        "product_types": [{"value": name, "count": count} for name, count in sorted(product_types.items())],
+        "price_buckets": [
+            {"min": low, "max": high, "count": buckets[index]}
+            for index, (low, high) in enumerate(_bucket_bounds())
+        ],
+    }
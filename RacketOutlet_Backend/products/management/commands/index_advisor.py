@@ -0,0 +1,201 @@
+import re
+from collections import defaultdict
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.runner import DiscoverRunner
+
+DEFAULT_LABELS = ["products", "orders", "notifications", "homepage"]
+
+_IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+_QUALIFIER = re.compile(r'"?\w+"?\.')
+_COMPARISON = re.compile(r'"?(\w+)"?\s*(=|<>|<=|>=|<|>|~~\*?|IS NOT NULL|IS NULL)')
+
+
+def normalize(sql):
+    """Collapse IN lists so the same query shape with different batch sizes groups together."""
+    return _IN_LIST.sub("IN (...)", sql)
+
+
+# -------------------------------
+# Query capture
+# -------------------------------
+class QueryRecorder:
+    """
+    connection.execute_wrapper that EXPLAINs every SELECT right after it
+    runs, inside the test's transaction so the plan sees the test's rows.
+    Sequential scans are disabled for the EXPLAIN, so any Seq Scan left in
+    the plan means no index can serve that filter at all, however small
+    the test tables are.
+    """
+
+    def __init__(self):
+        self.shapes = defaultdict(lambda: {"calls": 0, "plan": None})
+
+    def __call__(self, execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        if not many and sql.lstrip().upper().startswith("SELECT") and connection.in_atomic_block:
+            shape = self.shapes[normalize(sql)]
+            shape["calls"] += 1
+            if shape["calls"] == 1:
+                shape["plan"] = self.explain(context["cursor"], sql, params)
+        return result
+
+    def explain(self, cursor, sql, params):
+        cursor.execute("SAVEPOINT index_advisor")
+        try:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0][0]["Plan"]
+        except connection.Database.Error:
+            plan = None
+        cursor.execute("ROLLBACK TO SAVEPOINT index_advisor")
+        cursor.execute("RELEASE SAVEPOINT index_advisor")
+        return plan
+
+
+class RecordingRunner(DiscoverRunner):
+    def __init__(self, recorder, **kwargs):
+        super().__init__(**kwargs)
+        self.recorder = recorder
+
+    def run_suite(self, suite, **kwargs):
+        with connection.execute_wrapper(self.recorder):
+            return super().run_suite(suite, **kwargs)
+
+
+# -------------------------------
+# Plan analysis
+# -------------------------------
+def _walk(node, parent=None):
+    yield node, parent
+    for child in node.get("Plans", []):
+        yield from _walk(child, node)
+
+
+def _columns(expression):
+    """(equality columns, range/other columns) mentioned in a plan Filter."""
+    equal, other = [], []
+    for column, operator in _COMPARISON.findall(_QUALIFIER.sub("", expression or "")):
+        (equal if operator in ("=", "IS NULL") else other).append(column)
+    return equal, other
+
+
+def _sort_columns(node):
+    keys = []
+    for key in node.get("Sort Key", []):
+        key = _QUALIFIER.sub("", key).replace('"', "")
+        column, _, direction = key.partition(" ")
+        keys.append(f"-{column}" if direction.startswith("DESC") else column)
+    return keys
+
+
+def unindexed_scans(plan):
+    """Yield (table, proposed index fields) for each Seq Scan the planner could not avoid."""
+    for node, parent in _walk(plan):
+        if node.get("Node Type") != "Seq Scan" or not node.get("Filter"):
+            continue
+        equal, other = _columns(node["Filter"])
+        sort = _sort_columns(parent) if parent and parent.get("Node Type") in ("Sort", "Incremental Sort") else []
+        fields = list(dict.fromkeys(equal + other + sort))
+        if fields:
+            yield node["Relation Name"], tuple(fields)
+
+
+REDUNDANT_INDEX_SQL = """
+    SELECT t.relname, i.relname, other.relname
+    FROM pg_index ix
+    JOIN pg_class i ON i.oid = ix.indexrelid
+    JOIN pg_class t ON t.oid = ix.indrelid
+    JOIN pg_index ox ON ox.indrelid = ix.indrelid AND ox.indexrelid <> ix.indexrelid
+    JOIN pg_class other ON other.oid = ox.indexrelid
+    WHERE t.relname = ANY(%s)
+      AND NOT ix.indisunique AND NOT ix.indisprimary
+      AND ix.indpred IS NULL AND ox.indpred IS NULL
+      AND ix.indexprs IS NULL AND ox.indexprs IS NULL
+      AND i.relam = other.relam
+      -- ix's key columns ("1 3") are the leading columns of ox's ("1 3 7");
+      -- of two identical indexes only the newer one is reported
+      AND (ox.indkey::text || ' ') LIKE (ix.indkey::text || ' %%')
+      AND (ix.indnatts < ox.indnatts OR ix.indexrelid > ox.indexrelid)
+    ORDER BY 1, 2
+"""
+
+
+def redundant_indexes(tables):
+    """(table, index, covering index) for indexes whose columns lead another index on the same table."""
+    with connection.cursor() as cursor:
+        cursor.execute(REDUNDANT_INDEX_SQL, [list(tables)])
+        return cursor.fetchall()
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the API test suite against Postgres, EXPLAIN every SELECT it issues, "
+        "and propose composite/partial indexes plus redundant indexes to drop"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("test_labels", nargs="*", default=DEFAULT_LABELS)
+        parser.add_argument("--keepdb", action="store_true", help="Reuse the test database between runs")
+        parser.add_argument("--top", type=int, default=20, help="Show at most N example query shapes")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("index_advisor needs a (local) Postgres database: EXPLAIN plans are Postgres specific")
+
+        labels = options["test_labels"]
+        tables = {
+            model._meta.db_table
+            for app_config in apps.get_app_configs() if app_config.label in labels
+            for model in app_config.get_models()
+        }
+
+        recorder = QueryRecorder()
+        runner = RecordingRunner(recorder, verbosity=0, keepdb=options["keepdb"], interactive=False)
+
+        # Existing indexes have to be read while the test database still exists
+        teardown_databases = runner.teardown_databases
+
+        def report_then_teardown(old_config, **kwargs):
+            self.report_redundant(tables)
+            return teardown_databases(old_config, **kwargs)
+
+        runner.teardown_databases = report_then_teardown
+        failures = runner.run_tests(labels)
+        if failures:
+            self.stdout.write(self.style.WARNING(f"⚠️ {failures} test(s) failed; proposals may be incomplete"))
+
+        self.report_missing(recorder, options["top"])
+
+    def report_missing(self, recorder, top):
+        proposals = defaultdict(lambda: {"calls": 0, "examples": []})
+        for sql, shape in recorder.shapes.items():
+            if shape["plan"] is None:
+                continue
+            for table, fields in unindexed_scans(shape["plan"]):
+                proposal = proposals[(table, fields)]
+                proposal["calls"] += shape["calls"]
+                proposal["examples"].append(sql)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Captured {sum(s['calls'] for s in recorder.shapes.values())} SELECTs in {len(recorder.shapes)} shapes"
+        ))
+        if not proposals:
+            self.stdout.write(self.style.SUCCESS("✅ Every filter was served by an index"))
+            return
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Proposed indexes (by number of queries that need them):"))
+        ranked = sorted(proposals.items(), key=lambda item: -item[1]["calls"])
+        for (table, fields), proposal in ranked[:top]:
+            self.stdout.write(f"  {table}: models.Index(fields={list(fields)!r})  # {proposal['calls']} queries")
+            self.stdout.write(f"      e.g. {proposal['examples'][0][:200]}")
+
+    def report_redundant(self, tables):
+        rows = redundant_indexes(tables)
+        self.stdout.write(self.style.MIGRATE_HEADING("Redundant indexes:"))
+        if not rows:
+            self.stdout.write(self.style.SUCCESS("✅ None"))
+        for table, index, covering in rows:
+            self.stdout.write(f"  {table}: drop {index} (its columns lead {covering})")
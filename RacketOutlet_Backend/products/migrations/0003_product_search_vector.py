@@ -0,0 +1,46 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:12
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Product = apps.get_model("products", "Product")
+    vector = (
+        SearchVector("name", "sku", "brand", weight="A", config="english")
+        + SearchVector("subcategory__name", "subcategory__parent_category__name", weight="B", config="english")
+        + SearchVector("description", weight="C", config="english")
+    )
+    vectors = Product.objects.filter(pk=OuterRef("pk")).annotate(vector=vector).values("vector")[:1]
+    Product.objects.update(search_vector=Subquery(vectors))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_inventory_reserved_quantity'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='products_search_vector_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='products_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.RunPython(backfill_search_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:12
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.comparison.Coalesce(django.db.models.functions.comparison.NullIf(models.F('discounted_price'), models.Value(0)), models.F('price')), output_field=models.DecimalField(decimal_places=2, max_digits=10)),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['subcategory', 'is_active', 'effective_price', 'id'], name='products_subcat_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'effective_price', 'id'], name='products_active_price_idx'),
+        ),
+    ]
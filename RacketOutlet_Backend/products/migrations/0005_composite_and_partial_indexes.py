@@ -0,0 +1,109 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Single-column indexes the models used to declare on top of db_index=True
+# (or on low-selectivity flags). They were never part of the migration
+# history, so drop them only where they were created by hand.
+REDUNDANT_INDEXES = [
+    'products_ca_is_acti_a2d000_idx',
+    'products_ca_is_feat_5928d5_idx',
+    'products_ca_name_693421_idx',
+    'products_ca_slug_da4386_idx',
+    'products_category_created_at_fd4b954c',
+    'products_category_is_active_adb3f10a',
+    'products_category_is_featured_542e691e',
+    'products_in_low_sto_c899b8_idx',
+    'products_in_product_068dc9_idx',
+    'products_in_quantit_750a7d_idx',
+    'products_inventory_last_restocked_at_a4e5008f',
+    'products_inventory_low_stock_threshold_5b799068',
+    'products_inventory_quantity_c1c63a15',
+    'products_pr_brand_4bfaa4_idx',
+    'products_pr_is_acti_ca4d9a_idx',
+    'products_pr_is_feat_a5d7cd_idx',
+    'products_pr_name_9ff0a3_idx',
+    'products_pr_sku_ca0cdc_idx',
+    'products_pr_slug_3edc0c_idx',
+    'products_pr_subcate_f595a1_idx',
+    'products_product_discounted_price_4a1e67bc',
+    'products_product_is_active_2e95eb0a',
+    'products_product_is_deal_of_the_day_eb8c06bf',
+    'products_product_is_exclusive_product_3f99abfa',
+    'products_product_is_featured_feb91670',
+    'products_product_price_9b2ae7ca',
+    'products_pr_is_prim_b891de_idx',
+    'products_pr_product_3d7874_idx',
+    'products_productimage_alt_text_db12c6cf',
+    'products_productimage_alt_text_db12c6cf_like',
+    'products_productimage_is_primary_8d0d4b07',
+    'products_su_is_acti_06cc4e_idx',
+    'products_su_is_feat_cefe73_idx',
+    'products_su_name_4ac726_idx',
+    'products_su_parent__9748d5_idx',
+    'products_su_slug_1d2aa7_idx',
+    'products_subcategory_created_at_c3be600f',
+    'products_subcategory_is_active_b2fcf626',
+    'products_subcategory_is_featured_989cad6e',
+    'products_subcategory_name_e31d0e29',
+    'products_subcategory_name_e31d0e29_like',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_effective_price'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at', '-id'], name='products_active_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_featured', True)), fields=['-created_at'], name='products_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_deal_of_the_day', True)), fields=['-created_at'], name='products_deal_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_exclusive_product', True)), fields=['-created_at'], name='products_exclusive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productimage',
+            index=models.Index(fields=['product', '-is_primary', 'id'], name='products_image_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subcategory',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['parent_category', 'name'], name='products_subcat_by_parent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subcategory',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_featured', True)), fields=['name'], name='products_subcat_featured_idx'),
+        ),
+        # Foreign key indexes now covered by the composites above
+        migrations.AlterField(
+            model_name='product',
+            name='subcategory',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='products', to='products.subcategory'),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='product',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='images', to='products.product'),
+        ),
+        migrations.AlterField(
+            model_name='subcategory',
+            name='parent_category',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='subcategories', to='products.category'),
+        ),
+        migrations.RunSQL(
+            [f'DROP INDEX IF EXISTS "{name}"' for name in REDUNDANT_INDEXES],
+            migrations.RunSQL.noop,
+        ),
+    ]
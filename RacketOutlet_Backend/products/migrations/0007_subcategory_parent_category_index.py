@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_image_variants'),
+    ]
+
+    operations = [
+        # products_subcat_by_parent_idx only covers active subcategories
+        migrations.AlterField(
+            model_name='subcategory',
+            name='parent_category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subcategories', to='products.category'),
+        ),
+    ]
@@ -1,53 +1,43 @@
 import uuid
 from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, NullIf
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.utils.text import slugify
 from django.core.validators import MinValueValidator
-from common.supabase_storage_backend import SupabaseStorage
-
-
-def get_supabase_storage():
-    return SupabaseStorage()
+from common.models import ImageVariantsMixin, PublicUrlMixin
+from common.storage import media_storage
 
 
 # -------------------------------
 # Category Model
 # -------------------------------
-class Category(models.Model):
-    name = models.CharField(max_length=100, unique=True, db_index=True)
-    slug = models.SlugField(max_length=120, unique=True, blank=True, db_index=True)
+class Category(PublicUrlMixin, models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    slug = models.SlugField(max_length=120, unique=True, blank=True)
     description = models.TextField(blank=True, null=True)
     image = models.ImageField(
-       storage=SupabaseStorage, upload_to="category_images/",
+       storage=media_storage, upload_to="category_images/",
         blank=True, null=True
     )
     image_url = models.URLField(blank=True, null=True)
-    is_active = models.BooleanField(default=True, db_index=True)
-    is_featured = models.BooleanField(default=False, db_index=True)
-    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    is_active = models.BooleanField(default=True)
+    is_featured = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    public_url_fields = {"image": "image_url"}
+
     class Meta:
         ordering = ['name']
         verbose_name_plural = 'Categories'
-        indexes = [
-            models.Index(fields=['name']),
-            models.Index(fields=['slug']),
-            models.Index(fields=['is_active']),
-            models.Index(fields=['is_featured']),
-        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
         super().save(*args, **kwargs)
 
-        # Update image URL after save
-        if self.image:
-            new_url = self.image.storage.url(self.image.name)
-            if self.image_url != new_url:
-                self.image_url = new_url
-                super().save(update_fields=["image_url"])
-
     def __str__(self):
         return self.name
 
@@ -55,33 +45,33 @@ class Category(models.Model):
 # -------------------------------
 # SubCategory Model
 # -------------------------------
-class SubCategory(models.Model):
-    name = models.CharField(max_length=100, db_index=True)
-    slug = models.SlugField(max_length=120, unique=True, blank=True, db_index=True)
-    parent_category = models.ForeignKey(
-        Category, on_delete=models.CASCADE, related_name='subcategories', db_index=True
-    )
+class SubCategory(PublicUrlMixin, models.Model):
+    name = models.CharField(max_length=100)
+    slug = models.SlugField(max_length=120, unique=True, blank=True)
+    # Keeps its own index: products_subcat_by_parent_idx is partial (active only),
+    # and category deletes / admin lookups need every row
+    parent_category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='subcategories')
     description = models.TextField(blank=True, null=True)
     image = models.ImageField(
-       storage=SupabaseStorage, upload_to="subcategory_images/",
+       storage=media_storage, upload_to="subcategory_images/",
         blank=True, null=True
     )
     image_url = models.URLField(blank=True, null=True)
-    is_active = models.BooleanField(default=True, db_index=True)
-    is_featured = models.BooleanField(default=False, db_index=True)
-    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    is_active = models.BooleanField(default=True)
+    is_featured = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    public_url_fields = {"image": "image_url"}
+
     class Meta:
         unique_together = ('name', 'parent_category')
         ordering = ['name']
         verbose_name_plural = 'Subcategories'
         indexes = [
-            models.Index(fields=['name']),
-            models.Index(fields=['slug']),
-            models.Index(fields=['parent_category']),
-            models.Index(fields=['is_active']),
-            models.Index(fields=['is_featured']),
+            # Subcategories of a category, by name
+            models.Index(fields=['parent_category', 'name'], condition=models.Q(is_active=True), name='products_subcat_by_parent_idx'),
+            models.Index(fields=['name'], condition=models.Q(is_active=True, is_featured=True), name='products_subcat_featured_idx'),
         ]
 
     def save(self, *args, **kwargs):
@@ -89,12 +79,6 @@ class SubCategory(models.Model):
             self.slug = slugify(f"{self.parent_category.name}-{self.name}")
         super().save(*args, **kwargs)
 
-        if self.image:
-            new_url = self.image.storage.url(self.image.name)
-            if self.image_url != new_url:
-                self.image_url = new_url
-                super().save(update_fields=["image_url"])
-
     def __str__(self):
         return f"{self.parent_category.name} -> {self.name}"
 
@@ -102,18 +86,29 @@ class SubCategory(models.Model):
 # -------------------------------
 # Product Model
 # -------------------------------
-class Product(models.Model):
+class Product(PublicUrlMixin, ImageVariantsMixin, models.Model):
     name = models.CharField(max_length=255, db_index=True)
-    slug = models.SlugField(max_length=255, unique=True, blank=True, null=True, db_index=True)
+    slug = models.SlugField(max_length=255, unique=True, blank=True, null=True)
     description = models.TextField()
     subcategory = models.ForeignKey(
-        SubCategory, on_delete=models.CASCADE, related_name='products', db_index=True
+        SubCategory, on_delete=models.CASCADE, related_name='products',
+        db_index=False,  # leading column of products_subcat_price_idx
     )
-    price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)], db_index=True)
+    # Filtered and sorted through effective_price's indexes
+    price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     discounted_price = models.DecimalField(
-        max_digits=10, decimal_places=2, blank=True, null=True, validators=[MinValueValidator(0)], db_index=True
+        max_digits=10, decimal_places=2, blank=True, null=True, validators=[MinValueValidator(0)]
     )
-    sku = models.CharField(max_length=255, unique=True, db_index=True)
+    # Stored generated column: the price a customer pays (same rule as current_price,
+    # so a discounted_price of 0 means "no discount" and falls back to price, it
+    # never lists a product as free). The database keeps it in sync on every save
+    # and bulk update.
+    effective_price = models.GeneratedField(
+        expression=Coalesce(NullIf(F('discounted_price'), Value(0)), F('price')),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+    )
+    sku = models.CharField(max_length=255, unique=True)
     brand = models.CharField(max_length=255, blank=True, null=True, db_index=True)
     weight = models.DecimalField(
         max_digits=10, decimal_places=2, blank=True, null=True, validators=[MinValueValidator(0)]
@@ -122,33 +117,44 @@ class Product(models.Model):
     material = models.CharField(max_length=255, blank=True, null=True)
 
     main_image = models.ImageField(
-       storage=SupabaseStorage, upload_to="product_main_images/",
+       storage=media_storage, upload_to="product_main_images/",
        max_length=255,
         blank=True, null=True
         
     )
     main_image_url = models.URLField(max_length=500, blank=True, null=True)
+    main_image_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     extra_attributes = models.JSONField(blank=True, null=True)
 
-    is_featured = models.BooleanField(default=False, db_index=True)
-    is_deal_of_the_day = models.BooleanField(default=False, db_index=True)
-    is_exclusive_product = models.BooleanField(default=False, db_index=True)
-    is_active = models.BooleanField(default=True, db_index=True)
+    # Flags are served by the partial indexes in Meta
+    is_featured = models.BooleanField(default=False)
+    is_deal_of_the_day = models.BooleanField(default=False)
+    is_exclusive_product = models.BooleanField(default=False)
+    is_active = models.BooleanField(default=True)
 
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Maintained by products.search.refresh_search_vectors (see products/signals.py)
+    search_vector = SearchVectorField(blank=True, null=True, editable=False)
+
+    public_url_fields = {"main_image": "main_image_url"}
+    image_variant_fields = {"main_image": "main_image_variants"}
+
     class Meta:
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['name']),
-            models.Index(fields=['slug']),
-            models.Index(fields=['sku']),
-            models.Index(fields=['brand']),
-            models.Index(fields=['subcategory']),
-            models.Index(fields=['is_active']),
-            models.Index(fields=['is_featured']),
+            GinIndex(fields=['search_vector'], name='products_search_vector_gin'),
+            GinIndex(fields=['name'], name='products_name_trgm', opclasses=['gin_trgm_ops']),
+            # Price filters/sorts within a subcategory and in search, incl. the keyset tiebreaker
+            models.Index(fields=['subcategory', 'is_active', 'effective_price', 'id'], name='products_subcat_price_idx'),
+            models.Index(fields=['is_active', 'effective_price', 'id'], name='products_active_price_idx'),
+            # Newest-first listings (default ordering) and the homepage rails
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(is_active=True), name='products_active_recent_idx'),
+            models.Index(fields=['-created_at'], condition=models.Q(is_active=True, is_featured=True), name='products_featured_idx'),
+            models.Index(fields=['-created_at'], condition=models.Q(is_active=True, is_deal_of_the_day=True), name='products_deal_idx'),
+            models.Index(fields=['-created_at'], condition=models.Q(is_active=True, is_exclusive_product=True), name='products_exclusive_idx'),
         ]
 
     def save(self, *args, **kwargs):
@@ -156,12 +162,6 @@ class Product(models.Model):
             self.slug = slugify(f"{self.subcategory.parent_category.name}-{self.subcategory.name}-{self.name}")
         super().save(*args, **kwargs)
 
-        if self.main_image:
-            new_url = self.main_image.storage.url(self.main_image.name)
-            if self.main_image_url != new_url:
-                self.main_image_url = new_url
-                super().save(update_fields=["main_image_url"])
-
     def __str__(self):
         return f"{self.subcategory.name} -> {self.name}" + (f" ({self.brand})" if self.brand else "")
 
@@ -172,37 +172,33 @@ class Product(models.Model):
 # -------------------------------
 # Product Image Model
 # -------------------------------
-class ProductImage(models.Model):
+class ProductImage(PublicUrlMixin, ImageVariantsMixin, models.Model):
     product = models.ForeignKey(
         Product,
         on_delete=models.CASCADE,
         related_name='images',
-        db_index=True
+        db_index=False,  # leading column of products_image_order_idx
     )
     image = models.ImageField(
-        storage=SupabaseStorage,
+        storage=media_storage,
         max_length=500,
         upload_to="product_images/"
     )
     image_url = models.URLField(max_length=500, blank=True, null=True)  # increased from 200 → 500
-    alt_text = models.CharField(max_length=255, blank=True, null=True, db_index=True)
-    is_primary = models.BooleanField(default=False, db_index=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    alt_text = models.CharField(max_length=255, blank=True, null=True)
+    is_primary = models.BooleanField(default=False)
+
+    public_url_fields = {"image": "image_url"}
+    image_variant_fields = {"image": "image_variants"}
 
     class Meta:
         ordering = ['-is_primary', 'id']
         indexes = [
-            models.Index(fields=['product']),
-            models.Index(fields=['is_primary']),
+            # A product's images in display order
+            models.Index(fields=['product', '-is_primary', 'id'], name='products_image_order_idx'),
         ]
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        if self.image:
-            new_url = self.image.storage.url(self.image.name)
-            if self.image_url != new_url:
-                self.image_url = new_url
-                super().save(update_fields=["image_url"])
-
     def __str__(self):
         return f"{self.product.name} Image"
 
@@ -211,18 +207,18 @@ class ProductImage(models.Model):
 # Inventory Model
 # -------------------------------
 class Inventory(models.Model):
-    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='inventory', db_index=True)
-    quantity = models.PositiveIntegerField(default=0, db_index=True)
-    low_stock_threshold = models.PositiveIntegerField(default=10, db_index=True)
-    last_restocked_at = models.DateTimeField(auto_now=True, db_index=True)
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='inventory')
+    # Not indexed: rewritten on every checkout and always read through product
+    quantity = models.PositiveIntegerField(default=0)
+    # Units taken out of `quantity` by unpaid orders (see orders.reservations).
+    # `quantity` stays the available-to-sell count; on hand = quantity + reserved_quantity.
+    reserved_quantity = models.PositiveIntegerField(default=0)
+    low_stock_threshold = models.PositiveIntegerField(default=10)
+    last_restocked_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = 'Inventories'
-        indexes = [
-            models.Index(fields=['product']),
-            models.Index(fields=['quantity']),
-            models.Index(fields=['low_stock_threshold']),
-        ]
+
 
     def __str__(self):
         return f"{self.product.name} - {self.quantity} in stock"
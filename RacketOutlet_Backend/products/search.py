@@ -0,0 +1,73 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import F, OuterRef, Q, Subquery
+from rest_framework import filters
+
+from .models import Product
+
+SEARCH_CONFIG = "english"
+
+
+def _postgres():
+    return connection.vendor == "postgresql"
+
+
+# -------------------------------
+# Search vector maintenance
+# -------------------------------
+def product_search_vector():
+    """Weighted document: name/sku/brand (A), subcategory/category (B), description (C)."""
+    return (
+        SearchVector("name", "sku", "brand", weight="A", config=SEARCH_CONFIG)
+        + SearchVector("subcategory__name", "subcategory__parent_category__name", weight="B", config=SEARCH_CONFIG)
+        + SearchVector("description", weight="C", config=SEARCH_CONFIG)
+    )
+
+
+def refresh_search_vectors(products):
+    """
+    Recompute Product.search_vector for a queryset of products in one UPDATE.
+    The vector reads subcategory and category names, which an UPDATE can't
+    join to directly, so it's computed in a correlated subquery.
+    """
+    if not _postgres():
+        return 0
+    vectors = Product.objects.filter(pk=OuterRef("pk")).annotate(vector=product_search_vector()).values("vector")[:1]
+    return products.update(search_vector=Subquery(vectors))
+
+
+# -------------------------------
+# Filter backends
+# -------------------------------
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    Same `search` parameter as SearchFilter, answered from the search_vector
+    GIN index, with trigram matching on the name for typos. Adds a
+    `search_rank` annotation for ProductSearchOrderingFilter.
+
+    Falls back to SearchFilter's ILIKE matching on databases other than Postgres.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = " ".join(self.get_search_terms(request))
+        if not terms or not _postgres():
+            return super().filter_queryset(request, queryset, view)
+
+        query = SearchQuery(terms, search_type="websearch", config=SEARCH_CONFIG)
+        return queryset.annotate(
+            search_rank=SearchRank(F("search_vector"), query) + TrigramWordSimilarity(terms, "name"),
+        ).filter(
+            Q(search_vector=query) | Q(name__trigram_word_similar=terms)
+        )
+
+
+class ProductSearchOrderingFilter(filters.OrderingFilter):
+    """Best matches first when searching, unless the client asked for an explicit ordering."""
+
+    def get_default_ordering(self, view):
+        if _postgres() and self.get_search_terms(view.request):
+            return ["-search_rank", *super().get_default_ordering(view)]
+        return super().get_default_ordering(view)
+
+    def get_search_terms(self, request):
+        return filters.SearchFilter().get_search_terms(request)
@@ -1,14 +1,19 @@
 from rest_framework import serializers
 from .models import Category, SubCategory, Product, ProductImage, Inventory
+from common.images import ImageVariantField
+from common.prefetch import register_prefetch_plan
 
 
 # -------------------------------
 # Product Image Serializer
 # -------------------------------
 class ProductImageSerializer(serializers.ModelSerializer):
+    image_srcset = ImageVariantField("srcset", source="image_variants")
+    image_placeholder = ImageVariantField("placeholder", source="image_variants")
+
     class Meta:
         model = ProductImage
-        fields = ['id', 'image_url', 'alt_text', 'is_primary']
+        fields = ['id', 'image_url', 'image_srcset', 'image_placeholder', 'alt_text', 'is_primary']
 
 
 # -------------------------------
@@ -31,6 +36,8 @@ class ProductSerializer(serializers.ModelSerializer):
     current_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
     sub_category_id = serializers.IntegerField(source='subcategory.id', read_only=True)
     sub_category_name = serializers.CharField(source='subcategory.name', read_only=True)
+    main_image_srcset = ImageVariantField("srcset", source="main_image_variants")
+    main_image_placeholder = ImageVariantField("placeholder", source="main_image_variants")
 
     class Meta:
         model = Product
@@ -38,7 +45,7 @@ class ProductSerializer(serializers.ModelSerializer):
             'id', 'name', 'slug', 'description',
             'price', 'discounted_price', 'current_price',
             'sku', 'brand', 'weight', 'dimensions', 'material',
-            'main_image_url', 'extra_attributes',
+            'main_image_url', 'main_image_srcset', 'main_image_placeholder', 'extra_attributes',
             'is_featured', 'is_deal_of_the_day', 'is_exclusive_product', 'is_active',
             'images', 'inventory',
             'sub_category_id', 'sub_category_name'
@@ -51,12 +58,14 @@ class ProductListSerializer(serializers.ModelSerializer):
     current_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
     sub_category_id = serializers.IntegerField(source='subcategory.id', read_only=True)
     sub_category_name = serializers.CharField(source='subcategory.name', read_only=True)
+    main_image_srcset = ImageVariantField("srcset", source="main_image_variants")
+    main_image_placeholder = ImageVariantField("placeholder", source="main_image_variants")
 
     class Meta:
         model = Product
         fields = [
             'id', 'name', 'brand', 'discounted_price', 'current_price', 'price', 
-            'main_image_url', 
+            'main_image_url', 'main_image_srcset', 'main_image_placeholder',
             'is_featured', 'is_active',
             'images', 'inventory',
             'sub_category_id', 'sub_category_name'
@@ -132,3 +141,12 @@ class CategoryWithSubSerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ["id", "name", "subcategories", "image_url", 'description']
+
+
+# -------------------------------
+# Prefetch plans
+# -------------------------------
+register_prefetch_plan(ProductSerializer, "subcategory", "inventory", "images")
+register_prefetch_plan(ProductListSerializer, "subcategory", "inventory", "images")
+register_prefetch_plan(CategorySerializer, "subcategories")
+register_prefetch_plan(CategoryWithSubSerializer, "subcategories")
@@ -0,0 +1,56 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from common.cache import catalog_cache
+from .models import Category, SubCategory, Product, ProductImage, Inventory
+from .search import refresh_search_vectors
+
+
+# -------------------------------
+# Catalog cache invalidation
+# -------------------------------
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=SubCategory)
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=Inventory)
+def invalidate_catalog_cache(sender, instance, **kwargs):
+    """Any catalog write starts a new catalog cache generation."""
+    catalog_cache.invalidate()
+
+
+# -------------------------------
+# Search vector maintenance
+# -------------------------------
+SEARCHED_FIELDS = {
+    Product: {"name", "sku", "brand", "description", "subcategory"},
+    SubCategory: {"name", "parent_category"},
+    Category: {"name"},
+}
+
+
+def _touches_search(sender, update_fields):
+    # Partial saves (e.g. the image_url write-back) leave the vector alone
+    return update_fields is None or bool(SEARCHED_FIELDS[sender] & set(update_fields))
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_search_vector(sender, instance, update_fields=None, **kwargs):
+    if _touches_search(sender, update_fields):
+        transaction.on_commit(lambda: refresh_search_vectors(Product.objects.filter(pk=instance.pk)))
+
+
+@receiver(post_save, sender=SubCategory)
+def refresh_subcategory_search_vectors(sender, instance, update_fields=None, **kwargs):
+    """The vector includes the subcategory name, so its products go stale on rename."""
+    if _touches_search(sender, update_fields):
+        transaction.on_commit(lambda: refresh_search_vectors(Product.objects.filter(subcategory=instance)))
+
+
+@receiver(post_save, sender=Category)
+def refresh_category_search_vectors(sender, instance, update_fields=None, **kwargs):
+    if _touches_search(sender, update_fields):
+        transaction.on_commit(
+            lambda: refresh_search_vectors(Product.objects.filter(subcategory__parent_category=instance))
+        )
@@ -1,3 +1,290 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from common import supabase_storage_backend
+from common.supabase_storage_backend import BUCKET_NAME, SupabaseStorage
+from common.tests import local_caches
+
+from .management.commands import index_advisor
+from .models import Category, SubCategory, Product, ProductImage, Inventory
+from .search import ProductSearchFilter
+
+
+# -------------------------------
+# Listing facets
+# -------------------------------
+@local_caches("catalog")
+class ProductFacetTests(TestCase):
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        category = Category.objects.create(name="Tennis")
+        self.subcategory = SubCategory.objects.create(name="Rackets", parent_category=category)
+        for i, (brand, price, stock) in enumerate([
+            ("Yonex", "800", 5), ("Yonex", "3000", 0), ("Wilson", "3000", 2), ("", "25000", 1),
+        ]):
+            product = Product.objects.create(
+                name=f"R{i}", description="-", subcategory=self.subcategory,
+                price=Decimal(price), sku=f"R-{i}", brand=brand,
+            )
+            Inventory.objects.create(product=product, quantity=stock)
+        self.url = f"/api/subcategories/{self.subcategory.id}/products/"
+        self.client = APIClient()
+
+    def test_counts_follow_filters(self):
+        facets = self.client.get(self.url, {"facets": "true"}).data
+        self.assertEqual((facets["total"], facets["in_stock"]), (4, 3))
+        self.assertEqual(facets["brands"], [{"value": "Wilson", "count": 1}, {"value": "Yonex", "count": 2}])
+        self.assertEqual([bucket["count"] for bucket in facets["price_buckets"]], [1, 0, 2, 0, 0, 1])
+
+        facets = self.client.get(self.url, {"facets": "true", "inStock": "true", "price_min": "1000"}).data
+        self.assertEqual(facets["brands"], [{"value": "Wilson", "count": 1}])
+
+    def test_one_query_then_cached_per_filter_set(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.url, {"facets": "true", "brand": "yonex", "price_min": "100"})
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.url, {"price_min": "100.00", "facets": "true", "brand": "Yonex"})
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+
+# -------------------------------
+# Search
+# -------------------------------
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        category = Category.objects.create(name="Badminton")
+        self.subcategory = SubCategory.objects.create(name="Rackets", parent_category=category)
+        self.astrox = Product.objects.create(
+            name="Yonex Astrox 88D", description="Head-heavy attacking racket", subcategory=self.subcategory,
+            price=Decimal("12000"), sku="YX-AX88D", brand="Yonex",
+        )
+        Product.objects.create(
+            name="Li-Ning Shuttle Tube", description="Feather shuttles", subcategory=self.subcategory,
+            price=Decimal("1500"), sku="LN-ST", brand="Li-Ning",
+        )
+
+    def test_vectors_refresh_on_commit_for_searched_fields(self):
+        with mock.patch("products.signals.refresh_search_vectors") as refresh, \
+                mock.patch("homepage.snapshot._start_rebuild"):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.astrox.name = "Yonex Astrox 99"
+                self.astrox.save()
+                self.assertFalse(refresh.called)
+            self.assertEqual(list(refresh.call_args.args[0]), [self.astrox])
+
+            refresh.reset_mock()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.astrox.save(update_fields=["main_image_url"])
+            self.assertFalse(refresh.called)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.subcategory.name = "Badminton Rackets"
+                self.subcategory.save()
+            self.assertEqual(refresh.call_args.args[0].count(), 2)
+
+    def test_filter_matches_the_vector_or_a_trigram_of_the_name(self):
+        request = Request(APIRequestFactory().get("/api/products/", {"search": "astrx"}))
+        with mock.patch("products.search._postgres", return_value=True):
+            queryset = ProductSearchFilter().filter_queryset(request, Product.objects.all(), None)
+        self.assertIn("search_rank", queryset.query.annotations)
+        match, = queryset.query.where.children
+        self.assertEqual(
+            sorted(type(lookup).__name__ for lookup in match.children), ["SearchVectorExact", "TrigramWordSimilar"]
+        )
+
+    def test_search_endpoint(self):
+        if connection.vendor == "postgresql":
+            # Typo matched through the trigram index, full-text match through the vector
+            results = self.client.get("/api/products/", {"search": "astrx"}).data["results"]
+            self.assertEqual([row["id"] for row in results], [self.astrox.id])
+            results = self.client.get("/api/products/", {"search": "attacking rackets"}).data["results"]
+        else:
+            results = self.client.get("/api/products/", {"search": "astrox"}).data["results"]
+        self.assertEqual([row["id"] for row in results], [self.astrox.id])
+
+
+# -------------------------------
+# Effective price
+# -------------------------------
+class EffectivePriceTests(TestCase):
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        category = Category.objects.create(name="Tennis")
+        self.subcategory = SubCategory.objects.create(name="Rackets", parent_category=category)
+        self.products = {
+            name: Product.objects.create(
+                name=name, description="-", subcategory=self.subcategory,
+                price=Decimal(price), discounted_price=discount, sku=f"EP-{name}",
+            )
+            for name, price, discount in [
+                ("full", "500", None), ("discounted", "900", Decimal("300")), ("zero", "700", Decimal("0")),
+            ]
+        }
+
+    def test_matches_current_price(self):
+        prices = dict(Product.objects.values_list("name", "effective_price"))
+        self.assertEqual(prices, {"full": Decimal("500"), "discounted": Decimal("300"), "zero": Decimal("700")})
+        for product in Product.objects.all():
+            self.assertEqual(product.effective_price, product.current_price)
+
+    def test_tracks_updates(self):
+        Product.objects.filter(name="full").update(discounted_price=Decimal("450"))
+        self.assertEqual(Product.objects.get(name="full").effective_price, Decimal("450"))
+
+    def test_listing_filters_and_sorts_on_it(self):
+        url = f"/api/subcategories/{self.subcategory.id}/products/"
+        names = lambda params: [row["name"] for row in APIClient().get(url, params).data["results"]]
+        self.assertEqual(names({"sort": "price_asc"}), ["discounted", "full", "zero"])
+        self.assertEqual(names({"sort": "price_desc", "price_min": "400", "price_max": "600"}), ["full"])
+        self.assertEqual(names({"sort": "price_asc", "price_min": "600"}), ["zero"])
+
+
+# -------------------------------
+# Index advisor
+# -------------------------------
+class IndexAdvisorTests(TestCase):
+    def test_proposes_an_index_for_each_unavoidable_seq_scan(self):
+        plan = {
+            "Node Type": "Sort", "Sort Key": ["p.created_at DESC", "p.id DESC"],
+            "Plans": [{
+                "Node Type": "Seq Scan", "Relation Name": "products_product",
+                "Filter": "(is_active AND (subcategory_id = 3) AND (effective_price >= '100'::numeric))",
+            }, {
+                "Node Type": "Seq Scan", "Relation Name": "products_category",  # no filter: full read
+            }],
+        }
+        self.assertEqual(
+            list(index_advisor.unindexed_scans(plan)),
+            [("products_product", ("subcategory_id", "effective_price", "-created_at", "-id"))],
+        )
+
+    def test_query_shapes_ignore_batch_sizes(self):
+        self.assertEqual(
+            index_advisor.normalize('SELECT 1 WHERE "id" IN (%s, %s, %s)'),
+            index_advisor.normalize('SELECT 1 WHERE "id" IN (%s)'),
+        )
+
+    def test_needs_postgres(self):
+        if connection.vendor == "postgresql":
+            self.skipTest("runs the whole suite")
+        with self.assertRaisesMessage(CommandError, "Postgres"):
+            call_command("index_advisor")
+
+
+# -------------------------------
+# Keyset pagination
+# -------------------------------
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Tennis")
+        subcategory = SubCategory.objects.create(name="Rackets", parent_category=category)
+        # Repeated prices so the id tiebreaker matters
+        self.products = [
+            Product.objects.create(
+                name=f"R{i}", description="-", subcategory=subcategory,
+                price=Decimal(100 * (i % 3)), sku=f"R-{i}",
+            )
+            for i in range(7)
+        ]
+        self.url = f"/api/subcategories/{subcategory.id}/products/"
+        self.client = APIClient()
+
+    def walk(self, response, link):
+        """Follow `link` until it runs out; returns (pages of ids, last response)."""
+        pages = [[item["id"] for item in response.data["results"]]]
+        while response.data[link]:
+            response = self.client.get(response.data[link])
+            pages.append([item["id"] for item in response.data["results"]])
+        return pages, response
+
+    def test_pages_follow_sort_and_tiebreaker(self):
+        first = self.client.get(self.url, {"pagination": "cursor", "sort": "price_asc", "page_size": 3})
+        self.assertNotIn("count", first.data)
+        pages, last = self.walk(first, "next")
+
+        expected = [p.id for p in sorted(self.products, key=lambda p: (p.price, p.id))]
+        self.assertEqual([pid for page in pages for pid in page], expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(self.walk(last, "previous")[0], pages[::-1])
+
+    def test_approximate_count_and_invalid_cursor(self):
+        response = self.client.get(self.url, {"pagination": "cursor", "count": "approx"})
+        self.assertEqual(response.data["count"], 7)
+        self.assertEqual(self.client.get(self.url, {"cursor": "not-a-cursor"}).status_code, 404)
+        # Page numbers stay the default
+        self.assertEqual(self.client.get(self.url).data["count"], 7)
+
+
+# -------------------------------
+# Single-write saves
+# -------------------------------
+class ImageSaveQueryTests(TestCase):
+    """Saving a model with an image writes its public URL in the same statement."""
+
+    def assert_one_write(self, instance, url_field):
+        with CaptureQueriesContext(connection) as ctx:
+            instance.save()
+        self.assertEqual(len(ctx.captured_queries), 1)
+        file_field = url_field.removesuffix("_url")
+        self.assertIn(getattr(instance, file_field).name, getattr(instance, url_field))
+
+    def test_catalog_models(self):
+        category = Category(name="Tennis", image="category_images/tennis.jpg")
+        self.assert_one_write(category, "image_url")
+        subcategory = SubCategory(name="Rackets", parent_category=category, image="subcategory_images/rackets.jpg")
+        self.assert_one_write(subcategory, "image_url")
+        product = Product(
+            name="R", description="-", subcategory=subcategory, price=Decimal("10"), sku="R-1",
+            main_image="product_main_images/r.jpg",
+        )
+        self.assert_one_write(product, "main_image_url")
+        self.assert_one_write(ProductImage(product=product, image="product_images/r.jpg"), "image_url")
+
+        # Updates, including a changed image, stay single writes too
+        product.main_image = "product_main_images/r2.jpg"
+        self.assert_one_write(product, "main_image_url")
+
+
+# -------------------------------
+# Public URLs
+# -------------------------------
+class PublicUrlTests(TestCase):
+    def setUp(self):
+        supabase_storage_backend.public_url.cache_clear()
+        self.addCleanup(supabase_storage_backend.public_url.cache_clear)
+        patcher = mock.patch.object(supabase_storage_backend, "SUPABASE_URL", "https://project.supabase.co")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_matches_sdk_format(self):
+        name = "product_main_images/abc_racket.jpg"
+        self.assertEqual(
+            SupabaseStorage().url(name),
+            f"https://project.supabase.co/storage/v1/object/public/{BUCKET_NAME}/{name}",
+        )
+
+    def test_image_transform(self):
+        url = SupabaseStorage().image_url("product_images/a.jpg", width=320, quality=70)
+        self.assertIn("/storage/v1/render/image/public/", url)
+        self.assertTrue(url.endswith("/product_images/a.jpg?width=320&quality=70"))
+        self.assertEqual(SupabaseStorage().url(""), "")
+        self.assertTrue(SupabaseStorage().url("a b.jpg").endswith("/a%20b.jpg"))
 
-# Create your tests here.
+    def test_cdn_prefix(self):
+        with mock.patch.object(supabase_storage_backend, "MEDIA_CDN_URL", "https://cdn.example.com"):
+            url = SupabaseStorage().url("a.jpg")
+        self.assertEqual(url, f"https://cdn.example.com/object/public/{BUCKET_NAME}/a.jpg")
@@ -1,7 +1,6 @@
 from rest_framework import generics, filters
 from rest_framework.permissions import AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Case, When, F, DecimalField
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
@@ -13,7 +12,11 @@ from .serializers import (
     SubCategorySerializer, CategorySerializer,
     FeaturedProductSerializer, ProductStatusSerializer, ProductSerializer
 )
-from common.pagination import StandardResultsSetPagination
+from common.pagination import PageOrKeysetPagination
+from common.prefetch import apply_prefetch_plan
+from common.cache import catalog_cache
+from .search import ProductSearchFilter, ProductSearchOrderingFilter
+from .facets import facet_filter_key, product_facets
 
 
 # -------------------------------
@@ -88,21 +91,13 @@ class ProductListBySubCategoryView(generics.ListAPIView):
     permission_classes = [AllowAny]
     filter_backends = [filters.SearchFilter, DjangoFilterBackend, filters.OrderingFilter]
     search_fields = ['name', 'sku', 'brand']
-    ordering_fields = ['price', 'name', 'created_at', 'discounted_price']
-    pagination_class = StandardResultsSetPagination
+    ordering_fields = ['price', 'effective_price', 'name', 'created_at', 'discounted_price']
+    pagination_class = PageOrKeysetPagination
 
-    def get_queryset(self):
+    def get_base_queryset(self):
+        """Active products of the subcategory narrowed by the sidebar filters."""
         subcat_id = self.kwargs.get('pk')
-        qs = Product.objects.filter(is_active=True, subcategory_id=subcat_id).select_related('subcategory', 'subcategory__parent_category').prefetch_related('images', 'inventory')
-
-        # Annotate current price
-        qs = qs.annotate(
-            db_current_price=Case(
-                When(discounted_price__isnull=False, then=F('discounted_price')),
-                default=F('price'),
-                output_field=DecimalField()
-            )
-        )
+        qs = Product.objects.filter(is_active=True, subcategory_id=subcat_id)
 
         # Filters
         min_price = self.request.query_params.get('price_min')
@@ -112,21 +107,25 @@ class ProductListBySubCategoryView(generics.ListAPIView):
         in_stock = self.request.query_params.get('inStock')
 
         if min_price:
-            qs = qs.filter(db_current_price__gte=min_price)
+            qs = qs.filter(effective_price__gte=min_price)
         if max_price:
-            qs = qs.filter(db_current_price__lte=max_price)
+            qs = qs.filter(effective_price__lte=max_price)
         if brand:
             qs = qs.filter(brand__iexact=brand)
         if product_type:
             qs = qs.filter(subcategory__name__iexact=product_type)
         if in_stock and in_stock.lower() == "true":
             qs = qs.filter(inventory__quantity__gt=0)
+        return qs
+
+    def get_queryset(self):
+        qs = apply_prefetch_plan(self.get_base_queryset(), ProductListSerializer)
 
         # Sorting
         sort = self.request.query_params.get('sort')
         sort_mapping = {
-            'price_asc': 'db_current_price',
-            'price_desc': '-db_current_price',
+            'price_asc': 'effective_price',
+            'price_desc': '-effective_price',
             'name_asc': 'name',
             'name_desc': '-name',
             'date_asc': 'created_at',
@@ -138,12 +137,25 @@ class ProductListBySubCategoryView(generics.ListAPIView):
 
         return qs
 
+    def list(self, request, *args, **kwargs):
+        # ?facets=true returns the sidebar counts for the current filters instead of a page
+        if request.query_params.get('facets', '').lower() == 'true':
+            return Response(self.get_facets())
+        return super().list(request, *args, **kwargs)
+
+    def get_facets(self):
+        key = facet_filter_key(self.kwargs.get('pk'), self.request.query_params)
+        return catalog_cache.get_or_build(
+            ("facets", key),
+            lambda: product_facets(self.filter_queryset(self.get_base_queryset())),
+        )
+
 
 # -------------------------------
 # Product Detail
 # -------------------------------
 class ProductDetailView(generics.RetrieveAPIView):
-    queryset = Product.objects.filter(is_active=True).select_related('subcategory', 'subcategory__parent_category').prefetch_related('images', 'inventory')
+    queryset = apply_prefetch_plan(Product.objects.filter(is_active=True), ProductSerializer)
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
 
@@ -154,31 +166,23 @@ class ProductDetailView(generics.RetrieveAPIView):
 class ProductSearchListView(generics.ListAPIView):
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
-    filter_backends = [filters.SearchFilter, DjangoFilterBackend, filters.OrderingFilter]
-    search_fields = ['name', 'sku', 'brand']
+    filter_backends = [ProductSearchFilter, DjangoFilterBackend, ProductSearchOrderingFilter]
+    search_fields = ['name', 'sku', 'brand']  # non-Postgres fallback
     filterset_fields = ['is_featured', 'is_deal_of_the_day', 'brand']
-    ordering_fields = ['price', 'name', 'created_at', 'discounted_price']
+    ordering_fields = ['price', 'effective_price', 'name', 'created_at', 'discounted_price']
     ordering = ['-created_at']
-    pagination_class = StandardResultsSetPagination
+    pagination_class = PageOrKeysetPagination
 
     def get_queryset(self):
-        qs = Product.objects.filter(is_active=True).select_related('subcategory', 'subcategory__parent_category').prefetch_related('images', 'inventory')
-        # Annotate current price
-        qs = qs.annotate(
-            db_current_price=Case(
-                When(discounted_price__isnull=False, then=F("discounted_price")),
-                default=F("price"),
-                output_field=DecimalField()
-            )
-        )
+        qs = apply_prefetch_plan(Product.objects.filter(is_active=True), ProductSerializer)
         # Filters
         min_price = self.request.query_params.get('min_price')
         max_price = self.request.query_params.get('max_price')
         sub_category_name = self.request.query_params.get('type')
         if min_price:
-            qs = qs.filter(db_current_price__gte=min_price)
+            qs = qs.filter(effective_price__gte=min_price)
         if max_price:
-            qs = qs.filter(db_current_price__lte=max_price)
+            qs = qs.filter(effective_price__lte=max_price)
         if sub_category_name:
             qs = qs.filter(subcategory__name__iexact=sub_category_name)
         return qs
@@ -187,13 +191,16 @@ class BrandListView(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request, *args, **kwargs):
-        # Only active products, non-null brands
-        brands = (
-            Product.objects.filter(is_active=True)
-            .exclude(brand__isnull=True)
-            .exclude(brand__exact="")
-            .values_list("brand", flat=True)
-            .distinct()
-            .order_by("brand")
-        )
-        return Response({"brands": list(brands)})
\ No newline at end of file
+        return Response({"brands": catalog_cache.get_or_build(("brands",), active_brands)})
+
+
+def active_brands():
+    # Only active products, non-null brands
+    return list(
+        Product.objects.filter(is_active=True)
+        .exclude(brand__isnull=True)
+        .exclude(brand__exact="")
+        .values_list("brand", flat=True)
+        .distinct()
+        .order_by("brand")
+    )
@@ -2,11 +2,8 @@ import os
 import uuid
 from django.db import models
 from django.contrib.auth.models import AbstractUser
-from common.supabase_storage_backend import SupabaseStorage
-
-
-def get_supabase_storage():
-    return SupabaseStorage()
+from common.models import PublicUrlMixin
+from common.storage import media_storage
 
 
 class User(AbstractUser):
@@ -34,12 +31,12 @@ class User(AbstractUser):
         return f"{self.email} ({self.role})"
 
 
-class UserProfile(models.Model):
+class UserProfile(PublicUrlMixin, models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
 
-    # ✅ Refactored to use Supabase storage
+    # ✅ Stored in the configured media storage (see MEDIA_STORAGE)
     profile_picture = models.ImageField(
-        storage=get_supabase_storage,
+        storage=media_storage,
         upload_to="profile_pictures/",
         blank=True,
         null=True
@@ -49,16 +46,7 @@ class UserProfile(models.Model):
     date_of_birth = models.DateField(blank=True, null=True)
     preferences = models.JSONField(default=dict, blank=True)
 
-    def save(self, *args, **kwargs):
-        """
-        Save model, then update profile_picture_url with Supabase public URL.
-        """
-        super().save(*args, **kwargs)
-        if self.profile_picture and self.profile_picture.name:
-            url = self.profile_picture.storage.url(self.profile_picture.name)
-            if url != self.profile_picture_url:
-                self.profile_picture_url = url
-                super().save(update_fields=["profile_picture_url"])
+    public_url_fields = {"profile_picture": "profile_picture_url"}
 
     def delete(self, *args, **kwargs):
         """